@@ -1,12 +1,22 @@
 from collections import Counter
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Integer, String, and_, cast, func, literal, null, or_, select, union_all
 
-from app.core.deps import get_db
-from app.models.track_trend import TrackTrend
-from app.models.track import Track
+from app.core.deps import get_analytics_db
 from app.models.artist import Artist
+from app.models.snapshot_artist_count import SnapshotArtistCount
+from app.models.snapshot_genre_count import SnapshotGenreCount
+from app.models.snapshot_nationality_count import SnapshotNationalityCount
+from app.services import analytics_cache
+from app.services.analytics_cache import ALL_COUNTRIES, cached_response_async
+from app.services.genre_matrix import build_matrix, load_matrix_inputs
+from app.services.genres import normalize_genres
+from app.services.snapshots import latest_snapshot_time
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
@@ -22,32 +32,36 @@ def _to_iso(value):
     return str(value)
 
 
-def _normalize_genres(genres_value):
-    if not genres_value:
-        return []
-    if isinstance(genres_value, (list, tuple, set)):
-        raw = ",".join(str(x) for x in genres_value if x)
-    else:
-        raw = str(genres_value)
-    return [g.strip().lower() for g in raw.split(",") if g.strip()]
+def _total_tracks(db: Session, country: str, latest_time):
+    return (
+        db.query(func.coalesce(func.sum(SnapshotArtistCount.track_count), 0))
+        .filter(SnapshotArtistCount.country == country, SnapshotArtistCount.fetched_at == latest_time)
+        .scalar()
+    )
 
 
-@router.get("/genre-distribution")
-def genre_distribution(
-    country: str,
-    top_n: int = 10,
-    db: Session = Depends(get_db),
-):
+def _genre_counts(db: Session, country: str, latest_time, top_n: int = None):
+    """[(genre, count)] of one snapshot, most common first, plus the total tag count."""
+    base = db.query(SnapshotGenreCount).filter(
+        SnapshotGenreCount.country == country,
+        SnapshotGenreCount.fetched_at == latest_time,
+    )
+    total_tags = base.with_entities(func.coalesce(func.sum(SnapshotGenreCount.count), 0)).scalar()
+    q = base.with_entities(SnapshotGenreCount.genre, SnapshotGenreCount.count).order_by(
+        SnapshotGenreCount.count.desc(), SnapshotGenreCount.genre
+    )
+    if top_n is not None:
+        q = q.limit(top_n)
+    return [(g, c) for g, c in q.all()], total_tags
+
+
+def _genre_distribution(db: Session, country: str, top_n: int):
     """
     Returns genre distribution for the latest fetched_at snapshot in a given country.
-    genres are stored as CSV in artists.genres (e.g., "pop,rock,indie").
+    Reads the precomputed snapshot_genre_counts rows (see app/services/snapshot_aggregates).
     """
     try:
-        latest_time = (
-            db.query(func.max(TrackTrend.fetched_at))
-            .filter(TrackTrend.country == country)
-            .scalar()
-        )
+        latest_time = latest_snapshot_time(db, country)
 
         if not latest_time:
             return {
@@ -59,36 +73,23 @@ def genre_distribution(
                 "note": "No track_trends data. Run Last.fm ETL first.",
             }
 
-        rows = (
-            db.query(Artist.genres)
-            .join(Track, Track.artist_id == Artist.id)
-            .join(TrackTrend, TrackTrend.track_id == Track.id)
-            .filter(TrackTrend.country == country, TrackTrend.fetched_at == latest_time)
-            .all()
-        )
-
-        counter = Counter()
-        for (genres_value,) in rows:
-            counter.update(_normalize_genres(genres_value))
-
-        total_tags = sum(counter.values())
+        top, total_tags = _genre_counts(db, country, latest_time, top_n)
+        total_tracks = _total_tracks(db, country, latest_time)
 
         if total_tags == 0:
             return {
                 "country": country,
                 "latest_fetched_at": _to_iso(latest_time),
-                "total_tracks": len(rows),
+                "total_tracks": total_tracks,
                 "top_n": top_n,
                 "genres": [],
                 "note": "No genre tags found. Run MusicBrainz ETL.",
             }
 
-        top = counter.most_common(top_n)
-
         return {
             "country": country,
             "latest_fetched_at": _to_iso(latest_time),
-            "total_tracks": len(rows),
+            "total_tracks": total_tracks,
             "top_n": top_n,
             "genres": [
                 {
@@ -104,22 +105,14 @@ def genre_distribution(
         raise HTTPException(status_code=500, detail=f"genre_distribution failed: {e}")
 
 
-@router.get("/top-artists-by-country")
-def top_artists_by_country(
-    country: str,
-    top_n: int = 10,
-    db: Session = Depends(get_db),
-):
+def _top_artists_by_country(db: Session, country: str, top_n: int):
     """Return top artists for the latest snapshot in a given country.
 
-    We count how many tracks each artist has in the latest `track_trends` snapshot for `country`.
+    We count how many tracks each artist has in the latest `track_trends` snapshot for `country`
+    (precomputed in snapshot_artist_counts).
     """
 
-    latest_time = (
-        db.query(func.max(TrackTrend.fetched_at))
-        .filter(TrackTrend.country == country)
-        .scalar()
-    )
+    latest_time = latest_snapshot_time(db, country)
 
     if not latest_time:
         return {
@@ -136,23 +129,21 @@ def top_artists_by_country(
             Artist.name.label("artist_name"),
             Artist.country.label("artist_country"),
             Artist.genres.label("genres"),
-            func.count(Track.id).label("track_count"),
+            SnapshotArtistCount.track_count.label("track_count"),
         )
-        .join(Track, Track.artist_id == Artist.id)
-        .join(TrackTrend, TrackTrend.track_id == Track.id)
+        .join(SnapshotArtistCount, SnapshotArtistCount.artist_id == Artist.id)
         .filter(
-            TrackTrend.country == country,
-            TrackTrend.fetched_at == latest_time,
+            SnapshotArtistCount.country == country,
+            SnapshotArtistCount.fetched_at == latest_time,
         )
-        .group_by(Artist.id)
-        .order_by(func.count(Track.id).desc())
+        .order_by(SnapshotArtistCount.track_count.desc(), Artist.id)
         .limit(top_n)
         .all()
     )
 
     artists = []
     for r in rows:
-        genres_list = _normalize_genres(r.genres)
+        genres_list = normalize_genres(r.genres)
         artists.append(
             {
                 "artist_id": r.artist_id,
@@ -170,23 +161,14 @@ def top_artists_by_country(
         "artists": artists,
     }
     
-@router.get("/artist-nationality-distribution")
-def artist_nationality_distribution(
-    country: str,
-    top_n: int = 10,
-    db: Session = Depends(get_db),
-):
+def _artist_nationality_distribution(db: Session, country: str, top_n: int):
     """
     Returns distribution of artist nationalities
     for the latest snapshot in a given country.
     """
 
     # 1) latest snapshot time
-    latest_time = (
-        db.query(func.max(TrackTrend.fetched_at))
-        .filter(TrackTrend.country == country)
-        .scalar()
-    )
+    latest_time = latest_snapshot_time(db, country)
 
     if not latest_time:
         return {
@@ -197,21 +179,17 @@ def artist_nationality_distribution(
             "note": "No track_trends data. Run Last.fm ETL first.",
         }
 
-    # 2) count artist countries
+    # 2) count artist countries (precomputed in snapshot_nationality_counts)
     rows = (
         db.query(
-            Artist.country.label("artist_country"),
-            func.count(func.distinct(Artist.id)).label("artist_count"),
+            SnapshotNationalityCount.artist_country.label("artist_country"),
+            SnapshotNationalityCount.artist_count.label("artist_count"),
         )
-        .join(Track, Track.artist_id == Artist.id)
-        .join(TrackTrend, TrackTrend.track_id == Track.id)
         .filter(
-            TrackTrend.country == country,
-            TrackTrend.fetched_at == latest_time,
-            Artist.country.isnot(None),
+            SnapshotNationalityCount.country == country,
+            SnapshotNationalityCount.fetched_at == latest_time,
         )
-        .group_by(Artist.country)
-        .order_by(func.count(func.distinct(Artist.id)).desc())
+        .order_by(SnapshotNationalityCount.artist_count.desc(), SnapshotNationalityCount.artist_country)
         .limit(top_n)
         .all()
     )
@@ -236,41 +214,33 @@ def artist_nationality_distribution(
         "nationalities": result,
     }
     
-@router.get("/country-genre-comparison")
-def country_genre_comparison(
-    c1: str,
-    c2: str,
-    top_n: int = 10,
-    db: Session = Depends(get_db),
-):
+def _compare_genres(counter_1: Counter, counter_2: Counter, total_tags_1, total_tags_2, top_n: int):
+    # pick top genres based on combined popularity across both countries
+    combined = counter_1 + counter_2
+    top_genres = [g for g, _ in combined.most_common(top_n)]
+
+    comparison = []
+    for genre in top_genres:
+        c1_count = counter_1.get(genre, 0)
+        c2_count = counter_2.get(genre, 0)
+        comparison.append({
+            "genre": genre,
+            "c1_count": c1_count,
+            "c1_percentage": round((c1_count / total_tags_1) * 100, 2),
+            "c2_count": c2_count,
+            "c2_percentage": round((c2_count / total_tags_2) * 100, 2),
+        })
+    return comparison
+
+
+def _country_genre_comparison(db: Session, c1: str, c2: str, top_n: int):
     """
     Compare genre distributions between two countries using the latest snapshot for each.
-    Genres come from artists.genres (CSV string).
+    Genre counts come from the precomputed snapshot_genre_counts rows.
     """
 
-    def _latest_time(country: str):
-        return (
-            db.query(func.max(TrackTrend.fetched_at))
-            .filter(TrackTrend.country == country)
-            .scalar()
-        )
-
-    def _genre_counter(country: str, latest_time):
-        rows = (
-            db.query(Artist.genres)
-            .join(Track, Track.artist_id == Artist.id)
-            .join(TrackTrend, TrackTrend.track_id == Track.id)
-            .filter(TrackTrend.country == country, TrackTrend.fetched_at == latest_time)
-            .all()
-        )
-        counter = Counter()
-        for (genres_csv,) in rows:
-            parts = _normalize_genres(genres_csv)
-            counter.update(parts)
-        return counter, len(rows)
-
-    latest_1 = _latest_time(c1)
-    latest_2 = _latest_time(c2)
+    latest_1 = latest_snapshot_time(db, c1)
+    latest_2 = latest_snapshot_time(db, c2)
 
     if not latest_1 or not latest_2:
         return {
@@ -283,11 +253,11 @@ def country_genre_comparison(
             "note": "Missing snapshot data for one or both countries. Run Last.fm ETL for both countries first.",
         }
 
-    counter_1, total_tracks_1 = _genre_counter(c1, latest_1)
-    counter_2, total_tracks_2 = _genre_counter(c2, latest_2)
-
-    total_tags_1 = sum(counter_1.values())
-    total_tags_2 = sum(counter_2.values())
+    genres_1, total_tags_1 = _genre_counts(db, c1, latest_1)
+    genres_2, total_tags_2 = _genre_counts(db, c2, latest_2)
+    counter_1, counter_2 = Counter(dict(genres_1)), Counter(dict(genres_2))
+    total_tracks_1 = _total_tracks(db, c1, latest_1)
+    total_tracks_2 = _total_tracks(db, c2, latest_2)
 
     if total_tags_1 == 0 or total_tags_2 == 0:
         return {
@@ -304,21 +274,7 @@ def country_genre_comparison(
             "note": "One or both countries have no genre tags. Run MusicBrainz ETL to enrich artists.genres.",
         }
 
-    # pick top genres based on combined popularity across both countries
-    combined = counter_1 + counter_2
-    top_genres = [g for g, _ in combined.most_common(top_n)]
-
-    comparison = []
-    for genre in top_genres:
-        c1_count = counter_1.get(genre, 0)
-        c2_count = counter_2.get(genre, 0)
-        comparison.append({
-            "genre": genre,
-            "c1_count": c1_count,
-            "c1_percentage": round((c1_count / total_tags_1) * 100, 2),
-            "c2_count": c2_count,
-            "c2_percentage": round((c2_count / total_tags_2) * 100, 2),
-        })
+    comparison = _compare_genres(counter_1, counter_2, total_tags_1, total_tags_2, top_n)
 
     return {
         "country_1": c1,
@@ -331,4 +287,263 @@ def country_genre_comparison(
         "total_genre_tags_2": total_tags_2,
         "top_n": top_n,
         "genres": comparison,
-    }
\ No newline at end of file
+    }
+
+
+def _snapshot_rows(db: Session, country: str, latest_time, compare: str = None, compare_time=None):
+    """
+    Every aggregate row the dashboard needs, in one UNION ALL round-trip:
+    ("artist", country, name, track_count, artist_id, artist_country, genres) for `country`,
+    ("genre", country, genre, count, ...) for both countries and
+    ("nationality", country, artist_country, artist_count, ...) for `country`.
+    """
+    sac, sgc, snc = SnapshotArtistCount, SnapshotGenreCount, SnapshotNationalityCount
+    no_int, no_str = cast(null(), Integer), cast(null(), String)
+
+    genre_snapshots = [and_(sgc.country == country, sgc.fetched_at == latest_time)]
+    if compare and compare_time and compare != country:
+        genre_snapshots.append(and_(sgc.country == compare, sgc.fetched_at == compare_time))
+
+    query = union_all(
+        select(
+            literal("artist").label("kind"), sac.country.label("country"), Artist.name.label("name"),
+            sac.track_count.label("count"), Artist.id.label("artist_id"),
+            Artist.country.label("artist_country"), Artist.genres.label("genres"),
+        )
+        .join(Artist, Artist.id == sac.artist_id)
+        .where(sac.country == country, sac.fetched_at == latest_time),
+        select(literal("genre"), sgc.country, sgc.genre, sgc.count, no_int, no_str, no_str)
+        .where(or_(*genre_snapshots)),
+        select(literal("nationality"), snc.country, snc.artist_country, snc.artist_count, no_int, no_str, no_str)
+        .where(snc.country == country, snc.fetched_at == latest_time),
+    )
+    return db.execute(query).all()
+
+
+def _ranked(counter: Counter):
+    # same insertion order as _genre_counts (count desc, genre), so most_common() breaks ties alike
+    return Counter(dict(sorted(counter.items(), key=lambda g: (-g[1], g[0]))))
+
+
+def _dashboard(db: Session, country: str, top_n: int, compare: str = None):
+    """
+    Genre distribution, top artists and nationality distribution of `country` (plus the genre
+    comparison with `compare`) from one snapshot lookup per country and a single row fetch.
+    Sections have the same item shapes as the individual endpoints.
+    """
+    latest_time = latest_snapshot_time(db, country)
+    compare_time = latest_snapshot_time(db, compare) if compare else None
+    payload = {
+        "country": country,
+        "latest_fetched_at": _to_iso(latest_time),
+        "top_n": top_n,
+    }
+    if not latest_time:
+        payload["note"] = "No track_trends data. Run Last.fm ETL first."
+        return payload
+
+    artists, genres, nationalities = [], {country: Counter(), compare: Counter()}, []
+    for kind, c, name, count, artist_id, artist_country, artist_genres in _snapshot_rows(
+        db, country, latest_time, compare, compare_time
+    ):
+        if kind == "artist":
+            artists.append((count, artist_id, name, artist_country, artist_genres))
+        elif kind == "genre":
+            genres[c][name] += count
+        else:
+            nationalities.append((name, count))
+
+    top_artists = sorted(artists, key=lambda a: (-a[0], a[1]))[:top_n]
+    top_genres = list(_ranked(genres[country]).items())[:top_n]
+    top_nationalities = sorted(nationalities, key=lambda n: (-n[1], n[0]))[:top_n]
+    total_tags = sum(genres[country].values())
+    total_artists = sum(n for _, n in top_nationalities)
+
+    payload.update({
+        "total_tracks": sum(a[0] for a in artists),
+        "total_genre_tags": total_tags,
+        "genres": [
+            {"genre": g, "count": n, "percentage": round((n / total_tags) * 100, 2)}
+            for g, n in top_genres
+        ],
+        "artists": [
+            {
+                "artist_id": artist_id,
+                "artist_name": name,
+                "artist_country": artist_country,
+                "genres": normalize_genres(artist_genres)[:5],
+                "track_count": n,
+            }
+            for n, artist_id, name, artist_country, artist_genres in top_artists
+        ],
+        "total_artists": total_artists,
+        "nationalities": [
+            {
+                "artist_country": c,
+                "count": n,
+                "percentage": round((n / total_artists) * 100, 2) if total_artists > 0 else 0,
+            }
+            for c, n in top_nationalities
+        ],
+    })
+    if total_tags == 0:
+        payload["note"] = "No genre tags found. Run MusicBrainz ETL."
+
+    if compare:
+        compare_tags = sum(genres[compare].values())
+        payload["comparison"] = {
+            "country": compare,
+            "latest_fetched_at": _to_iso(compare_time),
+            "total_genre_tags": compare_tags,
+            "genres": _compare_genres(
+                _ranked(genres[country]), _ranked(genres[compare]), total_tags, compare_tags, top_n
+            ) if total_tags and compare_tags else [],
+        }
+    return payload
+
+
+def _country(value: Optional[str]):
+    """Country param as stored by the ETL (stripped, lowercased), so `Spain` finds `spain`."""
+    return value.strip().lower() if value else value
+
+
+def _parse_countries(values):
+    """Repeated and/or comma-separated country params; None = every country."""
+    if not values:
+        return None
+    countries = sorted({_country(c) for value in values for c in value.split(",") if c.strip()})
+    return countries or None
+
+
+async def _query(db, fn, *args):
+    """
+    Run the sync query function `fn(session, *args)` on whichever session DB_ASYNC selected:
+    an AsyncSession through run_sync, a sync Session on the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+
+async def _country_genre_matrix(db, countries, metric: str, top_n: int):
+    inputs = await _query(db, load_matrix_inputs, countries, metric)
+    try:
+        # NumPy work: off the event loop either way
+        return await run_in_threadpool(build_matrix, inputs, countries, metric, top_n)
+    except RuntimeError as e:  # numpy not installed
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+# ---- routes (served through the in-process analytics cache) ----
+# A cache hit never leaves the event loop; a miss runs the query on the session get_analytics_db
+# provides (AsyncSession with DB_ASYNC=1, otherwise a sync Session on the threadpool).
+
+@router.get("/genre-distribution")
+async def genre_distribution(
+    request: Request,
+    country: str,
+    top_n: int = 10,
+    db=Depends(get_analytics_db),
+):
+    """Genre distribution of the latest snapshot in `country`."""
+    country = _country(country)
+    return await cached_response_async(
+        request,
+        {"country": country, "top_n": top_n},
+        [country],
+        lambda: _query(db, _genre_distribution, country, top_n),
+    )
+
+
+@router.get("/top-artists-by-country")
+async def top_artists_by_country(
+    request: Request,
+    country: str,
+    top_n: int = 10,
+    db=Depends(get_analytics_db),
+):
+    """Artists with the most chart entries in the latest snapshot of `country`."""
+    country = _country(country)
+    return await cached_response_async(
+        request,
+        {"country": country, "top_n": top_n},
+        [country],
+        lambda: _query(db, _top_artists_by_country, country, top_n),
+    )
+
+
+@router.get("/artist-nationality-distribution")
+async def artist_nationality_distribution(
+    request: Request,
+    country: str,
+    top_n: int = 10,
+    db=Depends(get_analytics_db),
+):
+    """Artist nationality distribution of the latest snapshot in `country`."""
+    country = _country(country)
+    return await cached_response_async(
+        request,
+        {"country": country, "top_n": top_n},
+        [country],
+        lambda: _query(db, _artist_nationality_distribution, country, top_n),
+    )
+
+
+@router.get("/country-genre-comparison")
+async def country_genre_comparison(
+    request: Request,
+    c1: str,
+    c2: str,
+    top_n: int = 10,
+    db=Depends(get_analytics_db),
+):
+    """Compare the genre distributions of two countries (latest snapshot of each)."""
+    c1, c2 = _country(c1), _country(c2)
+    return await cached_response_async(
+        request,
+        {"c1": c1, "c2": c2, "top_n": top_n},
+        [c1, c2],
+        lambda: _query(db, _country_genre_comparison, c1, c2, top_n),
+    )
+
+
+@router.get("/country-genre-matrix")
+async def country_genre_matrix_route(
+    request: Request,
+    countries: Optional[List[str]] = Query(None, description="repeat or comma-separate; omit for all countries"),
+    metric: str = Query("cosine", pattern="^(cosine|jsd)$"),
+    top_n: int = Query(20, ge=1, le=500),
+    db=Depends(get_analytics_db),
+):
+    """Genre share matrix and pairwise similarity of several countries (latest snapshot of each)."""
+    country_list = _parse_countries(countries)
+    return await cached_response_async(
+        request,
+        {"countries": ",".join(country_list or [ALL_COUNTRIES]), "metric": metric, "top_n": top_n},
+        country_list or [ALL_COUNTRIES],
+        lambda: _country_genre_matrix(db, country_list, metric, top_n),
+    )
+
+
+@router.get("/dashboard")
+async def dashboard(
+    request: Request,
+    country: str,
+    top_n: int = 10,
+    compare: Optional[str] = Query(None, description="second country for the genre comparison"),
+    db=Depends(get_analytics_db),
+):
+    """Everything the country page shows (genres, top artists, nationalities, comparison) in one call."""
+    country = _country(country)
+    compare = _country(compare)
+    return await cached_response_async(
+        request,
+        {"country": country, "top_n": top_n, "compare": compare or ""},
+        [country] + ([compare] if compare else []),
+        lambda: _query(db, _dashboard, country, top_n, compare),
+    )
+
+
+@router.get("/cache-stats")
+async def cache_stats():
+    return analytics_cache.cache.stats()
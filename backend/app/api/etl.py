@@ -1,19 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.core.deps import get_db
-from app.services.etl_lastfm import run_lastfm_etl
-from app.services.etl_musicbrainz import run_musicbrainz_etl
+from app.services.etl_lastfm import normalize_countries, run_lastfm_etl, run_lastfm_etl_batch
+from app.services.etl_musicbrainz import enrichment_summary, run_musicbrainz_etl
+from app.services import lastfm_client, musicbrainz_client
+from app.services.http_client import get_shared_cache
+from app.services import jobs
+from app.models.etl_log import EtlLog
 from fastapi import HTTPException
 
 router = APIRouter(prefix="/etl", tags=["ETL"])
 
 @router.post("/lastfm/run")
-def run_lastfm(country: str = "spain", limit: int = 20, db: Session = Depends(get_db)):
+def run_lastfm(
+    country: str = "spain",
+    limit: int = 20,
+    run_key: Optional[str] = Query(None, description="run_key of a failed run to retry (replaces its snapshot)"),
+    db: Session = Depends(get_db),
+):
+    country = country.strip().lower()
+    if not country:
+        raise HTTPException(status_code=400, detail="country is empty")
     try:
-        run_lastfm_etl(db, country, limit)
-        return {"status": "ok", "country": country, "limit": limit}
+        stats = run_lastfm_etl(db, country, limit, run_key)
+        return {"status": "ok", "country": country, "limit": limit, **stats}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/lastfm/run-batch")
+def run_lastfm_batch(
+    countries: List[str] = Query(..., description="repeat the param or pass a comma-separated list"),
+    limit: int = 50,
+    max_concurrency: Optional[int] = None,
+    run_key: Optional[str] = Query(None, description="run_key of a half-failed run to retry"),
+    db: Session = Depends(get_db),
+):
+    country_list = normalize_countries(countries)
+    if not country_list:
+        raise HTTPException(status_code=400, detail="countries is empty")
+    result = run_lastfm_etl_batch(db, country_list, limit, max_concurrency, run_key=run_key)
+    return {"status": "ok", "limit": limit, **result}
     
 @router.post("/musicbrainz/run")
 def run_musicbrainz(limit: int = 20, db: Session = Depends(get_db)):
@@ -21,4 +50,85 @@ def run_musicbrainz(limit: int = 20, db: Session = Depends(get_db)):
         updated = run_musicbrainz_etl(db, limit)
         return {"status": "ok", "updated_artists": updated}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/musicbrainz/enrichment")
+def musicbrainz_enrichment(db: Session = Depends(get_db)):
+    return enrichment_summary(db)
+
+
+@router.get("/http-cache")
+def http_cache_stats():
+    cache = get_shared_cache()
+    return {
+        "lastfm": lastfm_client.client.stats(),
+        "musicbrainz": musicbrainz_client.client.stats(),
+        "cache": cache.stats() if cache else None,
+    }
+
+
+def _normalize_countries(values):
+    countries = sorted(normalize_countries(values))
+    if not countries:
+        raise HTTPException(status_code=400, detail="countries is empty")
+    return countries
+
+
+def _enqueued(job, created, covered):
+    # covered: countries left out because an identical active job already refreshes them
+    return {"job_id": job.id, "status": job.status, "deduplicated": not created, "covered_by": covered}
+
+
+# ---- background jobs ----
+
+@router.post("/lastfm/jobs", status_code=202)
+def enqueue_lastfm(
+    countries: List[str] = Query(..., description="one or more countries (repeat or comma-separate)"),
+    limit: int = 50,
+    max_concurrency: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    country_list = _normalize_countries(countries)
+    params = {"countries": country_list, "limit": limit, "max_concurrency": max_concurrency}
+    return _enqueued(*jobs.enqueue_job(db, jobs.LASTFM_JOB, params))
+
+
+@router.post("/musicbrainz/jobs", status_code=202)
+def enqueue_musicbrainz(limit: int = 20, db: Session = Depends(get_db)):
+    return _enqueued(*jobs.enqueue_job(db, jobs.MUSICBRAINZ_JOB, {"limit": limit}))
+
+
+@router.get("/jobs")
+def list_jobs(status: Optional[str] = None, limit: int = 20, db: Session = Depends(get_db)):
+    q = db.query(EtlLog).filter(EtlLog.etl_type.in_(list(jobs.JOB_RUNNERS)))
+    if status:
+        q = q.filter(EtlLog.status == status)
+    return {"jobs": [jobs.job_to_dict(j) for j in q.order_by(EtlLog.id.desc()).limit(limit).all()]}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(EtlLog, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return jobs.job_to_dict(job)
+
+
+@router.post("/jobs/{job_id}/retry", status_code=202)
+def retry_job(job_id: int, db: Session = Depends(get_db)):
+    try:
+        enqueued = jobs.retry_job(db, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if enqueued is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return _enqueued(*enqueued)
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    job = jobs.cancel_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return jobs.job_to_dict(job)
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.services import events
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+def _countries(raw: Optional[str]):
+    return [c.strip().lower() for c in raw.split(",") if c.strip()] if raw else None
+
+
+def _last_id(header: Optional[str], param: Optional[int]):
+    if param is not None:
+        return param
+    try:
+        return int(header) if header else None
+    except ValueError:
+        return None
+
+
+@router.get("/stream")
+async def event_stream(
+    request: Request,
+    countries: Optional[str] = Query(None, description="comma-separated; default: all countries"),
+    last_event_id: Optional[int] = Query(None, description="resume after this event id"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events feed of new snapshots (see app.services.events for the event types)."""
+    sub = events.hub.subscribe(_countries(countries), _last_id(last_event_id_header, last_event_id))
+
+    async def frames():
+        try:
+            yield b"retry: 5000\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=events.HEARTBEAT_SECONDS)
+                # the comment line keeps proxies from closing an idle connection
+                yield events.sse_format(event) if event else b": ping\n\n"
+        finally:
+            sub.close()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(frames(), media_type="text/event-stream", headers=headers)
+
+
+@router.websocket("/ws")
+async def event_socket(
+    websocket: WebSocket,
+    countries: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+):
+    """The same feed over a WebSocket: one JSON message per event."""
+    await websocket.accept()
+    sub = events.hub.subscribe(_countries(countries), last_event_id)
+    # clients never send anything; reading is how a disconnect is noticed
+    closed = asyncio.ensure_future(websocket.receive())
+    try:
+        while not closed.done():
+            getter = asyncio.ensure_future(sub.get(timeout=events.HEARTBEAT_SECONDS))
+            await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            event = getter.result()
+            await websocket.send_json(event if event else {"type": "ping"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        sub.close()
+
+
+@router.get("/stats")
+def event_stats():
+    return events.hub.stats()
@@ -0,0 +1,71 @@
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.core.database import SessionLocal
+from app.services import export_trends
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _stream(iter_chunks, **kwargs):
+    # The session lives as long as the response body is being sent, not as long as the
+    # request handler, so it is opened here instead of through Depends(get_db).
+    db = SessionLocal()
+    try:
+        yield from iter_chunks(db, **kwargs)
+    finally:
+        db.close()
+
+
+def _filename(country, fmt):
+    # the country is user input: keep the header value to a safe file name
+    safe = re.sub(r"[^A-Za-z0-9_-]+", "_", country).strip("_") if country else ""
+    return f"track_trends_{safe or 'all'}_{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}"
+
+
+@router.get("/trends")
+def export_trends_history(
+    background: BackgroundTasks,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    country: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = Query(export_trends.DEFAULT_CHUNK_SIZE, ge=100, le=100_000),
+):
+    """Full chart history (trends + track + artist columns), streamed in chunks."""
+    country = country.strip().lower() if country else None
+    filters = {"country": country, "start": start, "end": end, "chunk_size": chunk_size}
+    headers = {"Content-Disposition": f'attachment; filename="{_filename(country, format)}"'}
+
+    if format == "parquet":
+        # Parquet needs a seekable file (footer written last): spill row groups to a temp file.
+        fd, path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        db = SessionLocal()
+        try:
+            export_trends.write_parquet(db, path, **filters)
+        except RuntimeError as e:
+            os.remove(path)
+            raise HTTPException(status_code=501, detail=str(e))
+        except Exception:
+            os.remove(path)
+            raise
+        finally:
+            db.close()
+        background.add_task(os.remove, path)
+        return FileResponse(path, media_type=MEDIA_TYPES[format], headers=headers)
+
+    iter_chunks = export_trends.iter_csv if format == "csv" else export_trends.iter_ndjson
+    return StreamingResponse(_stream(iter_chunks, **filters), media_type=MEDIA_TYPES[format], headers=headers)
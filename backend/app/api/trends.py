@@ -0,0 +1,353 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.deps import get_db
+from app.models.artist import Artist
+from app.models.snapshot import Snapshot
+from app.models.track import Track
+from app.models.track_trend import TrackTrend
+
+router = APIRouter(prefix="/analytics/trends", tags=["Trends"])
+
+MAX_PAGE = 500
+
+
+def _to_iso(value):
+    return value.isoformat() if value else None
+
+
+def _range_filters(column, start, end):
+    filters = []
+    if start:
+        filters.append(column >= start)
+    if end:
+        filters.append(column <= end)
+    return filters
+
+
+def _parse_cursor(after: Optional[str]):
+    """Keyset cursor "<sort value>:<track_id>" as returned in `next_cursor`."""
+    if not after:
+        return None
+    try:
+        value, track_id = after.rsplit(":", 1)
+        return int(value), int(track_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _chart_positions(*filters):
+    """
+    One row per (track, snapshot) with the track's best rank in it. A chart can list the same
+    track twice (e.g. after dedupe merges), which would otherwise double-count in the windows below.
+    """
+    return (
+        select(
+            TrackTrend.country,
+            TrackTrend.track_id,
+            TrackTrend.fetched_at,
+            func.min(TrackTrend.rank).label("rank"),
+        )
+        .where(*filters)
+        .group_by(TrackTrend.country, TrackTrend.track_id, TrackTrend.fetched_at)
+        .subquery()
+    )
+
+
+def _page(items, limit, cursor_of):
+    has_more = len(items) > limit
+    items = items[:limit]
+    return items, (cursor_of(items[-1]) if has_more and items else None)
+
+
+@router.get("/tracks/{track_id}/trajectory")
+def track_trajectory(
+    track_id: int,
+    country: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[datetime] = Query(None, description="keyset cursor: fetched_at of the last row seen"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    db: Session = Depends(get_db),
+):
+    """Rank of one track in every snapshot of `country`, with the change vs. the previous snapshot it charted in."""
+    country = country.strip().lower()
+    pos = _chart_positions(TrackTrend.track_id == track_id, TrackTrend.country == country)
+    inner = select(
+        pos.c.fetched_at,
+        pos.c.rank,
+        func.lag(pos.c.rank)
+        .over(partition_by=(pos.c.country, pos.c.track_id), order_by=pos.c.fetched_at)
+        .label("prev_rank"),
+    ).subquery()
+    filters = _range_filters(inner.c.fetched_at, start, end)
+    if after:
+        filters.append(inner.c.fetched_at > after)
+    rows = db.execute(
+        select(inner).where(*filters).order_by(inner.c.fetched_at).limit(limit + 1)
+    ).all()
+
+    points, next_cursor = _page(rows, limit, lambda r: _to_iso(r.fetched_at))
+    track = db.get(Track, track_id)
+    return {
+        "track_id": track_id,
+        "title": track.title if track else None,
+        "country": country,
+        "points": [
+            {
+                "fetched_at": _to_iso(r.fetched_at),
+                "rank": r.rank,
+                "prev_rank": r.prev_rank,
+                "change": (r.prev_rank - r.rank) if r.prev_rank is not None else None,
+            }
+            for r in points
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/artists/{artist_id}/trajectory")
+def artist_trajectory(
+    artist_id: int,
+    country: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[datetime] = Query(None, description="keyset cursor: fetched_at of the last row seen"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    db: Session = Depends(get_db),
+):
+    """Best rank and number of chart entries of one artist per snapshot of `country`."""
+    country = country.strip().lower()
+    filters = [Track.artist_id == artist_id, TrackTrend.country == country]
+    filters += _range_filters(TrackTrend.fetched_at, start, end)
+    if after:
+        filters.append(TrackTrend.fetched_at > after)
+
+    rows = db.execute(
+        select(
+            TrackTrend.fetched_at,
+            func.min(TrackTrend.rank).label("best_rank"),
+            func.count(TrackTrend.id).label("entries"),
+        )
+        .join(Track, Track.id == TrackTrend.track_id)
+        .where(*filters)
+        .group_by(TrackTrend.fetched_at)
+        .order_by(TrackTrend.fetched_at)
+        .limit(limit + 1)
+    ).all()
+
+    points, next_cursor = _page(rows, limit, lambda r: _to_iso(r.fetched_at))
+    artist = db.get(Artist, artist_id)
+    return {
+        "artist_id": artist_id,
+        "artist_name": artist.name if artist else None,
+        "country": country,
+        "points": [
+            {"fetched_at": _to_iso(r.fetched_at), "best_rank": r.best_rank, "entries": r.entries}
+            for r in points
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/movers")
+def movers(
+    country: str,
+    from_time: Optional[datetime] = Query(None, description="older snapshot (default: second latest)"),
+    to_time: Optional[datetime] = Query(None, description="newer snapshot (default: latest)"),
+    direction: str = Query("climbers", pattern="^(climbers|fallers)$"),
+    after: Optional[str] = Query(None, description="keyset cursor from next_cursor"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE),
+    db: Session = Depends(get_db),
+):
+    """Biggest rank climbers/fallers between two snapshots of `country` (tracks charting in both)."""
+    country = country.strip().lower()
+    if from_time is None or to_time is None:
+        recent = (
+            db.query(Snapshot.fetched_at)
+            .filter(Snapshot.country == country)
+            .order_by(Snapshot.fetched_at.desc())
+            .limit(2)
+            .all()
+        )
+        if len(recent) < 2:
+            return {
+                "country": country,
+                "from_time": None,
+                "to_time": None,
+                "direction": direction,
+                "items": [],
+                "next_cursor": None,
+                "note": "Need at least two snapshots. Run Last.fm ETL again later.",
+            }
+        to_time = to_time or recent[0][0]
+        from_time = from_time or recent[1][0]
+
+    pos = _chart_positions(TrackTrend.country == country, TrackTrend.fetched_at.in_([from_time, to_time]))
+    inner = select(
+        pos.c.track_id,
+        pos.c.fetched_at,
+        pos.c.rank,
+        func.lag(pos.c.rank)
+        .over(partition_by=(pos.c.country, pos.c.track_id), order_by=pos.c.fetched_at)
+        .label("prev_rank"),
+    ).subquery()
+    # positive delta = moved up the chart
+    delta = (inner.c.prev_rank - inner.c.rank).label("delta")
+    sort_key = delta if direction == "climbers" else -delta
+
+    filters = [inner.c.fetched_at == to_time, inner.c.prev_rank.isnot(None)]
+    cursor = _parse_cursor(after)
+    if cursor:
+        value, last_track = cursor
+        filters.append(or_(sort_key < value, and_(sort_key == value, inner.c.track_id > last_track)))
+
+    rows = db.execute(
+        select(inner.c.track_id, inner.c.rank, inner.c.prev_rank, delta, Track.title, Artist.name.label("artist_name"))
+        .join(Track, Track.id == inner.c.track_id)
+        .join(Artist, Artist.id == Track.artist_id)
+        .where(*filters)
+        .order_by(sort_key.desc(), inner.c.track_id)
+        .limit(limit + 1)
+    ).all()
+
+    sign = 1 if direction == "climbers" else -1
+    items, next_cursor = _page(rows, limit, lambda r: f"{sign * r.delta}:{r.track_id}")
+    return {
+        "country": country,
+        "from_time": _to_iso(from_time),
+        "to_time": _to_iso(to_time),
+        "direction": direction,
+        "items": [
+            {
+                "track_id": r.track_id,
+                "title": r.title,
+                "artist_name": r.artist_name,
+                "prev_rank": r.prev_rank,
+                "rank": r.rank,
+                "change": r.delta,
+            }
+            for r in items
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/longevity")
+def longevity(
+    country: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[str] = Query(None, description="keyset cursor from next_cursor"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE),
+    db: Session = Depends(get_db),
+):
+    """
+    Tracks that stayed on the chart the longest in `country`.
+
+    `snapshots` counts every snapshot a track appeared in; `longest_streak` is the longest run of
+    consecutive snapshots (gaps-and-islands: snapshot index minus ROW_NUMBER per track). The
+    cursor selects the page's tracks first, so the window functions only see those tracks' rows.
+    """
+    country = country.strip().lower()
+    range_filters = [TrackTrend.country == country] + _range_filters(TrackTrend.fetched_at, start, end)
+
+    # 1) the page: rank tracks by snapshot count and apply the cursor before any window
+    # function runs, so only this page's tracks go through gaps-and-islands below
+    counts = (
+        select(TrackTrend.track_id, func.count(func.distinct(TrackTrend.fetched_at)).label("snapshots"))
+        .where(*range_filters)
+        .group_by(TrackTrend.track_id)
+        .subquery()
+    )
+    page_filters = []
+    cursor = _parse_cursor(after)
+    if cursor:
+        value, last_track = cursor
+        page_filters.append(
+            or_(counts.c.snapshots < value, and_(counts.c.snapshots == value, counts.c.track_id > last_track))
+        )
+    page = (
+        select(counts.c.track_id)
+        .where(*page_filters)
+        .order_by(counts.c.snapshots.desc(), counts.c.track_id)
+        .limit(limit + 1)
+    )
+
+    # 2) streaks of the page's tracks: snapshot index (over the country's snapshots in range)
+    # minus ROW_NUMBER per track is constant along a run of consecutive snapshots
+    snapshot_index = (
+        select(TrackTrend.fetched_at, func.row_number().over(order_by=TrackTrend.fetched_at).label("idx"))
+        .where(*range_filters)
+        .group_by(TrackTrend.fetched_at)
+        .subquery()
+    )
+    pos = _chart_positions(*range_filters, TrackTrend.track_id.in_(page))
+    numbered = (
+        select(
+            pos.c.track_id,
+            pos.c.fetched_at,
+            pos.c.rank,
+            (
+                snapshot_index.c.idx
+                - func.row_number().over(partition_by=pos.c.track_id, order_by=pos.c.fetched_at)
+            ).label("island"),
+        )
+        .join(snapshot_index, snapshot_index.c.fetched_at == pos.c.fetched_at)
+        .subquery()
+    )
+    islands = (
+        select(
+            numbered.c.track_id,
+            func.count().label("run_length"),
+            func.min(numbered.c.rank).label("best_rank"),
+            func.min(numbered.c.fetched_at).label("first_seen"),
+            func.max(numbered.c.fetched_at).label("last_seen"),
+        )
+        .group_by(numbered.c.track_id, numbered.c.island)
+        .subquery()
+    )
+    per_track = (
+        select(
+            islands.c.track_id,
+            func.sum(islands.c.run_length).label("snapshots"),
+            func.max(islands.c.run_length).label("longest_streak"),
+            func.min(islands.c.best_rank).label("best_rank"),
+            func.min(islands.c.first_seen).label("first_seen"),
+            func.max(islands.c.last_seen).label("last_seen"),
+        )
+        .group_by(islands.c.track_id)
+        .subquery()
+    )
+
+    rows = db.execute(
+        select(per_track, Track.title, Artist.name.label("artist_name"))
+        .join(Track, Track.id == per_track.c.track_id)
+        .join(Artist, Artist.id == Track.artist_id)
+        .order_by(per_track.c.snapshots.desc(), per_track.c.track_id)
+    ).all()
+
+    items, next_cursor = _page(rows, limit, lambda r: f"{r.snapshots}:{r.track_id}")
+    return {
+        "country": country,
+        "start": _to_iso(start),
+        "end": _to_iso(end),
+        "items": [
+            {
+                "track_id": r.track_id,
+                "title": r.title,
+                "artist_name": r.artist_name,
+                "snapshots": r.snapshots,
+                "longest_streak": r.longest_streak,
+                "best_rank": r.best_rank,
+                "first_seen": _to_iso(r.first_seen),
+                "last_seen": _to_iso(r.last_seen),
+            }
+            for r in items
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,29 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+
+def insert_ignore(db: Session, model, rows):
+    """
+    Bulk INSERT that silently skips rows hitting a unique constraint.
+
+    - PostgreSQL: INSERT ... ON CONFLICT DO NOTHING
+    - SQLite:     INSERT OR IGNORE
+    - others:     plain INSERT (caller must pre-filter existing rows)
+
+    All rows are sent in a single executemany round-trip.
+    """
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        stmt = pg_insert(model).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        stmt = insert(model).prefix_with("OR IGNORE")
+    else:
+        stmt = insert(model)
+
+    db.execute(stmt, rows)
@@ -0,0 +1,76 @@
+"""
+Process settings, read once.
+
+`load_env()` loads backend/.env into os.environ a single time (Railway provides real env
+vars; .env is for local development). `get_settings()` returns the cached settings of the
+API process: database, pool, CORS and startup options. Service modules that read their own
+tuning knobs with os.getenv at import time see the .env values too, since
+app.core.database calls get_settings() before any of them is imported.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".env")
+
+DEFAULT_ALLOWED_ORIGINS = (
+    "https://musicscope-frontend-production.up.railway.app,http://localhost:5173,"
+    "http://127.0.0.1:5173,http://localhost:3000,http://127.0.0.1:3000"
+)
+
+
+@lru_cache(maxsize=None)
+def load_env():
+    """Load backend/.env once (existing environment variables win)."""
+    from dotenv import load_dotenv
+
+    return load_dotenv(dotenv_path=ENV_PATH)
+
+
+def _flag(name: str, default: str = "0"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _origins(raw: str):
+    raw = raw.strip()
+    if raw == "*":
+        return ("*",)
+    return tuple(o.strip() for o in raw.split(",") if o.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    database_url: str
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: float
+    db_pool_recycle: int
+    db_statement_timeout_ms: int
+    db_async: bool
+    db_pool_warmup: int
+    allowed_origins: tuple
+
+    @property
+    def is_sqlite(self):
+        return self.database_url.startswith("sqlite")
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    load_env()
+    # Prefer DATABASE_URL from environment; fallback to local SQLite for dev.
+    url = os.getenv("DATABASE_URL", "sqlite:///./musicscope.db")
+    # Some platforms provide `postgres://` but SQLAlchemy expects `postgresql://`
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return Settings(
+        database_url=url,
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        db_statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),  # 0 = server default
+        db_async=_flag("DB_ASYNC"),
+        db_pool_warmup=int(os.getenv("DB_POOL_WARMUP", "0")),  # connections opened at startup
+        allowed_origins=_origins(os.getenv("ALLOWED_ORIGINS", DEFAULT_ALLOWED_ORIGINS)),
+    )
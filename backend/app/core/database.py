@@ -1,30 +1,127 @@
-import os
+import threading
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-from dotenv import load_dotenv
+from app.core.config import get_settings
 
-# Load local .env for development. In Railway, env vars are provided by the platform.
-load_dotenv()
+# Settings come from the environment (.env is loaded once by app.core.config).
+settings = get_settings()
+DATABASE_URL = settings.database_url
+IS_SQLITE = settings.is_sqlite
 
-# Prefer DATABASE_URL from environment; fallback to local SQLite for dev.
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./musicscope.db")
+# Pool / timeout settings (ignored for SQLite)
+DB_POOL_SIZE = settings.db_pool_size
+DB_MAX_OVERFLOW = settings.db_max_overflow
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+DB_POOL_RECYCLE = settings.db_pool_recycle
+DB_STATEMENT_TIMEOUT_MS = settings.db_statement_timeout_ms
 
-# Some platforms provide `postgres://` but SQLAlchemy expects `postgresql://`
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Optional async engine for the async analytics routes (DB_ASYNC=1).
+# Needs `aiosqlite` (SQLite) or `asyncpg` (PostgreSQL), plus `greenlet`.
+DB_ASYNC = settings.db_async
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args=connect_args,
-    pool_pre_ping=True,
-)
+def _pool_kwargs():
+    if IS_SQLITE:
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The sync engine, created on first use (importing this module opens nothing)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                connect_args = {}
+                if IS_SQLITE:
+                    connect_args = {"check_same_thread": False}
+                elif DB_STATEMENT_TIMEOUT_MS and DATABASE_URL.startswith("postgresql"):
+                    connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+                _engine = create_engine(
+                    DATABASE_URL,
+                    connect_args=connect_args,
+                    pool_pre_ping=True,
+                    **_pool_kwargs(),
+                )
+    return _engine
+
+
+def __getattr__(name):
+    # `from app.core.database import engine` keeps working, without an import-time engine
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker that binds to get_engine() when the first session is opened."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+
+Base = declarative_base()
+
+
+def warm_pool(connections: int):
+    """Open (and return to the pool) up to `connections` connections, e.g. at startup."""
+    engine = get_engine()
+    if IS_SQLITE:
+        connections = min(connections, 1)
+    conns = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            conns.append(conn)
+            conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    """Create the async engine on first use (keeps asyncpg/aiosqlite optional)."""
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_connect_args = {}
+        if DB_STATEMENT_TIMEOUT_MS and DATABASE_URL.startswith("postgresql"):
+            async_connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+
+        _async_engine = create_async_engine(
+            _async_url(DATABASE_URL),
+            connect_args=async_connect_args,
+            pool_pre_ping=True,
+            **_pool_kwargs(),
+        )
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
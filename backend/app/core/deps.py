@@ -1,9 +1,18 @@
 # app/core/deps.py
-from app.core.database import SessionLocal
+from app.core.database import DB_ASYNC, SessionLocal, get_async_sessionmaker
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+# the /analytics routes run on an AsyncSession with DB_ASYNC=1, otherwise on a sync Session
+get_analytics_db = get_async_db if DB_ASYNC else get_db
@@ -0,0 +1,277 @@
+"""
+Request, SQL and ETL instrumentation, exposed in the Prometheus text format on /metrics.
+
+  - MetricsMiddleware (ASGI) times every request and labels it with the route template,
+    so /analytics/trends/tracks/{track_id}/trajectory is one series, not one per id.
+  - SQLAlchemy before/after_cursor_execute hooks (on every Engine, incl. the async engine's
+    sync side) time each statement and attribute it to the current request. Statements
+    repeated N_PLUS_ONE_THRESHOLD+ times in one request are counted and logged as N+1.
+  - SLOW_QUERY_MS > 0 logs every statement slower than that (logger "musicscope.sql").
+  - ETL code reports its phase timings through observe_phases / phase_timer.
+
+No client library: the few metric types needed here are small, and the format is plain text.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))  # 0 = slow-query log off
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+INF_LABEL = 'le="+Inf"'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+ETL_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+sql_log = logging.getLogger("musicscope.sql")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [le])} {count}")
+            count = series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [INF_LABEL])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "musicscope_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+db_query_duration = Histogram(
+    "musicscope_db_query_duration_seconds", "SQL statement latency by route (\"none\" outside requests).",
+    ("route", "operation"), buckets=QUERY_BUCKETS,
+)
+db_queries_per_request = Histogram(
+    "musicscope_db_queries_per_request", "SQL statements executed per HTTP request.",
+    ("route",), buckets=COUNT_BUCKETS,
+)
+db_time_per_request = Histogram(
+    "musicscope_db_time_per_request_seconds", "Total SQL time per HTTP request.",
+    ("route",),
+)
+db_n_plus_one = Counter(
+    "musicscope_db_n_plus_one_total", "Requests that repeated one statement N_PLUS_ONE_THRESHOLD+ times.",
+    ("route",),
+)
+db_slow_queries = Counter(
+    "musicscope_db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.",
+    ("route", "operation"),
+)
+etl_phase_duration = Histogram(
+    "musicscope_etl_phase_duration_seconds", "ETL phase durations.",
+    ("etl", "phase"), buckets=ETL_BUCKETS,
+)
+
+METRICS = [
+    http_request_duration, db_query_duration, db_queries_per_request, db_time_per_request,
+    db_n_plus_one, db_slow_queries, etl_phase_duration,
+]
+_collectors = []  # callables returning extra exposition lines (e.g. cache stats)
+
+
+def samples(name, type, help, values):
+    """Exposition lines for one metric from [({label: value}, number), ...] (for collectors)."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    for labels, value in values:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {value}")
+    return lines
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            lines.extend(collect())
+        except Exception as e:  # a broken collector must not take /metrics down
+            lines.append(f"# collector {getattr(collect, '__name__', collect)} failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- per-request SQL accounting ----
+
+class _RequestStats:
+    __slots__ = ("scope", "queries", "db_time", "statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+
+    @property
+    def route(self):
+        # the router writes the matched route into the (shared) scope before the endpoint runs
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+
+_current = contextvars.ContextVar("musicscope_request_stats", default=None)
+
+
+def _operation(statement):
+    head = statement.lstrip().split(None, 1)
+    return head[0].lower() if head else "unknown"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("musicscope_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("musicscope_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    stats = _current.get()
+    route = stats.route if stats else "none"
+    op = _operation(statement)
+    db_query_duration.observe(elapsed, route, op)
+
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(route, op)
+        sql_log.warning("slow query (%.1f ms, route=%s): %s", elapsed * 1000, route, " ".join(statement.split())[:500])
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute; drop its start time
+    conn = context.connection
+    if conn is not None:
+        starts = conn.info.get("musicscope_query_start")
+        if starts:
+            starts.pop()
+
+
+def _finish_request(stats):
+    db_queries_per_request.observe(stats.queries, stats.route)
+    db_time_per_request.observe(stats.db_time, stats.route)
+    repeated = [(n, s) for s, n in stats.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+    if repeated:
+        db_n_plus_one.inc(stats.route)
+        n, statement = max(repeated)
+        sql_log.warning("possible N+1 on %s: statement ran %d times: %s", stats.route, n, " ".join(statement.split())[:300])
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware buffering, streaming responses pass through)."""
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+
+        stats = _RequestStats(scope)
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            http_request_duration.observe(elapsed, scope["method"], stats.route, str(status["code"]))
+            _finish_request(stats)
+
+
+# ---- ETL phases ----
+
+def observe_phases(etl: str, timings: dict):
+    """Record a {phase: seconds} dict, as returned by the ETL functions."""
+    for phase, seconds in timings.items():
+        etl_phase_duration.observe(seconds, etl, phase)
+
+
+@contextmanager
+def phase_timer(etl: str, phase: str, timings: dict = None):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        etl_phase_duration.observe(elapsed, etl, phase)
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
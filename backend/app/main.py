@@ -1,46 +1,116 @@
-from dotenv import load_dotenv
-import os
+import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 
-from app.api.etl import router as etl_router
 from app.api.analytics import router as analytics_router
+from app.api.etl import router as etl_router
+from app.api.events import router as events_router
+from app.api.export import router as export_router
+from app.core.config import get_settings
+from app.api.trends import router as trends_router
+from app.core import metrics
+from app.services import analytics_cache, events, jobs, lastfm_client, musicbrainz_client
 
-from create_tables import init_db
+# Schema changes are an explicit one-off step (python manage.py init-db / check-db),
+# never part of importing or booting the app.
+settings = get_settings()
+log = logging.getLogger("musicscope.startup")
 
-# load .env
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-ENV_PATH = os.path.join(BASE_DIR, "..", ".env")
-load_dotenv(dotenv_path=ENV_PATH)
 
-# ---- App ----
-app = FastAPI(title="MusicScope API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.db_pool_warmup:
+        from app.core.database import warm_pool
+
+        try:
+            warm_pool(settings.db_pool_warmup)
+        except Exception as e:  # the app can still start; requests will retry connecting
+            log.warning("pool warm-up failed: %s", e)
+    try:
+        failed = jobs.recover_interrupted_jobs()
+        if failed:
+            log.warning("marked %d interrupted ETL jobs as failed", failed)
+        jobs.start_heartbeat()
+    except Exception:  # e.g. etl_logs not migrated yet (python manage.py init-db)
+        log.exception("could not recover ETL jobs")
+    yield
+    jobs.shutdown(wait=False)
 
-# ---- CORS ----
-allowed_origins_raw = os.getenv(
-    "ALLOWED_ORIGINS",
-    "https://musicscope-frontend-production.up.railway.app,http://localhost:5173,http://127.0.0.1:5173,http://localhost:3000,http://127.0.0.1:3000",
-)
 
-allowed_origins_raw = allowed_origins_raw.strip()
-if allowed_origins_raw == "*":
-    cors_origins = ["*"]
-else:
-    cors_origins = [o.strip() for o in allowed_origins_raw.split(",") if o.strip()]
+# ---- App ----
+app = FastAPI(title="MusicScope API", lifespan=lifespan)
 
+# ---- CORS ----
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=cors_origins,
+    allow_origins=list(settings.allowed_origins),
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# ---- Compression ----
+# JSON payloads (dashboard, matrix, exports) shrink ~5-10x; Parquet is compressed already
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1024,
+    compresslevel=6,
+    exclude_content_types=("application/vnd.apache.parquet", "text/event-stream"),
+)
+
+# ---- Metrics ----
+# outermost, so the recorded latency includes CORS handling; the SSE feed is a
+# long-lived connection, not a request with a latency
+app.add_middleware(metrics.MetricsMiddleware, skip_paths=("/metrics", "/events/stream"))
+
+
+@metrics.register_collector
+def _cache_metrics():
+    stats = analytics_cache.cache.stats()
+    lines = metrics.samples(
+        "musicscope_analytics_cache_events_total", "counter", "Analytics response cache events.",
+        [({"event": k}, stats[k]) for k in (
+            "hits", "misses", "memo_hits", "memo_misses", "not_modified", "evictions", "invalidations", "stale_skips",
+        )],
+    )
+    lines += metrics.samples(
+        "musicscope_analytics_cache_entries", "gauge", "Entries in the analytics response cache.",
+        [({}, stats["entries"])],
+    )
+    clients = {"lastfm": lastfm_client.client.stats(), "musicbrainz": musicbrainz_client.client.stats()}
+    lines += metrics.samples(
+        "musicscope_http_client_events_total", "counter", "Outgoing API client events.",
+        [({"client": c, "event": k}, v) for c, st in clients.items() for k, v in st.items()
+         if isinstance(v, int) and not isinstance(v, bool)],
+    )
+    feed = events.hub.stats()
+    lines += metrics.samples(
+        "musicscope_events_total", "counter", "Change feed events.",
+        [({"event": k}, feed[k]) for k in ("published", "delivered", "dropped")],
+    )
+    lines += metrics.samples(
+        "musicscope_events_subscribers", "gauge", "Open SSE/WebSocket change feed connections.",
+        [({}, feed["subscribers"])],
+    )
+    return lines
+
 # routers
 app.include_router(etl_router)
 app.include_router(analytics_router)
+app.include_router(trends_router)
+app.include_router(export_router)
+app.include_router(events_router)
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -1,8 +1,33 @@
 from app.core.database import Base
 from app.models.artist import Artist
+from app.models.artist_alias import ArtistAlias
 from app.models.track import Track
 from app.models.track_trend import TrackTrend
+from app.models.track_trend_rollup import TrackTrendRollup
+from app.models.snapshot import Snapshot
 from app.models.user import User
 from app.models.etl_log import EtlLog
+from app.models.genre import Genre
+from app.models.artist_genre import ArtistGenre
+from app.models.artist_enrichment import ArtistEnrichment
+from app.models.snapshot_genre_count import SnapshotGenreCount
+from app.models.snapshot_artist_count import SnapshotArtistCount
+from app.models.snapshot_nationality_count import SnapshotNationalityCount
 
-__all__ = ["Artist", "Track", "TrackTrend", "User", "EtlLog", "Base"]
\ No newline at end of file
+__all__ = [
+    "Artist",
+    "ArtistAlias",
+    "Track",
+    "TrackTrend",
+    "TrackTrendRollup",
+    "Snapshot",
+    "User",
+    "EtlLog",
+    "Genre",
+    "ArtistGenre",
+    "ArtistEnrichment",
+    "SnapshotGenreCount",
+    "SnapshotArtistCount",
+    "SnapshotNationalityCount",
+    "Base",
+]
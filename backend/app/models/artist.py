@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index, text
 from app.core.database import Base
 from datetime import datetime
 
@@ -7,7 +7,17 @@ class Artist(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     musicbrainz_id = Column(String, unique=True, index=True, nullable=True)
-    name = Column(String, index=True)
+    name = Column(String, index=True)  # 표시용 이름: 다른 아티스트와 같을 수 있음
+    # artist_resolver.normalize_artist_name(name): mbid가 없는 아티스트끼리만 unique
+    name_key = Column(String, nullable=True)
     country = Column(String, nullable=True)
     genres = Column(String, nullable=True)  # 일단 csv 문자열로 저장해도 됨
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # identity of an artist: its MBID, else its normalized name (the bulk insert's conflict target)
+        Index(
+            "uq_artists_name_key_without_mbid", "name_key", unique=True,
+            sqlite_where=text("musicbrainz_id IS NULL"), postgresql_where=text("musicbrainz_id IS NULL"),
+        ),
+    )
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from app.core.database import Base
+from datetime import datetime
+
+class ArtistAlias(Base):
+    """Extra normalized names that resolve to an artist (spellings seen on charts, merged duplicates)."""
+    __tablename__ = "artist_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    alias_key = Column(String, unique=True, index=True, nullable=False)  # artist_resolver.normalize_artist_name
+    artist_id = Column(Integer, ForeignKey("artists.id"), nullable=False, index=True)
+    name = Column(String, nullable=True)  # spelling the alias was learned from
+    source = Column(String, nullable=False, default="chart")  # "chart" (MBID match) / "merge"
+    created_at = Column(DateTime, default=datetime.utcnow)
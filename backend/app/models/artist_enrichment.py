@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from app.core.database import Base
+
+class ArtistEnrichment(Base):
+    """MusicBrainz enrichment state per artist (retry/backoff bookkeeping for run_musicbrainz_etl)."""
+    __tablename__ = "artist_enrichments"
+
+    artist_id = Column(Integer, ForeignKey("artists.id"), primary_key=True)
+    status = Column(String, index=True)          # "matched" / "no_match" / "no_country" / "low_score" / "error"
+    attempts = Column(Integer, nullable=False, default=0)
+    match_score = Column(Integer, nullable=True)  # MusicBrainz search score (0-100), 100 = MBID lookup
+    source = Column(String, nullable=True)        # "mbid" (lookup by id) / "search" (name search)
+    last_attempt_at = Column(DateTime, nullable=True)
+    next_retry_at = Column(DateTime, nullable=True, index=True)  # None = 다시 시도하지 않음
+    last_error = Column(String, nullable=True)
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from app.core.database import Base
+
+class ArtistGenre(Base):
+    __tablename__ = "artist_genres"
+
+    artist_id = Column(Integer, ForeignKey("artists.id"), primary_key=True)
+    genre_id = Column(Integer, ForeignKey("genres.id"), primary_key=True, index=True)
+    position = Column(Integer, default=0)  # MusicBrainz tag 순서 (0 = 대표 장르)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
 from datetime import datetime
 from app.core.database import Base
 
@@ -7,7 +7,16 @@ class EtlLog(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     etl_type = Column(String, index=True)  # "lastfm_top_tracks", "musicbrainz_artists" 등
-    status = Column(String)                # "success" / "failed"
+    status = Column(String, index=True)    # "queued" / "running" / "success" / "failed" / "cancelled"
+    country = Column(String, index=True, nullable=True)  # 요청 country 목록 (정렬, 쉼표 구분)
+    params = Column(Text, nullable=True)   # JSON
+    progress_done = Column(Integer, default=0)
+    progress_total = Column(Integer, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    result = Column(Text, nullable=True)   # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)  # enqueue 시각
     started_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime, nullable=True)
-    error_message = Column(Text, nullable=True)
\ No newline at end of file
+    error_message = Column(Text, nullable=True)
+    worker = Column(String, nullable=True)          # job을 실행하는 프로세스 (host:pid)
+    heartbeat_at = Column(DateTime, nullable=True)  # worker가 살아있다는 마지막 신호
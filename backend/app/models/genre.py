@@ -0,0 +1,8 @@
+from sqlalchemy import Column, Integer, String
+from app.core.database import Base
+
+class Genre(Base):
+    __tablename__ = "genres"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)  # 소문자/trim 정규화된 태그
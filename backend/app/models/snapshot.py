@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+class Snapshot(Base):
+    """Catalog of chart snapshots: one row per (country, fetched_at) written by the Last.fm ETL."""
+    __tablename__ = "snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)  # track_trends rows in the snapshot
+    # idempotency key (chart period "2024-05-01" or run key "run-..."): a rerun with the same key replaces the snapshot
+    snapshot_key = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("country", "fetched_at", name="uq_snapshots_country_fetched_at"),
+        Index("uq_snapshots_country_snapshot_key", "country", "snapshot_key", unique=True),
+    )
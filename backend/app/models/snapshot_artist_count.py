@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.core.database import Base
+
+class SnapshotArtistCount(Base):
+    """Number of chart entries per artist in a (country, fetched_at) snapshot."""
+    __tablename__ = "snapshot_artist_counts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+    artist_id = Column(Integer, ForeignKey("artists.id"), nullable=False, index=True)
+    track_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_snapshot_artist_counts_snapshot", "country", "fetched_at", "track_count"),
+    )
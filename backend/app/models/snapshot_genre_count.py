@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from app.core.database import Base
+
+class SnapshotGenreCount(Base):
+    """Genre tag count per (country, fetched_at) snapshot, filled by the ETL runs."""
+    __tablename__ = "snapshot_genre_counts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+    genre = Column(String, nullable=False)
+    count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_snapshot_genre_counts_snapshot", "country", "fetched_at", "count"),
+    )
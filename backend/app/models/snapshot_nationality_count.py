@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from app.core.database import Base
+
+class SnapshotNationalityCount(Base):
+    """Distinct artists per artist country in a (country, fetched_at) snapshot."""
+    __tablename__ = "snapshot_nationality_counts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+    artist_country = Column(String, nullable=False)
+    artist_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_snapshot_nationality_counts_snapshot", "country", "fetched_at", "artist_count"),
+    )
@@ -9,7 +9,9 @@ class Track(Base):
     lastfm_id = Column(String, index=True, nullable=True)
     mbid = Column(String, index=True, nullable=True)  # last.fm이 주는 mbid
     title = Column(String, index=True)
-    artist_id = Column(Integer, ForeignKey("artists.id"))
+    # mbid가 있으면 "mbid:<mbid>", 없으면 "a<artist_id>:<casefold title>"
+    natural_key = Column(String, unique=True, index=True, nullable=True)
+    artist_id = Column(Integer, ForeignKey("artists.id"), index=True)
     duration = Column(Integer, nullable=True)  # 초 단위
     url = Column(String, nullable=True)
 
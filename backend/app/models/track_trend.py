@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from datetime import datetime
 from app.core.database import Base
 
@@ -6,7 +6,12 @@ class TrackTrend(Base):
     __tablename__ = "track_trends"
 
     id = Column(Integer, primary_key=True, index=True)
-    track_id = Column(Integer, ForeignKey("tracks.id"))
-    country = Column(String, index=True)  # last.fm country
+    track_id = Column(Integer, ForeignKey("tracks.id"), index=True)
+    country = Column(String)              # last.fm country (leading column of the composite index)
     rank = Column(Integer)                # chart position
-    fetched_at = Column(DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
+    fetched_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # snapshot scans (country, fetched_at) can be answered from the index incl. the join key
+        Index("ix_track_trends_country_fetched_track", "country", "fetched_at", "track_id"),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, UniqueConstraint
+from app.core.database import Base
+
+class TrackTrendRollup(Base):
+    """Per-track chart stats of one (country, day), written by the retention job before it thins that day."""
+    __tablename__ = "track_trend_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String, nullable=False)
+    period = Column(String, nullable=False, default="day")
+    period_start = Column(DateTime, nullable=False)  # UTC 00:00 of the day
+    track_id = Column(Integer, ForeignKey("tracks.id"), nullable=False, index=True)
+    best_rank = Column(Integer, nullable=False)
+    avg_rank = Column(Float, nullable=False)
+    appearances = Column(Integer, nullable=False)  # snapshots of the period the track charted in
+    snapshots = Column(Integer, nullable=False)    # snapshots the period had before thinning
+
+    __table_args__ = (
+        UniqueConstraint("country", "period", "period_start", "track_id", name="uq_track_trend_rollups"),
+    )
@@ -0,0 +1,189 @@
+"""
+In-process response cache for the analytics router.
+
+Entries are keyed on endpoint + query parameters, bounded in size (LRU) and age (TTL),
+and tagged with the countries they depend on so an ETL commit can drop exactly the
+affected entries. Responses carry a content-hash ETag; a matching If-None-Match gets a 304.
+
+Every invalidation bumps a generation counter. A miss reads it before computing and the
+result is only stored if no invalidation happened meanwhile: a result computed from the
+data an ETL commit has just replaced is served once, never cached.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+try:  # optional: several times faster than json.dumps on the larger payloads
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ALL_COUNTRIES = "*"  # tag for results computed over every ingested country
+
+
+class AnalyticsCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (body, etag, countries, expires_at)
+        self._lock = threading.Lock()
+        self.generation = 0  # bumped by every invalidation
+        self.counters = {
+            "hits": 0, "misses": 0, "memo_hits": 0, "memo_misses": 0,
+            "not_modified": 0, "evictions": 0, "invalidations": 0, "stale_skips": 0,
+        }
+
+    def get(self, key, memo: bool = False):
+        """Entry under `key`, or None. `memo` lookups (memo_get) have their own hit/miss counters."""
+        prefix = "memo_" if memo else ""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.counters[prefix + "misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters[prefix + "hits"] += 1
+            return entry
+
+    def put(self, key, body: bytes, etag: str, countries, generation: int = None):
+        """
+        Store an entry and return it. With `generation` (read before computing the value),
+        the entry is returned but not stored if an invalidation happened since.
+        """
+        entry = (body, etag, frozenset(c.lower() for c in countries), time.monotonic() + self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.counters["stale_skips"] += 1
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+        return entry
+
+    def count_not_modified(self):
+        with self._lock:
+            self.counters["not_modified"] += 1
+
+    def invalidate_countries(self, countries):
+        """
+        Drop every entry that depends on one of `countries`, plus entries tagged ALL_COUNTRIES
+        (results over "every country" change whenever any country does). Returns the number dropped.
+        """
+        targets = {c.lower() for c in countries}
+        if not targets:
+            return 0
+        targets.add(ALL_COUNTRIES)
+        with self._lock:
+            self.generation += 1
+            stale = [k for k, e in self._entries.items() if e[2] & targets]
+            for k in stale:
+                del self._entries[k]
+            self.counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            entries = len(self._entries)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hit_ratio": _ratio(counters["hits"], counters["misses"]),  # responses only
+            "memo_hit_ratio": _ratio(counters["memo_hits"], counters["memo_misses"]),
+            **counters,
+        }
+
+
+def _ratio(hits, misses):
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+
+cache = AnalyticsCache(
+    max_entries=int(os.getenv("ANALYTICS_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL", "300")),
+)
+
+
+def invalidate_countries(countries):
+    return cache.invalidate_countries(countries)
+
+
+def generation():
+    """Current invalidation generation: read it before computing a value to store."""
+    return cache.generation
+
+
+def memo_get(key):
+    """Cached intermediate result (not an HTTP body) stored with memo_put, or None."""
+    entry = cache.get(key, memo=True)
+    return entry[0] if entry is not None else None
+
+
+def memo_put(key, value, countries, generation: int = None):
+    """Keep `value` under `key` with the same LRU/TTL/invalidation as the responses."""
+    cache.put(key, value, None, countries, generation)
+    return value
+
+
+def _key(request: Request, params: dict):
+    # JSON-encoded, so values containing "&" or "=" cannot make two param sets collide
+    return request.url.path + "?" + json.dumps(sorted(params.items()), separators=(",", ":"), default=str)
+
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        # native dict/list/str/int/float/datetime; anything else (Decimal sums) via FastAPI's encoder
+        return orjson.dumps(data, default=jsonable_encoder)
+    return json.dumps(jsonable_encoder(data), separators=(",", ":")).encode("utf-8")
+
+
+def _store(key, data, countries, generation: int):
+    body = _dumps(data)
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    return cache.put(key, body, etag, countries, generation)
+
+
+def _respond(request: Request, entry):
+    body, etag = entry[0], entry[1]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    if etag in candidates or if_none_match.strip() == "*":
+        cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def cached_response_async(request: Request, params: dict, countries, compute):
+    """
+    Serve `await compute()` (a JSON-able dict) through the cache; `compute` is only awaited on a miss.
+
+    The key is the route path plus the endpoint's own `params` (not the raw query string,
+    so defaults and unknown params do not fragment the cache). `countries` are the Last.fm
+    countries the result depends on, used for invalidation.
+    """
+    key = _key(request, params)
+    entry = cache.get(key)
+    if entry is None:
+        started = cache.generation
+        entry = _store(key, await compute(), countries, started)
+    return _respond(request, entry)
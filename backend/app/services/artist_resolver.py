@@ -0,0 +1,321 @@
+"""
+Artist identity resolution for the Last.fm ETL.
+
+Chart names are matched to artists in memory instead of with one `Artist.name == ...`
+lookup per name. `normalize_artist_name` folds the usual spelling variants together:
+"Beyoncé" / "Beyonce", "The Weeknd" / "the weeknd" / "Weeknd", "Drake feat. Future" / "Drake".
+
+`ArtistResolver.load(db)` warms the index once per ETL run: the MBID and normalized name
+of every artist, plus the artist_aliases table (spellings learned from MBID matches and
+from `merge_duplicate_artists`). `resolve(name, mbid)` is then a dict lookup, MBID first,
+and `resolve_chart` plans a whole chart: which pairs are known artists, which artists are
+new and which MBIDs the known ones receive.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from app.core.bulk import insert_ignore
+from app.models.artist import Artist
+from app.models.artist_alias import ArtistAlias
+from app.models.artist_enrichment import ArtistEnrichment
+from app.models.artist_genre import ArtistGenre
+from app.models.snapshot_artist_count import SnapshotArtistCount
+from app.models.track import Track
+from app.services.snapshot_aggregates import refresh_snapshot_aggregates
+
+# only "the": "A Boogie" and "Boogie" are two different artists
+ARTICLES = ("the ",)
+# " feat. X", " ft X", " (featuring X)", " [feat. X]" up to the end of the name
+_FEATURING = re.compile(r"[\s(\[]+(?:feat|ft|featuring)\b\.?.*$")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_artist_name(name: str):
+    """Matching key of an artist name: NFKD without accents, casefolded, no article/featuring."""
+    if not name:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", name)
+    key = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    key = _FEATURING.sub("", key)
+    key = " ".join(_NON_WORD.sub(" ", key).split())
+    for article in ARTICLES:
+        if key.startswith(article) and len(key) > len(article):
+            key = key[len(article):]
+            break
+    # names made only of punctuation ("!!!") keep their casefolded spelling
+    return key or " ".join(name.casefold().split())
+
+
+class ArtistResolver:
+    def __init__(self):
+        self.by_mbid = {}  # musicbrainz_id -> artist_id
+        self.by_key = {}   # normalized name -> artist_id
+        self.mbid_of = {}  # artist_id -> musicbrainz_id (None when unknown)
+
+    @classmethod
+    def load(cls, db: Session):
+        """Warm the index from artists + artist_aliases (two queries)."""
+        resolver = cls()
+        for artist_id, name, mbid in db.query(Artist.id, Artist.name, Artist.musicbrainz_id).order_by(Artist.id):
+            resolver.add(artist_id, name, mbid)
+        # aliases win over same-key artists (they record a merge or an MBID-confirmed spelling)
+        for alias_key, artist_id in db.query(ArtistAlias.alias_key, ArtistAlias.artist_id):
+            resolver.by_key[alias_key] = artist_id
+        return resolver
+
+    def add(self, artist_id: int, name: str, mbid: str = None):
+        # duplicates that share a key resolve to the oldest artist until they are merged
+        self.by_key.setdefault(normalize_artist_name(name), artist_id)
+        self.mbid_of[artist_id] = mbid
+        if mbid:
+            self.by_mbid[mbid] = artist_id
+
+    def set_mbid(self, artist_id: int, mbid: str):
+        self.mbid_of[artist_id] = mbid
+        self.by_mbid[mbid] = artist_id
+
+    def resolve(self, name: str, mbid: str = None):
+        """
+        (artist_id, matched_by) for a chart name, or (None, None).
+        A name match is rejected when both sides have different MBIDs (two artists, one name).
+        """
+        if mbid and mbid in self.by_mbid:
+            return self.by_mbid[mbid], "mbid"
+        artist_id = self.by_key.get(normalize_artist_name(name))
+        if artist_id is None:
+            return None, None
+        known = self.mbid_of.get(artist_id)
+        if mbid and known and known != mbid:
+            return None, None
+        return artist_id, "name"
+
+    def resolve_chart(self, occurrences):
+        """
+        Plan the artists of one chart. `occurrences` are the chart's (name, MBID) pairs in
+        chart order, mapped to how often they occur. Returns a dict:
+          matched  {(name, mbid): artist_id} of the pairs the index resolves
+          new      [{"name", "mbid", "members"}] artists to create; members are their pairs
+          claims   {artist_id: mbid}: MBIDs reported for matched artists that have none
+          aliases  [(name, artist_id)] spellings matched through their MBID
+
+        One rule decides who owns an MBID: the artist holding it; an MBID nobody holds goes
+        to the first chart artist reporting it (a matched artist, else a new one), and every
+        later pair with that MBID follows it. An artist is only matched by name when its MBID
+        (stored or claimed here) does not contradict the pair's. A new artist is keyed by its
+        MBID, else its normalized name; a new name without MBID joins the only new artist with
+        an MBID that shares its key. It is named after its most frequent spelling (the first
+        one on ties).
+        """
+        matched, claims, aliases = {}, {}, []
+        groups = {}  # ("mbid", mbid) / ("key", normalized name) -> [(name, mbid)]
+        owner = {}   # MBID nobody holds -> artist_id or group identity
+        for name, mbid in occurrences:
+            if mbid and mbid not in self.by_mbid and mbid in owner:
+                target = owner[mbid]
+                if isinstance(target, tuple):
+                    groups[target].append((name, mbid))
+                else:
+                    matched[(name, mbid)] = target
+                continue
+            artist_id, matched_by = self.resolve(name, mbid)
+            if artist_id is not None and mbid and matched_by == "name":
+                claimed = claims.get(artist_id)
+                if claimed and claimed != mbid:
+                    artist_id = None  # another MBID of this chart already owns the artist
+                elif self.mbid_of.get(artist_id) is None:
+                    claims[artist_id] = mbid
+                    owner[mbid] = artist_id
+            if artist_id is not None:
+                matched[(name, mbid)] = artist_id
+                if matched_by == "mbid":
+                    aliases.append((name, artist_id))
+                continue
+            identity = ("mbid", mbid) if mbid else ("key", normalize_artist_name(name))
+            groups.setdefault(identity, []).append((name, mbid))
+            if mbid:
+                owner[mbid] = identity
+
+        keys_with_mbid = defaultdict(list)
+        for identity, members in groups.items():
+            if identity[0] == "mbid":
+                for key in {normalize_artist_name(n) for n, _ in members}:
+                    keys_with_mbid[key].append(identity)
+        for identity in [i for i in groups if i[0] == "key"]:
+            targets = keys_with_mbid.get(identity[1], [])
+            if len(targets) == 1:
+                groups[targets[0]].extend(groups.pop(identity))
+
+        new = [
+            {"name": max(members, key=occurrences.__getitem__)[0],
+             "mbid": identity[1] if identity[0] == "mbid" else None,
+             "members": members}
+            for identity, members in groups.items()
+        ]
+        return {"matched": matched, "new": new, "claims": claims, "aliases": aliases}
+
+
+def insert_artists(db: Session, artists, created_at: datetime = None):
+    """
+    Insert [(name, mbid), ...] and return their artist ids, in order. An artist is identified
+    by its MBID, or without one by its normalized name among the artists without MBID
+    (artists.name is only the display name and may repeat); a row that conflicts on that
+    identity is skipped and resolves to the artist already holding it.
+    """
+    rows = [
+        {"name": name, "name_key": normalize_artist_name(name), "musicbrainz_id": mbid,
+         "created_at": created_at or datetime.utcnow()}
+        for name, mbid in artists
+    ]
+    if not rows:
+        return []
+    insert_ignore(db, Artist, rows)
+
+    mbids = [r["musicbrainz_id"] for r in rows if r["musicbrainz_id"]]
+    keys = [r["name_key"] for r in rows if not r["musicbrainz_id"]]
+    by_mbid = dict(
+        db.query(Artist.musicbrainz_id, Artist.id).filter(Artist.musicbrainz_id.in_(mbids))
+    ) if mbids else {}
+    by_key = {}
+    if keys:
+        for key, artist_id in (
+            db.query(Artist.name_key, Artist.id)
+            .filter(Artist.name_key.in_(keys), Artist.musicbrainz_id.is_(None))
+            .order_by(Artist.id)
+        ):
+            by_key.setdefault(key, artist_id)
+    return [by_mbid[r["musicbrainz_id"]] if r["musicbrainz_id"] else by_key[r["name_key"]] for r in rows]
+
+
+def backfill_name_keys(db: Session, batch_size: int = 1000):
+    """
+    Fill artists.name_key of rows created before it existed. Among artists without MBID the
+    key is unique: a row whose key another one already holds keeps none (it is a duplicate
+    for merge_duplicate_artists). Returns the number of rows filled.
+    """
+    held = {k for (k,) in db.query(Artist.name_key).filter(
+        Artist.name_key.isnot(None), Artist.musicbrainz_id.is_(None)
+    )}
+    updates = []
+    for artist_id, name, mbid in (
+        db.query(Artist.id, Artist.name, Artist.musicbrainz_id)
+        .filter(Artist.name_key.is_(None))
+        .order_by(Artist.id)
+    ):
+        key = normalize_artist_name(name)
+        if not mbid:
+            if key in held:
+                continue
+            held.add(key)
+        updates.append({"id": artist_id, "name_key": key})
+    for i in range(0, len(updates), batch_size):
+        db.execute(update(Artist), updates[i:i + batch_size])
+        db.commit()
+    return len(updates)
+
+
+def record_aliases(db: Session, resolver: ArtistResolver, aliases):
+    """
+    Persist [(name, artist_id), ...] spellings whose key the index does not know yet
+    (e.g. a chart name matched through its MBID). Runs in the caller's transaction.
+    """
+    rows = {}
+    for name, artist_id in aliases:
+        key = normalize_artist_name(name)
+        if key not in resolver.by_key and key not in rows:
+            rows[key] = {"alias_key": key, "artist_id": artist_id, "name": name, "source": "chart",
+                         "created_at": datetime.utcnow()}
+    if rows:
+        insert_ignore(db, ArtistAlias, list(rows.values()))
+        for key, row in rows.items():
+            resolver.by_key[key] = row["artist_id"]
+    return len(rows)
+
+
+def find_duplicate_artists(db: Session):
+    """
+    Groups of artists sharing a normalized name: [(keeper_id, [duplicate ids])].
+    The keeper is the artist with an MBID, else with a country, else the oldest.
+    Groups holding two different MBIDs are distinct artists and are left alone.
+    """
+    groups = defaultdict(list)
+    for artist_id, name, mbid, country in db.query(
+        Artist.id, Artist.name, Artist.musicbrainz_id, Artist.country
+    ).order_by(Artist.id):
+        groups[normalize_artist_name(name)].append((artist_id, mbid, country))
+
+    merges = []
+    for members in groups.values():
+        if len(members) < 2 or len({m for _, m, _ in members if m}) > 1:
+            continue
+        keeper = min(members, key=lambda a: (a[1] is None, a[2] is None, a[0]))[0]
+        merges.append((keeper, [a for a, _, _ in members if a != keeper]))
+    return merges
+
+
+def merge_duplicate_artists(db: Session, dry_run: bool = False):
+    """
+    Merge artists whose names normalize to the same key into one (see find_duplicate_artists).
+
+    The keeper already holds the group's MBID, if any. For each duplicate: its tracks and
+    aliases move to the keeper, its country/genres fill gaps on the keeper, its name becomes
+    an alias, the aggregates of the snapshots it charted in are recomputed and the row is
+    deleted. One commit per group. Tracks that now collide on their natural key still need
+    `dedupe_tracks` (the manage.py command runs it).
+    """
+    merges = find_duplicate_artists(db)
+    stats = {
+        "dry_run": dry_run,
+        "groups": len(merges),
+        "artists_merged": sum(len(d) for _, d in merges),
+        "snapshots_refreshed": 0,
+    }
+    if dry_run:
+        stats["sample"] = [
+            [name for (name,) in db.query(Artist.name).filter(Artist.id.in_([k] + d)).order_by(Artist.id)]
+            for k, d in merges[:20]
+        ]
+        return stats
+
+    for keeper_id, dup_ids in merges:
+        keeper = db.get(Artist, keeper_id)
+        dups = db.query(Artist).filter(Artist.id.in_(dup_ids)).order_by(Artist.id).all()
+
+        keeper_has_genres = db.query(ArtistGenre.artist_id).filter(ArtistGenre.artist_id == keeper_id).first()
+        for dup in dups:
+            if keeper.country is None and dup.country:
+                keeper.country = dup.country
+            if keeper.genres is None and dup.genres:
+                keeper.genres = dup.genres
+                if not keeper_has_genres:
+                    db.execute(update(ArtistGenre).where(ArtistGenre.artist_id == dup.id).values(artist_id=keeper_id))
+                    keeper_has_genres = True
+
+        db.execute(update(Track).where(Track.artist_id.in_(dup_ids)).values(artist_id=keeper_id))
+        snapshots = (
+            db.query(SnapshotArtistCount.country, SnapshotArtistCount.fetched_at)
+            .filter(SnapshotArtistCount.artist_id.in_(dup_ids))
+            .distinct()
+            .all()
+        )
+        for country, fetched_at in snapshots:
+            refresh_snapshot_aggregates(db, country, fetched_at)
+        stats["snapshots_refreshed"] += len(snapshots)
+
+        db.execute(update(ArtistAlias).where(ArtistAlias.artist_id.in_(dup_ids)).values(artist_id=keeper_id))
+        db.execute(delete(ArtistGenre).where(ArtistGenre.artist_id.in_(dup_ids)))
+        db.execute(delete(ArtistEnrichment).where(ArtistEnrichment.artist_id.in_(dup_ids)))
+        # same key for the whole group: the first spelling is enough
+        insert_ignore(db, ArtistAlias, [
+            {"alias_key": normalize_artist_name(d.name), "artist_id": keeper_id, "name": d.name,
+             "source": "merge", "created_at": datetime.utcnow()}
+            for d in dups[:1]
+        ])
+        db.flush()
+        db.execute(delete(Artist).where(Artist.id.in_(dup_ids)))
+        db.commit()
+    return stats
@@ -1,34 +1,315 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.bulk import insert_ignore
 from app.models.artist import Artist
 from app.models.track import Track
 from app.models.track_trend import TrackTrend
+from app.services import analytics_cache, events
+from app.services.artist_resolver import ArtistResolver, insert_artists, record_aliases
 from app.services.lastfm_client import get_top_tracks_by_country
-from datetime import datetime
+from app.services.snapshot_aggregates import refresh_snapshot_aggregates
+from app.services.snapshots import (
+    new_run_key,
+    record_snapshot,
+    replace_keyed_snapshots,
+    run_snapshot_key,
+)
+from app.services.track_dedupe import track_natural_key
 
-def run_lastfm_etl(db: Session, country: str, limit: int = 50):
-    items = get_top_tracks_by_country(country, limit)
-    run_time = datetime.utcnow()
 
+def _parse_items(items):
+    """Flatten the Last.fm payload into plain dicts, skipping malformed entries."""
+    rows = []
     for t in items:
-        artist_name = t["artist"]["name"].strip()
-
-        artist = db.query(Artist).filter(Artist.name == artist_name).first()
-        if not artist:
-            artist = Artist(name=artist_name)
-            db.add(artist)
-            db.commit()
-            db.refresh(artist)
-
-        title = t["name"].strip()
-        url = t.get("url")
-        mbid = t.get("mbid") or None
-
-        track = Track(title=title, artist_id=artist.id, url=url, mbid=mbid)
-        db.add(track)
-        db.commit()
-        db.refresh(track)
-
-        rank = int(t["@attr"]["rank"])
-        trend = TrackTrend(track_id=track.id, country=country, rank=rank, fetched_at=run_time)
-        db.add(trend)
-        db.commit()
\ No newline at end of file
+        try:
+            artist_name = t["artist"]["name"].strip()
+            title = t["name"].strip()
+            rank = int(t["@attr"]["rank"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not artist_name or not title:
+            continue
+        rows.append(
+            {
+                "artist_name": artist_name,
+                "title": title,
+                "url": t.get("url"),
+                "mbid": t.get("mbid") or None,
+                "artist_mbid": (t["artist"].get("mbid") or "").strip() or None,
+                "rank": rank,
+            }
+        )
+    return rows
+
+
+def normalize_countries(values):
+    """Country names from values that may be comma-separated: stripped, lowercased, deduplicated."""
+    countries = (c.strip().lower() for value in values if value for c in value.split(","))
+    return list(dict.fromkeys(c for c in countries if c))
+
+
+def run_lastfm_etl(db: Session, country: str, limit: int = 50, run_key: str = None):
+    """
+    Fetch one Last.fm geo.getTopTracks snapshot for `country` and ingest it.
+    Returns row counts and per-phase timings (seconds). `run_key` is the snapshot key of
+    the run being retried (see snapshots.run_snapshot_key).
+    """
+    country = country.strip().lower()
+    fetched_at = datetime.utcnow()
+    t0 = time.perf_counter()
+    items = get_top_tracks_by_country(country, limit, fetched_at)
+    fetch_seconds = time.perf_counter() - t0
+
+    return ingest_lastfm_items(
+        db, country, items, timings={"fetch": fetch_seconds}, fetched_at=fetched_at,
+        snapshot_key=run_snapshot_key(fetched_at, run_key),
+    )
+
+
+def _resolve_artists(db: Session, rows, resolver: ArtistResolver, run_time: datetime):
+    """
+    Artist id of every chart (name, MBID) pair: planned in memory by
+    ArtistResolver.resolve_chart, then the new artists are inserted on their identity
+    (artist_resolver.insert_artists), the claimed MBIDs stored and the new spellings kept
+    as aliases. Returns ({(name, mbid): artist_id}, stats).
+    """
+    # a chart artist is (name, MBID): two artists called "Nirvana" can chart together
+    occurrences = Counter((r["artist_name"], r["artist_mbid"]) for r in rows)  # chart order
+    plan = resolver.resolve_chart(occurrences)
+    artist_ids = dict(plan["matched"])
+    aliases = list(plan["aliases"])
+
+    ids = insert_artists(db, [(a["name"], a["mbid"]) for a in plan["new"]], run_time)
+    for artist, artist_id in zip(plan["new"], ids):
+        resolver.add(artist_id, artist["name"], artist["mbid"])
+        for member in artist["members"]:
+            artist_ids[member] = artist_id
+            aliases.append((member[0], artist_id))  # only spellings with another key are kept
+
+    # a claimed MBID can have been stored meanwhile by a concurrent run: leave it to that artist
+    claims = plan["claims"]
+    taken = set()
+    if claims:
+        taken = {
+            m for (m,) in db.query(Artist.musicbrainz_id).filter(Artist.musicbrainz_id.in_(claims.values()))
+        }
+    mbid_updates = [{"id": a, "musicbrainz_id": m} for a, m in claims.items() if m not in taken]
+    if mbid_updates:
+        db.execute(update(Artist), mbid_updates)
+        for u in mbid_updates:
+            resolver.set_mbid(u["id"], u["musicbrainz_id"])
+
+    return artist_ids, {
+        "new_artists": len(set(ids)),
+        "artist_mbids": len({i for a, i in zip(plan["new"], ids) if a["mbid"]}) + len(mbid_updates),
+        "artist_aliases": record_aliases(db, resolver, aliases),
+    }
+
+
+def _upsert_tracks(db: Session, rows, artist_ids):
+    """Track id of every chart row, inserting the missing tracks on their natural key. Returns (ids, new rows)."""
+    keys = []
+    track_rows = {}
+    for r in rows:
+        artist_id = artist_ids[(r["artist_name"], r["artist_mbid"])]
+        key = track_natural_key(artist_id, r["title"], r["mbid"])
+        keys.append(key)
+        track_rows.setdefault(
+            key,
+            {
+                "title": r["title"],
+                "artist_id": artist_id,
+                "url": r["url"],
+                "mbid": r["mbid"],
+                "natural_key": key,
+            },
+        )
+    if not track_rows:
+        return [], 0
+    track_ids_by_key = dict(
+        db.query(Track.natural_key, Track.id)
+        .filter(Track.natural_key.in_(track_rows.keys()))
+        .all()
+    )
+    new_tracks = [v for k, v in track_rows.items() if k not in track_ids_by_key]
+    if new_tracks:
+        insert_ignore(db, Track, new_tracks)
+        track_ids_by_key.update(
+            db.query(Track.natural_key, Track.id)
+            .filter(Track.natural_key.in_([t["natural_key"] for t in new_tracks]))
+            .all()
+        )
+    return [track_ids_by_key[k] for k in keys], len(new_tracks)
+
+
+def _publish_snapshot_event(db: Session, country: str, run_time: datetime, snapshot_key, replaced, trend_rows):
+    event = {
+        "country": country,
+        "fetched_at": run_time.isoformat(),
+        "snapshot_key": snapshot_key,
+        "replaced": [t.isoformat() for t in replaced],
+        "trends": len(trend_rows),
+    }
+    if events.INCLUDE_DIFF and events.hub.has_subscribers():
+        ranks = {}
+        for row in trend_rows:
+            ranks[row["track_id"]] = min(row["rank"], ranks.get(row["track_id"], row["rank"]))
+        event["diff"] = events.snapshot_diff(db, country, run_time, ranks)
+    events.publish("snapshot", event)
+
+
+def ingest_lastfm_items(db: Session, country: str, items, timings=None, snapshot_key=None,
+                        resolver: ArtistResolver = None, fetched_at: datetime = None):
+    """
+    Write an already-fetched chart (`items` from the Last.fm payload) as one snapshot.
+
+    `snapshot_key` is the idempotency key (default: a new run key or the chart period, see
+    snapshots.run_snapshot_key); a snapshot already stored under the same (country, key)
+    is replaced in this transaction instead of being duplicated.
+
+    `resolver` is the artist index of this run (app/services/artist_resolver); batch runs pass
+    one warmed index to every country, otherwise it is loaded here.
+
+    `fetched_at` is the snapshot time (default: now). Live runs pass the time the fetch
+    started, which the payload archive also records for the chart's pages, and replays of
+    archived charts pass that archived time: a replay then finds the snapshot a live run
+    already made (replay.replay_lastfm skips it).
+
+    Everything is done in bulk and committed once, so readers see the whole snapshot or none:
+      1) resolve the chart's (artist name, MBID) pairs and create the missing artists
+         (_resolve_artists)
+      2) upsert tracks on their natural key (see track_dedupe.track_natural_key)
+      3) drop the previous snapshot with the same key, insert all track_trends rows in one
+         statement + the snapshots catalog row
+      4) fill the snapshot aggregate tables (app/services/snapshot_aggregates)
+    """
+    timings = dict(timings or {})
+    run_time = fetched_at or datetime.utcnow()
+    if snapshot_key is None:
+        snapshot_key = run_snapshot_key(run_time)
+
+    t0 = time.perf_counter()
+    rows = _parse_items(items)
+    timings["parse"] = time.perf_counter() - t0
+
+    # 1) artists
+    t0 = time.perf_counter()
+    if resolver is None:
+        resolver = ArtistResolver.load(db)
+    artist_ids, artist_stats = _resolve_artists(db, rows, resolver, run_time)
+    timings["artists"] = time.perf_counter() - t0
+
+    # 2) tracks
+    t0 = time.perf_counter()
+    track_ids, new_tracks = _upsert_tracks(db, rows, artist_ids)
+    timings["tracks"] = time.perf_counter() - t0
+
+    # 3) trends
+    t0 = time.perf_counter()
+    trend_rows = [
+        {"track_id": track_id, "country": country, "rank": r["rank"], "fetched_at": run_time}
+        for r, track_id in zip(rows, track_ids)
+    ]
+    replaced = []
+    if trend_rows:  # an empty chart never replaces a stored snapshot
+        replaced = replace_keyed_snapshots(db, country, snapshot_key)
+        db.execute(insert(TrackTrend), trend_rows)
+        record_snapshot(db, country, run_time, len(trend_rows), snapshot_key)
+    timings["trends"] = time.perf_counter() - t0
+
+    # 4) per-snapshot aggregates for the analytics endpoints, same transaction
+    t0 = time.perf_counter()
+    if trend_rows:
+        refresh_snapshot_aggregates(db, country, run_time)
+    timings["aggregates"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    db.commit()
+    timings["commit"] = time.perf_counter() - t0
+
+    analytics_cache.invalidate_countries([country])
+    metrics.observe_phases("lastfm", timings)
+    if trend_rows:
+        _publish_snapshot_event(db, country, run_time, snapshot_key, replaced, trend_rows)
+
+    return {
+        "fetched_at": run_time.isoformat(),
+        "snapshot_key": snapshot_key,
+        "replaced": [t.isoformat() for t in replaced],
+        "items": len(items),
+        **artist_stats,
+        "new_tracks": new_tracks,
+        "trends": len(trend_rows),
+        "timings": {k: round(v, 4) for k, v in timings.items()},
+    }
+
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LASTFM_MAX_CONCURRENCY", "8"))
+
+
+def run_lastfm_etl_batch(db: Session, countries, limit: int = 50, max_concurrency: int = None,
+                         progress=None, run_key: str = None):
+    """
+    Refresh several countries at once.
+
+    Charts are fetched concurrently (thread pool over the shared keep-alive session in
+    lastfm_client, capped at `max_concurrency`); each chart is ingested on the calling
+    thread as soon as it arrives, so the DB session is never shared between threads.
+    One failing country does not abort the others.
+
+    `progress(done, total)` is called after each country; it may raise to stop the run
+    (countries already ingested stay committed).
+
+    Every country's snapshot is keyed by the run key (returned as `run_key`, a new one unless
+    given): retrying a half-failed run with it replaces the snapshots the run already wrote.
+    """
+    run_key = run_key or new_run_key()
+    countries = normalize_countries(countries)
+    workers = max(1, min(max_concurrency or DEFAULT_MAX_CONCURRENCY, len(countries) or 1))
+
+    def _fetch(country):
+        fetched_at = datetime.utcnow()
+        t0 = time.perf_counter()
+        items = get_top_tracks_by_country(country, limit, fetched_at)
+        return items, time.perf_counter() - t0, fetched_at
+
+    results = {}
+    started = time.perf_counter()
+    resolver = ArtistResolver.load(db)  # warmed once, shared by every country of the batch
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lastfm-fetch")
+    try:
+        futures = {pool.submit(_fetch, c): c for c in countries}
+        for future in as_completed(futures):
+            country = futures[future]
+            try:
+                items, fetch_seconds, fetched_at = future.result()
+                stats = ingest_lastfm_items(
+                    db, country, items, timings={"fetch": fetch_seconds}, resolver=resolver,
+                    fetched_at=fetched_at, snapshot_key=run_snapshot_key(fetched_at, run_key),
+                )
+                results[country] = {"status": "ok", "latency": round(fetch_seconds, 4), **stats}
+            except Exception as e:
+                db.rollback()
+                resolver = ArtistResolver.load(db)  # drop artists the rollback took back
+                results[country] = {"status": "failed", "error": str(e)}
+            if progress:
+                progress(len(results), len(countries))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {
+        "countries": len(countries),
+        "run_key": run_key,
+        "succeeded": sum(1 for r in results.values() if r["status"] == "ok"),
+        "max_concurrency": workers,
+        "elapsed": round(time.perf_counter() - started, 4),
+        "results": {c: results[c] for c in countries},
+    }
@@ -1,45 +1,270 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
+from app.core import metrics
 from app.models.artist import Artist
+from app.models.artist_enrichment import ArtistEnrichment
+from app.models.track import Track
+from app.models.track_trend import TrackTrend
+from app.services import analytics_cache, events
+from app.services.genres import set_artist_genres
+from app.services.snapshot_aggregates import refresh_latest_snapshots_for_artists
+from app.services.snapshots import latest_snapshots
 from app.services.musicbrainz_client import (
+    LOOKUP_BATCH_SIZE,
     search_artist_by_name,
     get_artist_details,
+    lookup_artists_by_mbids,
 )
-import time  # 🔥 추가
 
-def run_musicbrainz_etl(db: Session, limit: int = 20):
-    artists = (
+# requests in flight at once; the shared token bucket in musicbrainz_client still
+# caps them at 1 req/s, this only overlaps network latency with the wait for the next slot
+PIPELINE_DEPTH = int(os.getenv("MUSICBRAINZ_PIPELINE_DEPTH", "2"))
+
+# retry schedule for artists that could not be enriched: base * 2^(attempts-1), capped
+RETRY_BASE_HOURS = float(os.getenv("MUSICBRAINZ_RETRY_BASE_HOURS", "24"))
+RETRY_MAX_DAYS = float(os.getenv("MUSICBRAINZ_RETRY_MAX_DAYS", "30"))
+ERROR_RETRY_MINUTES = float(os.getenv("MUSICBRAINZ_ERROR_RETRY_MINUTES", "15"))  # network/API errors
+# search hits scoring below this are not applied (MusicBrainz scores 0-100)
+MIN_MATCH_SCORE = int(os.getenv("MUSICBRAINZ_MIN_SCORE", "0"))
+# candidates are ordered by chart appearances within this window
+PRIORITY_WINDOW_DAYS = int(os.getenv("MUSICBRAINZ_PRIORITY_DAYS", "30"))
+
+log = logging.getLogger("musicscope.musicbrainz")
+
+
+def _fetch_artist_info(name: str, mbid: str = None, refresh: bool = False):
+    """
+    Return (mbid, payload, score, source) for one artist, using as few requests as possible:
+      - known MBID: a single lookup with inc=tags (MusicBrainz follows merges, so the
+        returned id may differ); an MBID it does not know (404) falls back to the name
+      - otherwise: a name search; search hits already carry country/tags,
+        so the details lookup only runs when the hit has neither
+    `refresh` bypasses the cached responses (retries of earlier misses).
+    """
+    if mbid:
+        import requests  # imported with the client's session, not at app import
+
+        try:
+            info = get_artist_details(mbid, refresh=refresh)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+        else:
+            return info.get("id") or mbid, info, 100, "mbid"
+
+    result = search_artist_by_name(name, refresh=refresh)
+    if not result:
+        return None, None, None, "search"
+
+    mbid = result.get("id")
+    score = result.get("score")
+    score = int(score) if score is not None else None
+    if "country" in result or "tags" in result:
+        return mbid, result, score, "search"
+    return mbid, get_artist_details(mbid, refresh=refresh), score, "search"
+
+
+def _apply_artist_info(db: Session, artist: Artist, mbid: str, info: dict, claimed: set):
+    if mbid and mbid != artist.musicbrainz_id and mbid not in claimed:
+        taken = (
+            db.query(Artist.id)
+            .filter(Artist.musicbrainz_id == mbid, Artist.id != artist.id)
+            .first()
+        )
+        if not taken:
+            artist.musicbrainz_id = mbid
+    if artist.musicbrainz_id:
+        claimed.add(artist.musicbrainz_id)
+
+    artist.country = info.get("country")
+
+    tags = info.get("tags", [])
+    genres = [t["name"] for t in tags[:5]]
+
+    artist.genres = ",".join(genres) if genres else None
+
+
+def retry_delay(attempts: int, status: str):
+    """Backoff before the next attempt; None when the artist needs no retry."""
+    if status == "matched":
+        return None
+    if status == "error":
+        return timedelta(minutes=ERROR_RETRY_MINUTES)
+    hours = RETRY_BASE_HOURS * (2 ** max(0, attempts - 1))
+    return min(timedelta(hours=hours), timedelta(days=RETRY_MAX_DAYS))
+
+
+def select_candidates(db: Session, limit: int, now=None):
+    """
+    Artists still missing a country whose retry time has come, most charted first:
+    chart appearances in the last PRIORITY_WINDOW_DAYS, then fewest attempts, then id.
+    """
+    now = now or datetime.utcnow()
+    recent = (
+        db.query(Track.artist_id.label("artist_id"), func.count(TrackTrend.id).label("appearances"))
+        .join(TrackTrend, TrackTrend.track_id == Track.id)
+        .filter(TrackTrend.fetched_at >= now - timedelta(days=PRIORITY_WINDOW_DAYS))
+        .group_by(Track.artist_id)
+        .subquery()
+    )
+    return (
         db.query(Artist)
+        .outerjoin(ArtistEnrichment, ArtistEnrichment.artist_id == Artist.id)
+        .outerjoin(recent, recent.c.artist_id == Artist.id)
         .filter(Artist.country.is_(None))
+        .filter(or_(ArtistEnrichment.artist_id.is_(None), ArtistEnrichment.next_retry_at <= now))
+        .order_by(
+            func.coalesce(recent.c.appearances, 0).desc(),
+            func.coalesce(ArtistEnrichment.attempts, 0),
+            Artist.id,
+        )
         .limit(limit)
         .all()
     )
 
-    updated = 0
 
-    for artist in artists:
-        # 🔥 search 요청
-        result = search_artist_by_name(artist.name)
-        time.sleep(1)  # 🔥 rate limit 대응
+def _record_attempt(state: ArtistEnrichment, status: str, now, score=None, source=None, error=None):
+    state.status = status
+    state.attempts = (state.attempts or 0) + 1
+    state.last_attempt_at = now
+    state.match_score = score
+    state.source = source
+    state.last_error = error[:500] if error else None
+    delay = retry_delay(state.attempts, status)
+    state.next_retry_at = now + delay if delay else None
+
+
+def run_musicbrainz_etl(db: Session, limit: int = 20, progress=None):
+    """
+    Enrich artists that have no country yet. Returns the number of updated artists.
+
+    Every attempt is recorded in artist_enrichments; misses (no match, no country in
+    MusicBrainz, low score, errors) are retried with exponential backoff instead of being
+    searched again on every run. Candidates are ordered by recent chart appearances.
+
+    `progress(done, total)` is called after each artist; if it raises, pending lookups
+    are cancelled and the exception propagates (nothing from this run is committed).
+    """
+    now = datetime.utcnow()
+    with metrics.phase_timer("musicbrainz", "select"):
+        artists = select_candidates(db, limit, now)
+        states = {
+            s.artist_id: s
+            for s in db.query(ArtistEnrichment).filter(
+                ArtistEnrichment.artist_id.in_([a.id for a in artists])
+            ).all()
+        } if artists else {}
 
-        if not result:
-            continue
+    updated_genres = {}  # artist_id -> genres CSV, for artist_genres
+    claimed = set()  # MBIDs assigned during this run (musicbrainz_id is unique)
 
-        mbid = result.get("id")
+    # Artists with a known MBID (e.g. reported by Last.fm) are resolved in batched id
+    # searches; an MBID the batch did not return (merged/deleted) gets a direct lookup,
+    # then a name search. Artists without an MBID go straight to the name search.
+    # Lookups run ahead in a small pool; results are applied here in order on this thread.
+    # a retry must ask MusicBrainz again: the cached answer is the miss being retried
+    retrying = {a.id for a in artists if states.get(a.id) is not None and states[a.id].attempts}
+    with_mbid = [a for a in artists if a.musicbrainz_id]
+    pool = ThreadPoolExecutor(max_workers=max(1, PIPELINE_DEPTH), thread_name_prefix="mb-fetch")
+    try:
+        with metrics.phase_timer("musicbrainz", "lookups"):
+            batch_of = {}
+            for i in range(0, len(with_mbid), LOOKUP_BATCH_SIZE):
+                chunk = with_mbid[i:i + LOOKUP_BATCH_SIZE]
+                batch = pool.submit(
+                    lookup_artists_by_mbids,
+                    [a.musicbrainz_id for a in chunk],
+                    refresh=any(a.id in retrying for a in chunk),
+                )
+                batch_of.update({a.id: batch for a in chunk})
+            searches = {
+                a.id: pool.submit(_fetch_artist_info, a.name, refresh=a.id in retrying)
+                for a in artists if a.id not in batch_of
+            }
 
-        # 🔥 detail 요청
-        details = get_artist_details(mbid)
-        time.sleep(1)  # 🔥 rate limit 대응
+            def _result(artist):
+                if artist.id in searches:
+                    return searches[artist.id].result()
+                info = batch_of[artist.id].result().get(artist.musicbrainz_id)
+                if info is not None:
+                    return artist.musicbrainz_id, info, 100, "mbid"
+                return _fetch_artist_info(artist.name, artist.musicbrainz_id, refresh=artist.id in retrying)
 
-        artist.musicbrainz_id = mbid
-        artist.country = details.get("country")
+            for done, artist in enumerate(artists, start=1):
+                state = states.get(artist.id)
+                if state is None:
+                    state = states[artist.id] = ArtistEnrichment(artist_id=artist.id, attempts=0)
+                    db.add(state)
 
-        tags = details.get("tags", [])
-        genres = [t["name"] for t in tags[:5]]
+                try:
+                    mbid, info, score, source = _result(artist)
+                except Exception as e:
+                    log.warning("lookup failed for %r: %s", artist.name, e)
+                    _record_attempt(state, "error", now, error=str(e))
+                    info = None
+                else:
+                    if not info:
+                        _record_attempt(state, "no_match", now, source=source)
+                    elif score is not None and score < MIN_MATCH_SCORE:
+                        _record_attempt(state, "low_score", now, score=score, source=source)
+                        info = None
+                    else:
+                        status = "matched" if info.get("country") else "no_country"
+                        _record_attempt(state, status, now, score=score, source=source)
 
-        artist.genres = ",".join(genres) if genres else None
+                if info:
+                    _apply_artist_info(db, artist, mbid, info, claimed)
+                    db.add(artist)
+                    updated_genres[artist.id] = artist.genres
 
-        db.add(artist)
-        updated += 1
+                if progress:
+                    progress(done, len(artists))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-    db.commit()
-    return updated
\ No newline at end of file
+    with metrics.phase_timer("musicbrainz", "genres"):
+        db.flush()
+        set_artist_genres(db, updated_genres)
+    with metrics.phase_timer("musicbrainz", "aggregates"):
+        countries = refresh_latest_snapshots_for_artists(db, updated_genres)
+    with metrics.phase_timer("musicbrainz", "commit"):
+        db.commit()
+    analytics_cache.invalidate_countries(countries)
+    if countries:
+        latest = latest_snapshots(db, countries)
+        for country in countries:
+            events.publish("aggregates", {
+                "country": country,
+                "fetched_at": latest[country].isoformat() if country in latest else None,
+                "updated_artists": len(updated_genres),
+            })
+    return len(updated_genres)
+
+
+def enrichment_summary(db: Session):
+    """Artists per enrichment status, plus how many are due for a (re)try now."""
+    now = datetime.utcnow()
+    by_status = dict(
+        db.query(ArtistEnrichment.status, func.count(ArtistEnrichment.artist_id))
+        .group_by(ArtistEnrichment.status)
+        .all()
+    )
+    pending = (
+        db.query(func.count(Artist.id))
+        .outerjoin(ArtistEnrichment, ArtistEnrichment.artist_id == Artist.id)
+        .filter(Artist.country.is_(None))
+        .filter(or_(ArtistEnrichment.artist_id.is_(None), ArtistEnrichment.next_retry_at <= now))
+        .scalar()
+    )
+    never_attempted = (
+        db.query(func.count(Artist.id))
+        .outerjoin(ArtistEnrichment, ArtistEnrichment.artist_id == Artist.id)
+        .filter(Artist.country.is_(None), ArtistEnrichment.artist_id.is_(None))
+        .scalar()
+    )
+    return {"by_status": by_status, "due_now": pending, "never_attempted": never_attempted}
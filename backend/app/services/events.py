@@ -0,0 +1,180 @@
+"""
+In-process change feed: the ETLs publish an event after each commit, and the SSE/WebSocket
+endpoints in app/api/events.py fan it out, so dashboards refetch on change instead of polling.
+
+  - "snapshot":   a Last.fm snapshot was committed (country, fetched_at, snapshot_key,
+                  replaced, trends and, with EVENTS_DIFF=1, the track-level diff against the
+                  previous snapshot of that country)
+  - "aggregates": the MusicBrainz ETL refreshed the genre/nationality counts of a country's
+                  latest snapshot (country, fetched_at)
+  - "resync":     this subscriber fell behind and lost events; refetch everything
+
+`publish` may be called from any thread (ETL jobs run on worker threads). Every subscriber has
+a bounded asyncio queue on its own event loop; a subscriber whose queue is full gets its
+backlog replaced by one "resync" event, so a slow client never holds memory or slows the ETL.
+The last EVENTS_HISTORY events are kept for reconnects (SSE Last-Event-ID / `last_event_id`).
+Event ids restart at 1 with the process, so a reconnect with an id this process never issued
+(newer than its newest event) gets a "resync", as does one whose events left the history.
+
+Like the analytics cache, the hub lives in the API process: ETLs started from manage.py in
+another process do not reach it.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))    # buffered events per subscriber
+HISTORY_SIZE = int(os.getenv("EVENTS_HISTORY", "200"))     # events kept for reconnects
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+INCLUDE_DIFF = os.getenv("EVENTS_DIFF", "0").lower() in ("1", "true", "yes")
+
+
+def _event(event_id, event_type, data):
+    return {"id": event_id, "type": event_type, "time": datetime.utcnow().isoformat(), "data": data}
+
+
+class Subscription:
+    def __init__(self, hub, loop, countries, maxsize):
+        self.hub = hub
+        self.loop = loop
+        self.countries = {c.lower() for c in countries} if countries else None
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def wants(self, event):
+        if self.countries is None or event["type"] == "resync":
+            return True
+        return (event["data"].get("country") or "").lower() in self.countries
+
+    def _offer(self, event):
+        # runs on the subscriber's loop
+        if self.queue.full():
+            self.dropped += self.queue.qsize()
+            self.hub._count("dropped", self.queue.qsize())
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_event(event["id"], "resync", {"reason": "subscriber buffer overflow"}))
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float = None):
+        """Next event, or None after `timeout` seconds (time for a heartbeat)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self, queue_size: int = QUEUE_SIZE, history_size: int = HISTORY_SIZE):
+        self.queue_size = queue_size
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def subscribe(self, countries=None, last_event_id: int = None):
+        """New subscription on the running event loop; replays history after `last_event_id`."""
+        sub = Subscription(self, asyncio.get_running_loop(), countries, self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+            history = list(self._history)
+        if last_event_id is not None:
+            newest = history[-1]["id"] if history else 0
+            if last_event_id > newest:
+                # ids restart at 1 with every process: the client saw events of a previous one
+                sub._offer(_event(newest, "resync", {"reason": "unknown event id (server restarted)"}))
+                return sub
+            if history and history[0]["id"] > last_event_id + 1:
+                sub._offer(_event(history[0]["id"] - 1, "resync", {"reason": "events expired from history"}))
+            for event in history:
+                if event["id"] > last_event_id and sub.wants(event):
+                    sub._offer(event)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type: str, data: dict):
+        """Queue an event for every interested subscriber. Thread-safe, never blocks."""
+        with self._lock:
+            event = _event(next(self._ids), event_type, data)
+            self._history.append(event)
+            self.counters["published"] += 1
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, event)
+            except RuntimeError:  # the subscriber's loop is closed
+                self.unsubscribe(sub)
+                continue
+            self._count("delivered")
+        return event
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "subscribers": len(self._subscribers), "history": len(self._history)}
+
+
+hub = EventHub()
+
+
+def publish(event_type: str, data: dict):
+    return hub.publish(event_type, data)
+
+
+def snapshot_diff(db, country: str, fetched_at, track_ranks: dict):
+    """
+    Chart changes of a new snapshot ({track_id: rank}) against the previous snapshot
+    of `country`: entered/exited track ids and rank moves. None for a country's first snapshot.
+    """
+    from app.models.snapshot import Snapshot
+    from app.models.track_trend import TrackTrend
+
+    previous = (
+        db.query(Snapshot.fetched_at)
+        .filter(Snapshot.country == country, Snapshot.fetched_at < fetched_at)
+        .order_by(Snapshot.fetched_at.desc())
+        .limit(1)
+        .scalar()
+    )
+    if previous is None:
+        return None
+    before = {}
+    for track_id, rank in db.query(TrackTrend.track_id, TrackTrend.rank).filter(
+        TrackTrend.country == country, TrackTrend.fetched_at == previous
+    ):
+        before[track_id] = min(rank, before.get(track_id, rank))
+    moved = {
+        str(t): before[t] - r  # positive = climbed
+        for t, r in track_ranks.items()
+        if t in before and before[t] != r
+    }
+    return {
+        "previous_fetched_at": previous.isoformat(),
+        "entered": sorted(t for t in track_ranks if t not in before),
+        "exited": sorted(t for t in before if t not in track_ranks),
+        "moved": moved,
+    }
+
+
+def sse_format(event) -> bytes:
+    """One Server-Sent Events frame (the id lets the browser resume with Last-Event-ID)."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
@@ -0,0 +1,149 @@
+"""
+Streaming export of the chart history (track_trends joined with tracks and artists).
+
+Rows are read with `yield_per`, which makes SQLAlchemy use a server-side cursor on
+PostgreSQL (stream_results), and are handed out one partition at a time. Every writer
+below encodes a partition, emits it and drops it, so memory stays bounded by the chunk
+size rather than by the size of the history.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.artist import Artist
+from app.models.track import Track
+from app.models.track_trend import TrackTrend
+
+FORMATS = ("ndjson", "csv", "parquet")
+DEFAULT_CHUNK_SIZE = 5000
+
+COLUMNS = (
+    "trend_id",
+    "country",
+    "fetched_at",
+    "rank",
+    "track_id",
+    "track_title",
+    "track_mbid",
+    "artist_id",
+    "artist_name",
+    "artist_country",
+    "artist_mbid",
+)
+
+
+def _export_query(country=None, start=None, end=None):
+    filters = []
+    if country:
+        filters.append(TrackTrend.country == country)
+    if start:
+        filters.append(TrackTrend.fetched_at >= start)
+    if end:
+        filters.append(TrackTrend.fetched_at <= end)
+
+    # ordered like ix_track_trends_country_fetched_track (country, fetched_at, track_id), so the
+    # scan follows the index instead of sorting every snapshot; `rank` gives the chart order
+    return (
+        select(
+            TrackTrend.id,
+            TrackTrend.country,
+            TrackTrend.fetched_at,
+            TrackTrend.rank,
+            Track.id,
+            Track.title,
+            Track.mbid,
+            Artist.id,
+            Artist.name,
+            Artist.country,
+            Artist.musicbrainz_id,
+        )
+        .join(Track, Track.id == TrackTrend.track_id)
+        .outerjoin(Artist, Artist.id == Track.artist_id)
+        .where(*filters)
+        .order_by(TrackTrend.country, TrackTrend.fetched_at, TrackTrend.track_id, TrackTrend.id)
+    )
+
+
+def iter_row_chunks(db: Session, country=None, start=None, end=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yield lists of row tuples (in COLUMNS order), at most `chunk_size` rows each."""
+    result = db.execute(
+        _export_query(country, start, end),
+        execution_options={"yield_per": chunk_size},
+    )
+    try:
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+    finally:
+        result.close()
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def iter_ndjson(db: Session, country=None, start=None, end=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yield NDJSON-encoded bytes, one chunk per partition."""
+    for rows in iter_row_chunks(db, country, start, end, chunk_size):
+        lines = []
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            record["fetched_at"] = _iso(record["fetched_at"])
+            lines.append(json.dumps(record, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_csv(db: Session, country=None, start=None, end=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yield CSV-encoded bytes: the header first, then one chunk per partition."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    yield buf.getvalue().encode("utf-8")
+
+    for rows in iter_row_chunks(db, country, start, end, chunk_size):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows((*row[:2], _iso(row[2]), *row[3:]) for row in rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ("trend_id", pa.int64()),
+        ("country", pa.string()),
+        ("fetched_at", pa.timestamp("us")),
+        ("rank", pa.int32()),
+        ("track_id", pa.int64()),
+        ("track_title", pa.string()),
+        ("track_mbid", pa.string()),
+        ("artist_id", pa.int64()),
+        ("artist_name", pa.string()),
+        ("artist_country", pa.string()),
+        ("artist_mbid", pa.string()),
+    ])
+
+
+def write_parquet(db: Session, path, country=None, start=None, end=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Write the export to a Parquet file, one row group per partition.
+    Needs `pyarrow` (pip install pyarrow). Returns the number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = _arrow_schema(pa)
+    total = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in iter_row_chunks(db, country, start, end, chunk_size):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            total += len(rows)
+    return total
@@ -0,0 +1,139 @@
+"""
+Country x genre share matrix and pairwise country similarity.
+
+The genre vectors of every requested country's latest snapshot come from one
+grouped query over snapshot_genre_counts. The similarity matrix is computed with NumPy
+(cosine of the share vectors, or 1 - Jensen-Shannon divergence in bits). The full result
+is memoised per snapshot set in the analytics cache, so ETL invalidation drops it with the
+other entries of those countries. The API runs the database half (load_matrix_inputs) on
+its session and the NumPy half (build_matrix) on a worker thread.
+"""
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.snapshot_genre_count import SnapshotGenreCount
+from app.services import analytics_cache
+from app.services.snapshots import latest_snapshots
+
+METRICS = ("cosine", "jsd")
+
+
+def _np():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("The genre matrix needs numpy (pip install numpy)")
+    return numpy
+
+
+def _genre_counts(db: Session, latest: dict):
+    """{country: {genre: count}} of the given snapshots, in a single grouped query."""
+    rows = (
+        db.query(SnapshotGenreCount.country, SnapshotGenreCount.genre, func.sum(SnapshotGenreCount.count))
+        .filter(tuple_(SnapshotGenreCount.country, SnapshotGenreCount.fetched_at).in_(list(latest.items())))
+        .group_by(SnapshotGenreCount.country, SnapshotGenreCount.genre)
+        .all()
+    )
+    counts = {}
+    for country, genre, count in rows:
+        counts.setdefault(country, {})[genre] = int(count)
+    return counts
+
+
+def similarity_matrix(shares, metric: str):
+    """Pairwise similarity of the rows of `shares` (each row sums to 1)."""
+    np = _np()
+    if metric == "cosine":
+        norms = np.linalg.norm(shares, axis=1)
+        return (shares @ shares.T) / np.outer(norms, norms)
+
+    # Jensen-Shannon divergence (base 2, in [0, 1]) row by row: memory stays O(n x genres)
+    n = shares.shape[0]
+    out = np.empty((n, n))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(n):
+            p = shares[i]
+            m = 0.5 * (p + shares)
+            kl_p = np.where(p > 0, p * np.log2(p / m), 0.0).sum(axis=1)
+            kl_q = np.where(shares > 0, shares * np.log2(shares / m), 0.0).sum(axis=1)
+            out[i] = 1.0 - 0.5 * (kl_p + kl_q)
+    return np.clip(out, 0.0, 1.0)
+
+
+def _compute(counts: dict, latest: dict, metric: str):
+    np = _np()
+
+    countries = sorted(c for c in latest if counts.get(c))
+    genres = sorted({g for c in countries for g in counts[c]})
+    index = {g: j for j, g in enumerate(genres)}
+
+    matrix = np.zeros((len(countries), len(genres)))
+    for i, country in enumerate(countries):
+        for genre, count in counts[country].items():
+            matrix[i, index[genre]] = count
+
+    totals = matrix.sum(axis=1)
+    shares = matrix / totals[:, None] if len(countries) else matrix
+    similarity = similarity_matrix(shares, metric) if len(countries) else np.zeros((0, 0))
+
+    # genre order for display: combined tag count across the countries (like the 2-country comparison)
+    order = np.argsort(-matrix.sum(axis=0), kind="stable")
+    return {
+        "countries": countries,
+        "totals": [int(t) for t in totals],
+        "genres": [genres[j] for j in order],
+        "shares": shares[:, order].tolist(),
+        "similarity": similarity.tolist(),
+    }
+
+
+def load_matrix_inputs(db: Session, countries=None, metric: str = "cosine"):
+    """
+    Database half of country_genre_matrix: the latest snapshot of each country and, unless the
+    result is memoised, their genre counts.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+
+    latest = latest_snapshots(db, countries)
+    key = "genre-matrix:" + metric + ":" + "|".join(f"{c}@{t.isoformat()}" for c, t in sorted(latest.items()))
+    full = analytics_cache.memo_get(key)
+    generation = analytics_cache.generation()
+    counts = _genre_counts(db, latest) if full is None else None
+    return {"latest": latest, "key": key, "full": full, "counts": counts, "generation": generation}
+
+
+def build_matrix(inputs: dict, countries=None, metric: str = "cosine", top_n: int = 20):
+    """CPU half of country_genre_matrix (NumPy, no database access): fine on a worker thread."""
+    latest, full = inputs["latest"], inputs["full"]
+    if full is None:
+        full = analytics_cache.memo_put(
+            inputs["key"], _compute(inputs["counts"], latest, metric), latest.keys(), inputs["generation"]
+        )
+
+    requested = sorted(set(countries)) if countries is not None else sorted(latest)
+    missing_snapshot = [c for c in requested if c not in latest]
+    missing_genres = [c for c in requested if c in latest and c not in full["countries"]]
+
+    genres = full["genres"][:top_n]
+    return {
+        "metric": metric,
+        "countries": full["countries"],
+        "latest_fetched_at": {c: latest[c].isoformat() for c in full["countries"]},
+        "total_genre_tags": dict(zip(full["countries"], full["totals"])),
+        "top_n": top_n,
+        "genres": genres,
+        # percentage of each country's genre tags, rows follow `countries`, columns `genres`
+        "shares": [[round(v * 100, 2) for v in row[:top_n]] for row in full["shares"]],
+        "similarity": [[round(v, 4) for v in row] for row in full["similarity"]],
+        "missing_snapshot": missing_snapshot,
+        "missing_genres": missing_genres,
+    }
+
+
+def country_genre_matrix(db: Session, countries=None, metric: str = "cosine", top_n: int = 20):
+    """
+    Genre share matrix of `countries` (all countries with a snapshot when None)
+    plus their pairwise similarity under `metric` ("cosine" or "jsd").
+    """
+    return build_matrix(load_matrix_inputs(db, countries, metric), countries, metric, top_n)
@@ -0,0 +1,83 @@
+"""
+Normalized genre vocabulary (`genres`) and the artist <-> genre link table (`artist_genres`).
+
+Artist.genres (CSV) is still written for display, but all genre aggregation runs on
+these tables with SQL GROUP BY.
+"""
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from app.core.bulk import insert_ignore
+from app.models.artist import Artist
+from app.models.artist_genre import ArtistGenre
+from app.models.genre import Genre
+
+
+def normalize_genres(genres_value):
+    if not genres_value:
+        return []
+    if isinstance(genres_value, (list, tuple, set)):
+        raw = ",".join(str(x) for x in genres_value if x)
+    else:
+        raw = str(genres_value)
+    return [g.strip().lower() for g in raw.split(",") if g.strip()]
+
+
+def _genre_ids(db: Session, names):
+    """Upsert genre names and return {name: id}."""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    ids = dict(db.query(Genre.name, Genre.id).filter(Genre.name.in_(names)).all())
+    missing = [n for n in names if n not in ids]
+    if missing:
+        insert_ignore(db, Genre, [{"name": n} for n in missing])
+        ids.update(db.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)).all())
+    return ids
+
+
+def set_artist_genres(db: Session, genres_by_artist: dict):
+    """
+    Replace the genre links of the given artists. `genres_by_artist` maps artist_id to a
+    CSV string or list of tags (order = relevance). Runs in the caller's transaction.
+    """
+    normalized = {}
+    for artist_id, value in genres_by_artist.items():
+        # dict.fromkeys keeps the first occurrence and drops repeated tags
+        normalized[artist_id] = list(dict.fromkeys(normalize_genres(value)))
+
+    if not normalized:
+        return
+
+    ids = _genre_ids(db, [g for tags in normalized.values() for g in tags])
+
+    db.execute(delete(ArtistGenre).where(ArtistGenre.artist_id.in_(list(normalized))))
+    links = [
+        {"artist_id": artist_id, "genre_id": ids[g], "position": pos}
+        for artist_id, tags in normalized.items()
+        for pos, g in enumerate(tags)
+    ]
+    if links:
+        db.execute(insert(ArtistGenre), links)
+
+
+def migrate_genres_from_csv(db: Session, batch_size: int = 1000):
+    """One-shot migration of artists.genres CSV values into genres/artist_genres."""
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Artist.id, Artist.genres)
+            .filter(Artist.id > last_id, Artist.genres.isnot(None))
+            .order_by(Artist.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        set_artist_genres(db, {artist_id: genres for artist_id, genres in rows})
+        db.commit()
+        migrated += len(rows)
+        last_id = rows[-1][0]
+
+    return {"artists_migrated": migrated, "genres": db.query(Genre).count()}
@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+MAX_RETRIES = 3
+
+log = logging.getLogger("musicscope.http")
+
+
+class PayloadNotArchived(LookupError):
+    """A replaying client was asked for a request the payload archive does not hold."""
+
+
+def cache_key(url: str, params: dict = None, ignore_params=()):
+    """Normalized cache key: lowercase scheme/host, sorted params, secrets dropped."""
+    parts = urlsplit(url)
+    base = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", "", ""))
+    items = sorted(
+        (str(k), str(v))
+        for k, v in (params or {}).items()
+        if v is not None and k not in ignore_params
+    )
+    raw = f"GET {base}?{urlencode(items)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest(), raw
+
+
+class ResponseCache:
+    """
+    SQLite-backed response store with per-entry expiry, ETag/Last-Modified validators
+    and size-based LRU eviction. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_http_cache_last_access ON http_cache (last_access)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, expires_at FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE http_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        if not row:
+            return None
+        body, etag, last_modified, expires_at = row
+        return {"body": body, "etag": etag, "last_modified": last_modified, "expires_at": expires_at}
+
+    def put(self, key: str, request: str, body: bytes, ttl: float, etag=None, last_modified=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache "
+                "(key, request, body, etag, last_modified, stored_at, expires_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, request, body, etag, last_modified, now, now + ttl, now, len(body)),
+            )
+            self._evict()
+
+    def refresh(self, key: str, ttl: float):
+        """A 304 confirmed the stored body; extend its lifetime."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE http_cache SET expires_at = ?, last_access = ? WHERE key = ?", (now + ttl, now, key)
+            )
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # expired entries without validators are useless, drop them first; then least recently used
+        self._conn.execute(
+            "DELETE FROM http_cache WHERE expires_at < ? AND etag IS NULL AND last_modified IS NULL",
+            (time.time(),),
+        )
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        if total <= target:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM http_cache ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= target:
+                break
+        self._conn.executemany("DELETE FROM http_cache WHERE key = ?", victims)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM http_cache"
+            ).fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    On-disk response cache shared by the Last.fm and MusicBrainz clients, opened on first use.
+    HTTP_CACHE_PATH (SQLite file; unset or "" = no cache, the default), HTTP_CACHE_MAX_MB (default 256).
+    """
+    global _shared_cache
+    path = os.getenv("HTTP_CACHE_PATH", "")
+    if not path:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            max_bytes = int(float(os.getenv("HTTP_CACHE_MAX_MB", "256")) * 1024 * 1024)
+            _shared_cache = ResponseCache(path, max_bytes=max_bytes)
+    return _shared_cache
+
+
+class HttpClient:
+    """
+    JSON-over-HTTP client: pooled keep-alive session, optional rate limiter (only consumed
+    by real network requests, never by cache hits), 429/503 retry with Retry-After,
+    and the shared on-disk response cache with conditional GETs. Network responses are
+    also written to the payload archive when one is configured (app/services/payload_archive).
+    """
+
+    def __init__(self, name: str, headers=None, pool_size: int = 10, limiter=None,
+                 ignore_params=(), cache=None, archive=None):
+        self.name = name
+        self.limiter = limiter
+        self.ignore_params = tuple(ignore_params)
+        self._cache = cache
+        self._archive = archive
+        self.replay = None  # {cache key: body} while replaying: archived payloads only, no network
+        self._headers = dict(headers or {})
+        self._pool_size = pool_size
+        self._session = None
+
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "requests": 0, "retries": 0,
+                         "replayed": 0, "not_archived": 0}
+
+    @property
+    def session(self):
+        # requests is imported and the pool built on the first network request, not at app import
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.headers.update(self._headers)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def cache(self):
+        return self._cache if self._cache is not None else get_shared_cache()
+
+    @property
+    def archive(self):
+        if self._archive is not None:
+            return self._archive
+        from app.services.payload_archive import get_shared_archive
+
+        return get_shared_archive()
+
+    @contextmanager
+    def replaying(self, payloads: dict):
+        """Serve get_json from `payloads` ({cache key: body}) instead of the cache and network."""
+        self.replay = payloads
+        try:
+            yield self
+        finally:
+            self.replay = None
+
+    def _archive_payload(self, url: str, params: dict, key: str, data, fetched_at=None):
+        archive = self.archive
+        if archive is None:
+            return
+        kept = {k: v for k, v in (params or {}).items() if v is not None and k not in self.ignore_params}
+        try:
+            archive.write(self.name, url, kept, key, data, fetched_at)
+        except OSError as e:  # a full or unwritable disk must not fail the ETL
+            log.warning("[%s] could not archive payload: %s", self.name, e)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _request(self, url: str, params: dict, headers: dict, timeout: float):
+        for attempt in range(MAX_RETRIES + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            self._count("requests")
+            r = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            if r.status_code in (429, 503) and attempt < MAX_RETRIES:
+                try:
+                    wait = max(1.0, float(r.headers.get("Retry-After", "")))
+                except ValueError:
+                    wait = 1.0
+                wait *= attempt + 1
+                if self.limiter:
+                    self.limiter.pause(wait)  # stops every caller sharing the limiter
+                else:
+                    time.sleep(wait)
+                self._count("retries")
+                continue
+            return r
+
+    def get_json(self, url: str, params: dict = None, ttl: float = 0, timeout: float = 20, validate=None,
+                 refresh: bool = False, fetched_at=None):
+        """
+        GET `url` and return the decoded JSON body.
+
+        Fresh cache entries are returned without touching the network; stale ones with
+        an ETag/Last-Modified are revalidated with a conditional GET. `validate(data)`
+        may raise to reject a payload (it is then neither cached nor returned).
+        `refresh=True` skips a fresh cache entry (a retry wants the current answer, not the
+        cached miss): it is revalidated or fetched again, and the cache updated.
+        While `replaying`, only archived payloads are returned (PayloadNotArchived otherwise).
+        `fetched_at` is the time the payload is archived under (default: now); the Last.fm
+        ETL passes its snapshot time so a replay recognizes the snapshot it already made.
+        """
+        key, request = cache_key(url, params, self.ignore_params)
+        if self.replay is not None:
+            if key not in self.replay:
+                self._count("not_archived")
+                raise PayloadNotArchived(request)
+            self._count("replayed")
+            data = self.replay[key]
+            if validate:
+                validate(data)
+            return data
+
+        cache = self.cache if ttl > 0 else None
+        entry = cache.get(key) if cache else None
+
+        if entry and not refresh and entry["expires_at"] > time.time():
+            self._count("hits")
+            return json.loads(entry["body"])
+
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = self._request(url, params, headers, timeout)
+
+        if r.status_code == 304 and entry:
+            self._count("revalidated")
+            cache.refresh(key, ttl)
+            data = json.loads(entry["body"])
+            self._archive_payload(url, params, key, data, fetched_at)
+            return data
+
+        r.raise_for_status()
+        self._count("misses")
+        data = r.json()
+        if validate:
+            validate(data)
+        self._archive_payload(url, params, key, data, fetched_at)
+
+        if cache:
+            cache.put(
+                key,
+                request,
+                r.content,
+                ttl,
+                etag=r.headers.get("ETag"),
+                last_modified=r.headers.get("Last-Modified"),
+            )
+        return data
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"] + counters["revalidated"]
+        counters["hit_ratio"] = round((counters["hits"] + counters["revalidated"]) / lookups, 4) if lookups else 0.0
+        return counters
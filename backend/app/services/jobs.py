@@ -0,0 +1,306 @@
+"""
+In-process background jobs for the ETL runs.
+
+Jobs are persisted in `etl_logs` (status, parameters, progress, result) and executed on a
+small worker pool, so the HTTP request only enqueues and returns a job id.
+
+Each job records the process that runs it (`worker`, host:pid). That process refreshes
+`heartbeat_at` of its active jobs every ETL_JOB_HEARTBEAT_SECONDS, so with several API
+workers only jobs whose process is gone (stale heartbeat) are failed as interrupted.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from app.core.database import SessionLocal
+from app.models.etl_log import EtlLog
+
+LASTFM_JOB = "lastfm_top_tracks"
+MUSICBRAINZ_JOB = "musicbrainz_artists"
+
+ACTIVE_STATUSES = ("queued", "running")
+# params that do not change which data a job refreshes: ignored when deduplicating
+# (run_key is the snapshot key of a Last.fm job and of its retries, see snapshots.new_run_key)
+DEDUPE_IGNORED_PARAMS = ("max_concurrency", "run_key")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+HEARTBEAT_SECONDS = float(os.getenv("ETL_JOB_HEARTBEAT_SECONDS", "30"))
+STALE_AFTER = timedelta(seconds=4 * HEARTBEAT_SECONDS)
+
+log = logging.getLogger("musicscope.jobs")
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ETL_WORKERS", "2")),
+    thread_name_prefix="etl-job",
+)
+_enqueue_lock = threading.Lock()
+_heartbeat_stop = threading.Event()
+_heartbeat_thread = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _run_lastfm(db, params, progress):
+    from app.services.etl_lastfm import run_lastfm_etl_batch
+
+    return run_lastfm_etl_batch(
+        db,
+        params["countries"],
+        params.get("limit", 50),
+        params.get("max_concurrency"),
+        progress=progress,
+        run_key=params.get("run_key"),
+    )
+
+
+def _run_musicbrainz(db, params, progress):
+    from app.services.etl_musicbrainz import run_musicbrainz_etl
+
+    return {"updated_artists": run_musicbrainz_etl(db, params.get("limit", 20), progress=progress)}
+
+
+JOB_RUNNERS = {
+    LASTFM_JOB: _run_lastfm,
+    MUSICBRAINZ_JOB: _run_musicbrainz,
+}
+
+
+def job_to_dict(job: EtlLog):
+    def _iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        "job_id": job.id,
+        "etl_type": job.etl_type,
+        "status": job.status,
+        "country": job.country,
+        "params": json.loads(job.params) if job.params else None,
+        "progress": {"done": job.progress_done or 0, "total": job.progress_total},
+        "cancel_requested": bool(job.cancel_requested),
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error_message,
+        "created_at": _iso(job.created_at),
+        "started_at": _iso(job.started_at),
+        "finished_at": _iso(job.finished_at),
+        "worker": job.worker,
+        "heartbeat_at": _iso(job.heartbeat_at),
+    }
+
+
+def _work_params(params: dict):
+    return {k: v for k, v in params.items() if k != "countries" and k not in DEDUPE_IGNORED_PARAMS}
+
+
+def enqueue_job(db, etl_type: str, params: dict):
+    """
+    Persist a queued job and hand it to the worker pool.
+
+    A Last.fm job gets a run key (params["run_key"]) unless it retries one, see retry_job.
+
+    Deduplicated against the queued/running jobs of the same type and the same params
+    (DEDUPE_IGNORED_PARAMS aside): for per-country jobs (`params["countries"]`, normalized by the
+    caller) each country already covered by such a job is dropped from the new one.
+    When nothing is left, the covering job is returned instead.
+
+    Returns (job, created, covered) where covered = {country: id of the job covering it}.
+    """
+    if etl_type not in JOB_RUNNERS:
+        raise ValueError(f"unknown etl_type: {etl_type}")
+    if etl_type == LASTFM_JOB and not params.get("run_key"):
+        from app.services.snapshots import new_run_key
+
+        params = {**params, "run_key": new_run_key()}
+
+    with _enqueue_lock:
+        active = (
+            db.query(EtlLog)
+            .filter(EtlLog.etl_type == etl_type, EtlLog.status.in_(ACTIVE_STATUSES))
+            .order_by(EtlLog.id)
+            .all()
+        )
+        same = [j for j in active if _work_params(json.loads(j.params or "{}")) == _work_params(params)]
+        countries = params.get("countries")
+        if countries is None:
+            if same:
+                return same[0], False, {}
+        else:
+            covered = {}
+            for j in same:
+                for c in json.loads(j.params).get("countries") or []:
+                    covered.setdefault(c, j.id)
+            covered = {c: covered[c] for c in countries if c in covered}
+            remaining = [c for c in countries if c not in covered]
+            if not remaining:
+                return db.get(EtlLog, covered[countries[0]]), False, covered
+            params = {**params, "countries": remaining}
+
+        now = datetime.utcnow()
+        job = EtlLog(
+            etl_type=etl_type,
+            status="queued",
+            country=",".join(params["countries"]) if countries is not None else None,
+            params=json.dumps(params),
+            progress_done=0,
+            cancel_requested=False,
+            created_at=now,
+            started_at=None,
+            worker=WORKER_ID,
+            heartbeat_at=now,
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+    start_heartbeat()
+    _executor.submit(_run_job, job.id)
+    return job, True, covered if countries is not None else {}
+
+
+def retry_job(db, job_id: int):
+    """
+    Enqueue a finished job again with the same params. A Last.fm job keeps its run key, so
+    the snapshots its first attempt wrote are replaced, not duplicated; it retries only the
+    countries that failed when the job reported them. Returns enqueue_job's tuple, None for
+    an unknown job; ValueError when the job is still active or has nothing to retry.
+    """
+    job = db.get(EtlLog, job_id)
+    if job is None:
+        return None
+    if job.status in ACTIVE_STATUSES:
+        raise ValueError("job is still queued or running")
+    params = json.loads(job.params or "{}")
+    if job.etl_type == LASTFM_JOB and job.status == "success":
+        results = (json.loads(job.result) if job.result else {}).get("results") or {}
+        failed = [c for c, r in results.items() if r.get("status") != "ok"]
+        if not failed:
+            raise ValueError("every country of the job succeeded")
+        params["countries"] = failed
+    return enqueue_job(db, job.etl_type, params)
+
+
+def cancel_job(db, job_id: int):
+    """Flag a job for cancellation. Queued jobs never start; running jobs stop at the next progress tick."""
+    job = db.get(EtlLog, job_id)
+    if job is None:
+        return None
+    if job.status in ACTIVE_STATUSES:
+        job.cancel_requested = True
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+        db.commit()
+    db.refresh(job)
+    return job
+
+
+def recover_interrupted_jobs(startup: bool = True):
+    """
+    Mark failed the queued/running jobs whose process is gone: no heartbeat for STALE_AFTER
+    (or none recorded). At startup, jobs recorded under this process's own host:pid are
+    also gone (a previous process that had the same pid). Jobs of live sibling workers are
+    left alone. Returns the number of failed jobs.
+    """
+    dead = or_(EtlLog.heartbeat_at.is_(None), EtlLog.heartbeat_at < datetime.utcnow() - STALE_AFTER)
+    if startup:
+        dead = or_(dead, EtlLog.worker == WORKER_ID)
+    else:
+        dead = and_(dead, or_(EtlLog.worker.is_(None), EtlLog.worker != WORKER_ID))
+    db = SessionLocal()
+    try:
+        failed = db.query(EtlLog).filter(
+            EtlLog.status.in_(ACTIVE_STATUSES),
+            EtlLog.etl_type.in_(list(JOB_RUNNERS)),
+            dead,
+        ).update(
+            {
+                EtlLog.status: "failed",
+                EtlLog.finished_at: datetime.utcnow(),
+                EtlLog.error_message: "interrupted: its worker process stopped",
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return failed
+    finally:
+        db.close()
+
+
+def _beat():
+    """Refresh the heartbeat of this process's active jobs, fail those of dead processes."""
+    while not _heartbeat_stop.wait(HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            db.query(EtlLog).filter(
+                EtlLog.worker == WORKER_ID, EtlLog.status.in_(ACTIVE_STATUSES)
+            ).update({EtlLog.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            log.exception("job heartbeat failed")
+        finally:
+            db.close()
+        try:
+            recover_interrupted_jobs(startup=False)
+        except Exception:
+            log.exception("recovering stale jobs failed")
+
+
+def start_heartbeat():
+    global _heartbeat_thread
+    with _enqueue_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_beat, name="etl-job-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def shutdown(wait: bool = False):
+    _heartbeat_stop.set()
+    _executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _run_job(job_id: int):
+    # bookkeeping and ETL work use separate sessions, so progress commits never
+    # commit the ETL's own transaction halfway
+    job_db = SessionLocal()
+    work_db = SessionLocal()
+    try:
+        job = job_db.get(EtlLog, job_id)
+        if job is None or job.cancel_requested or job.status != "queued":
+            return
+
+        job.status = "running"
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        job.worker = WORKER_ID
+        job_db.commit()
+
+        def progress(done, total):
+            job.progress_done = done
+            job.progress_total = total
+            job_db.commit()
+            job_db.refresh(job)
+            if job.cancel_requested:
+                raise JobCancelled()
+
+        try:
+            result = JOB_RUNNERS[job.etl_type](work_db, json.loads(job.params or "{}"), progress)
+            job.status = "success"
+            job.result = json.dumps(result, default=str)
+        except JobCancelled:
+            work_db.rollback()
+            job.status = "cancelled"
+        except Exception as e:
+            work_db.rollback()
+            job.status = "failed"
+            job.error_message = str(e)
+        job.finished_at = datetime.utcnow()
+        job_db.commit()
+    finally:
+        work_db.close()
+        job_db.close()
@@ -1,29 +1,65 @@
 import os
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.core.config import load_env
+from app.services.http_client import HttpClient
 
-BASE_URL = "https://ws.audioscrobbler.com/2.0/"
+load_env()
+
+BASE_URL = os.getenv("LASTFM_BASE_URL", "https://ws.audioscrobbler.com/2.0/")  # overridable for local stubs
+PAGE_SIZE = 50  # geo.getTopTracks page size we request; larger limits are paginated
+POOL_SIZE = int(os.getenv("LASTFM_POOL_SIZE", "16"))
+# charts move slowly; reruns/replays inside this window are served from the response cache
+CACHE_TTL = float(os.getenv("LASTFM_CACHE_TTL", "600"))
+
+# one keep-alive connection pool shared by every caller (and thread)
+client = HttpClient("lastfm", pool_size=POOL_SIZE, ignore_params=("api_key",))
+
+
+def _check_error(data):
+    if "error" in data:
+        raise RuntimeError(f"Last.fm API error {data.get('error')}: {data.get('message')}")
 
-def get_top_tracks_by_country(country: str, limit: int = 20):
-    api_key = os.getenv("LASTFM_API_KEY")  
-    if not api_key:
-        raise RuntimeError("LASTFM_API_KEY is not set")
 
+def _get_page(api_key: str, country: str, page: int, page_size: int, fetched_at=None):
     params = {
         "method": "geo.getTopTracks",
         "country": country,
         "api_key": api_key,
         "format": "json",
-        "limit": limit,
+        "limit": page_size,
+        "page": page,
     }
 
-    r = requests.get(BASE_URL, params=params, timeout=20)
-    r.raise_for_status()
-    data = r.json()
+    data = client.get_json(
+        BASE_URL, params=params, ttl=CACHE_TTL, timeout=20, validate=_check_error, fetched_at=fetched_at
+    )
+    return data["tracks"]
 
-    if "error" in data:
-        raise RuntimeError(f"Last.fm API error {data.get('error')}: {data.get('message')}")
 
-    return data["tracks"]["track"]
\ No newline at end of file
+def get_top_tracks_by_country(country: str, limit: int = 20, fetched_at=None):
+    """
+    Chart items of `country`, paginated up to `limit`. `fetched_at` is recorded as the fetch
+    time of every archived page (the snapshot time of the run).
+    """
+    api_key = os.getenv("LASTFM_API_KEY")
+    if not api_key:
+        raise RuntimeError("LASTFM_API_KEY is not set")
+
+    page_size = min(limit, PAGE_SIZE)
+    items = []
+    page = 1
+    while len(items) < limit:
+        tracks = _get_page(api_key, country, page, page_size, fetched_at)
+        batch = tracks.get("track", [])
+        if isinstance(batch, dict):  # Last.fm returns a bare object for a single item
+            batch = [batch]
+        if not batch:
+            break
+        items.extend(batch)
+
+        total_pages = int(tracks.get("@attr", {}).get("totalPages", page) or page)
+        if page >= total_pages:
+            break
+        page += 1
+
+    return items[:limit]
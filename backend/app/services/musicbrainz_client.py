@@ -1,28 +1,59 @@
-import requests
+import os
 
-BASE_URL = "https://musicbrainz.org/ws/2"
+from app.services.http_client import HttpClient
+from app.services.rate_limiter import TokenBucket
+
+BASE_URL = os.getenv("MUSICBRAINZ_BASE_URL", "https://musicbrainz.org/ws/2")  # overridable for local stubs
 HEADERS = {
     "User-Agent": "MusicScope/1.0 ( student@example.com )"
 }
+# artist metadata rarely changes; cached lookups cost no rate-limit budget
+CACHE_TTL = float(os.getenv("MUSICBRAINZ_CACHE_TTL", str(30 * 24 * 3600)))
+
+# MusicBrainz allows 1 request/second per client; every network request goes through this bucket
+limiter = TokenBucket(rate=float(os.getenv("MUSICBRAINZ_RATE", "1")), capacity=1)
+
+client = HttpClient("musicbrainz", headers=HEADERS, pool_size=4, limiter=limiter)
 
-def search_artist_by_name(name: str):
+# MBIDs per batched search request (keeps the Lucene query / URL at a few KB)
+LOOKUP_BATCH_SIZE = int(os.getenv("MUSICBRAINZ_LOOKUP_BATCH", "25"))
+
+
+def search_artist_by_name(name: str, refresh: bool = False):
     params = {
-        "query": f'artist:"{name}"',
+        "query": 'artist:"{}"'.format(name.replace("\\", "\\\\").replace('"', '\\"')),
         "fmt": "json",
         "limit": 1,
     }
-    r = requests.get(f"{BASE_URL}/artist", params=params, headers=HEADERS, timeout=20)
-    r.raise_for_status()
-    data = r.json()
+    data = client.get_json(f"{BASE_URL}/artist", params=params, ttl=CACHE_TTL, refresh=refresh)
     artists = data.get("artists", [])
     return artists[0] if artists else None
 
 
-def get_artist_details(artist_id: str):
+def get_artist_details(artist_id: str, refresh: bool = False):
     params = {
         "inc": "tags",
         "fmt": "json",
     }
-    r = requests.get(f"{BASE_URL}/artist/{artist_id}", params=params, headers=HEADERS, timeout=20)
-    r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    return client.get_json(f"{BASE_URL}/artist/{artist_id}", params=params, ttl=CACHE_TTL, refresh=refresh)
+
+
+def lookup_artists_by_mbids(mbids, refresh: bool = False):
+    """
+    Resolve several known MBIDs with one search request (`arid:a OR arid:b ...`).
+    Search hits carry country and tags like the details lookup. Returns {mbid: artist};
+    MBIDs MusicBrainz does not return (merged/deleted) are simply absent.
+
+    `refresh=True` (retries of earlier misses) bypasses the response cache, see HttpClient.get_json.
+    """
+    mbids = sorted(set(mbids))
+    if not mbids:
+        return {}
+    params = {
+        "query": " OR ".join(f"arid:{m}" for m in mbids),
+        "fmt": "json",
+        "limit": min(100, len(mbids)),
+    }
+    data = client.get_json(f"{BASE_URL}/artist", params=params, ttl=CACHE_TTL, refresh=refresh)
+    wanted = set(mbids)
+    return {a["id"]: a for a in data.get("artists", []) if a.get("id") in wanted}
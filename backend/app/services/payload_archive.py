@@ -0,0 +1,163 @@
+"""
+Raw API payload archive: every response the API clients take from the network is appended
+to gzip-compressed NDJSON, so charts and artist lookups can be re-ingested later without
+calling the APIs again (app/services/replay.py, `python manage.py replay`).
+
+PAYLOAD_ARCHIVE_DIR enables it ("" = off, the default). Layout:
+
+    <dir>/<client>/<YYYY-MM-DD>-<pid>.ndjson.gz
+
+one file per client, UTC day and process (the API and manage.py may archive at the same
+time). One line per response:
+
+    {"client", "endpoint", "params", "key", "fetched_at", "body"}
+
+`params` never contain the client's ignored params (the Last.fm api_key); `key` is the
+http_client.cache_key of the request; `fetched_at` is the time given by the caller (the
+Last.fm ETL passes its snapshot time, the same for every page of a chart) or the write time. Fresh response-cache hits are not archived (they are
+the payload archived a few minutes earlier). Each record is flushed when it is written, so
+the file of a running process can already be read.
+
+The readers only use the standard library: they run in the replay's worker processes.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import date, datetime
+
+_FILE_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})-\d+\.ndjson\.gz$")
+
+
+class PayloadArchive:
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._files = {}  # client -> (path, open gzip file)
+
+    def _file(self, client: str, day: date):
+        path = os.path.join(self.root, client, f"{day.isoformat()}-{os.getpid()}.ndjson.gz")
+        current = self._files.get(client)
+        if current and current[0] == path:
+            return current[1]
+        if current:
+            current[1].close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = gzip.open(path, "ab")
+        self._files[client] = (path, f)
+        return f
+
+    def write(self, client: str, endpoint: str, params: dict, key: str, body, fetched_at: datetime = None):
+        fetched_at = fetched_at or datetime.utcnow()
+        line = json.dumps(
+            {"client": client, "endpoint": endpoint, "params": params, "key": key,
+             "fetched_at": fetched_at.isoformat(), "body": body},
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8") + b"\n"
+        with self._lock:
+            f = self._file(client, fetched_at.date())
+            f.write(line)
+            f.flush()
+
+    def close(self):
+        with self._lock:
+            for _, f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+_shared_archive = None
+_shared_archive_lock = threading.Lock()
+
+
+def get_shared_archive():
+    """Archive shared by the API clients, opened on first use; None when PAYLOAD_ARCHIVE_DIR is unset."""
+    global _shared_archive
+    root = os.getenv("PAYLOAD_ARCHIVE_DIR", "")
+    if not root:
+        return None
+    with _shared_archive_lock:
+        if _shared_archive is None:
+            _shared_archive = PayloadArchive(root)
+    return _shared_archive
+
+
+def archive_files(root: str, client: str, start: date = None, end: date = None):
+    """[(day, path)] of one client's archive files within [start, end], oldest day first."""
+    directory = os.path.join(root, client)
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in os.listdir(directory):
+        m = _FILE_NAME.match(name)
+        if not m:
+            continue
+        day = date.fromisoformat(m.group(1))
+        if (start and day < start) or (end and day > end):
+            continue
+        files.append((day, os.path.join(directory, name)))
+    return sorted(files)
+
+
+def read_records(path: str):
+    """Records of one archive file. A file cut short (process killed) yields its complete lines."""
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:  # partial last line
+                    return
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+
+def _in_window(record, start: datetime, end: datetime):
+    if not (start or end):
+        return True
+    fetched_at = datetime.fromisoformat(record["fetched_at"])
+    return not ((start and fetched_at < start) or (end and fetched_at > end))
+
+
+def _trim_track(t):
+    # only what etl_lastfm._parse_items reads: keeps the pickled pages small
+    artist = t.get("artist") if isinstance(t.get("artist"), dict) else {}
+    return {
+        "name": t.get("name"),
+        "url": t.get("url"),
+        "mbid": t.get("mbid"),
+        "artist": {"name": artist.get("name"), "mbid": artist.get("mbid")},
+        "@attr": t.get("@attr"),
+    }
+
+
+def parse_lastfm_pages(path: str, countries=None, start: datetime = None, end: datetime = None):
+    """
+    geo.getTopTracks pages of one Last.fm archive file:
+    [(fetched_at ISO, country, page, [track items])]. Runs in a worker process.
+    """
+    wanted = {c.lower() for c in countries} if countries else None
+    pages = []
+    for record in read_records(path):
+        params = record.get("params") or {}
+        if params.get("method") != "geo.getTopTracks" or not _in_window(record, start, end):
+            continue
+        country = params.get("country")
+        if not country or (wanted and country.lower() not in wanted):
+            continue
+        tracks = (record.get("body") or {}).get("tracks") or {}
+        batch = tracks.get("track", [])
+        if isinstance(batch, dict):  # Last.fm returns a bare object for a single item
+            batch = [batch]
+        pages.append((record["fetched_at"], country, int(params.get("page", 1)), [_trim_track(t) for t in batch]))
+    return pages
+
+
+def parse_keyed_bodies(path: str, start: datetime = None, end: datetime = None):
+    """[(key, fetched_at ISO, body)] of one archive file, for the replay index. Runs in a worker process."""
+    return [
+        (record["key"], record["fetched_at"], record["body"])
+        for record in read_records(path)
+        if _in_window(record, start, end)
+    ]
@@ -0,0 +1,192 @@
+"""
+Offline replay: rebuild history from the payload archive (app/services/payload_archive)
+instead of calling Last.fm and MusicBrainz.
+
+  - Last.fm: archived geo.getTopTracks pages are regrouped into charts and ingested with
+    ingest_lastfm_items at the time they were fetched, oldest first per country.
+  - MusicBrainz: the archived responses are loaded into an index and the normal
+    run_musicbrainz_etl runs against it (musicbrainz_client.client.replaying); requests the
+    archive does not hold fail like a network error and are retried by a later live run.
+
+Decompressing and decoding the archive runs in a process pool, a few files ahead of the
+ingestion, which stays on the calling thread with one DB session and one artist index.
+Replays are idempotent: a chart whose (country, fetched_at) snapshot exists is skipped,
+and charts sharing a snapshot key replace each other as in live runs. Live runs archive a
+chart's pages under the snapshot time they ingest it at, so a replay into a database the
+live ETL has populated skips those charts as well.
+"""
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app.models.snapshot import Snapshot
+from app.services import musicbrainz_client
+from app.services.artist_resolver import ArtistResolver
+from app.services.etl_lastfm import ingest_lastfm_items
+from app.services.etl_musicbrainz import run_musicbrainz_etl, select_candidates
+from app.services.payload_archive import archive_files, parse_keyed_bodies, parse_lastfm_pages
+from app.services.snapshots import SNAPSHOT_PERIOD, snapshot_key_for
+
+
+def _workers(workers: int = None):
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def _parsed(pool, window, fn, paths, *args):
+    """fn(path, *args) for every path, in path order, with at most `window` files in flight."""
+    paths = iter(paths)
+    pending = deque(pool.submit(fn, p, *args) for p in itertools.islice(paths, window))
+    while pending:
+        result = pending.popleft().result()
+        for p in itertools.islice(paths, 1):
+            pending.append(pool.submit(fn, p, *args))
+        yield result
+
+
+def _day(value: datetime):
+    return value.date() if value else None
+
+
+def iter_lastfm_charts(root: str, countries=None, start: datetime = None, end: datetime = None,
+                       workers: int = None, stats: dict = None):
+    """
+    (country, fetched_at, items) of every archived chart. Pages are ordered by fetch time;
+    page 1 starts a chart and the following pages of that country extend it.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("files", 0)
+    stats.setdefault("pages", 0)
+    stats.setdefault("orphan_pages", 0)
+    files = archive_files(root, "lastfm", _day(start), _day(end))
+    open_charts = {}  # country -> [fetched_at, items, next page]
+
+    workers = _workers(workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = _parsed(pool, 2 * workers, parse_lastfm_pages, [p for _, p in files], countries, start, end)
+        # one day at a time (a day may have files from several processes), in time order
+        for _, group in itertools.groupby(zip(files, results), key=lambda fr: fr[0][0]):
+            pages = []
+            for _, file_pages in group:
+                stats["files"] += 1
+                pages.extend(file_pages)
+            pages.sort(key=lambda p: (p[0], p[2]))
+            stats["pages"] += len(pages)
+            for fetched_at, country, page, items in pages:
+                chart = open_charts.get(country)
+                if page == 1:
+                    if chart:
+                        yield country, chart[0], chart[1]
+                    open_charts[country] = [datetime.fromisoformat(fetched_at), list(items), 2]
+                elif chart and page == chart[2]:
+                    chart[1].extend(items)
+                    chart[2] += 1
+                else:  # its first page is outside the window or was never archived
+                    stats["orphan_pages"] += 1
+    for country, chart in open_charts.items():
+        yield country, chart[0], chart[1]
+
+
+def replay_lastfm(db: Session, root: str, countries=None, start: datetime = None, end: datetime = None,
+                  period: str = None, workers: int = None):
+    """
+    Ingest the archived Last.fm charts. `period` (hour/day/week/run, default
+    LASTFM_SNAPSHOT_PERIOD) keys the snapshots like live runs do: of several charts in one
+    period only the last one is ingested.
+    """
+    period = period or SNAPSHOT_PERIOD
+    started = time.perf_counter()
+    stats = {"charts": 0, "ingested": 0, "skipped_existing": 0, "superseded": 0, "failed": 0, "trends": 0}
+    errors = []
+
+    existing = db.query(Snapshot.country, Snapshot.fetched_at)
+    if start:
+        existing = existing.filter(Snapshot.fetched_at >= start)
+    if end:
+        existing = existing.filter(Snapshot.fetched_at <= end)
+    existing = set(existing.all())
+
+    resolver = ArtistResolver.load(db)
+
+    def _ingest(country, fetched_at, items, key):
+        nonlocal resolver
+        if (country, fetched_at) in existing:
+            stats["skipped_existing"] += 1
+            return
+        try:
+            result = ingest_lastfm_items(
+                db, country, items, snapshot_key=key, resolver=resolver, fetched_at=fetched_at
+            )
+        except Exception as e:
+            db.rollback()
+            resolver = ArtistResolver.load(db)  # drop artists the rollback took back
+            stats["failed"] += 1
+            if len(errors) < 10:
+                errors.append({"country": country, "fetched_at": fetched_at.isoformat(), "error": str(e)})
+            return
+        stats["ingested"] += 1
+        stats["trends"] += result["trends"]
+
+    # the last chart of each country waits for the next one: same key = it is replaced
+    held = {}  # country -> (fetched_at, items, key)
+    for country, fetched_at, items in iter_lastfm_charts(root, countries, start, end, workers, stats):
+        stats["charts"] += 1
+        key = snapshot_key_for(fetched_at, period)
+        previous = held.get(country)
+        if previous and key is not None and previous[2] == key:
+            stats["superseded"] += 1
+        elif previous:
+            _ingest(country, *previous)
+        held[country] = (fetched_at, items, key)
+    for country, chart in held.items():
+        _ingest(country, *chart)
+
+    elapsed = time.perf_counter() - started
+    stats.update({
+        "period": period,
+        "errors": errors,
+        "elapsed": round(elapsed, 4),
+        "charts_per_second": round(stats["ingested"] / elapsed, 2) if elapsed else None,
+    })
+    return stats
+
+
+def load_payload_index(root: str, client: str, start: datetime = None, end: datetime = None,
+                       workers: int = None):
+    """{cache key: body} of one client's archive; a request archived twice keeps the newer body."""
+    files = archive_files(root, client, _day(start), _day(end))
+    index = {}
+    workers = _workers(workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rows in _parsed(pool, 2 * workers, parse_keyed_bodies, [p for _, p in files], start, end):
+            for key, _, body in rows:
+                index[key] = body
+    return index, len(files)
+
+
+def replay_musicbrainz(db: Session, root: str, start: datetime = None, end: datetime = None,
+                       workers: int = None, batch_size: int = 200):
+    """Enrich every candidate artist from the archived MusicBrainz responses, without network."""
+    started = time.perf_counter()
+    index, files = load_payload_index(root, "musicbrainz", start, end, workers)
+    client = musicbrainz_client.client
+    before = dict(client.counters)
+    updated = runs = 0
+    with client.replaying(index):
+        # every attempt either enriches the artist or schedules its retry, so this ends
+        while select_candidates(db, 1):
+            updated += run_musicbrainz_etl(db, limit=batch_size)
+            runs += 1
+    return {
+        "files": files,
+        "payloads": len(index),
+        "runs": runs,
+        "updated_artists": updated,
+        "replayed": client.counters["replayed"] - before["replayed"],
+        "not_archived": client.counters["not_archived"] - before["not_archived"],
+        "elapsed": round(time.perf_counter() - started, 4),
+    }
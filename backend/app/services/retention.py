@@ -0,0 +1,326 @@
+"""
+Retention and downsampling of the chart history.
+
+track_trends gets one row per chart position per country per run, so it grows without
+bound. The retention job thins it by age (all windows in days, relative to now, UTC):
+
+  - younger than RETENTION_FULL_DAYS: every snapshot is kept
+  - up to RETENTION_DAILY_DAYS: the latest snapshot of each day is kept
+  - older: the latest snapshot of each ISO week is kept
+  - older than RETENTION_MAX_DAYS (0 = never): everything is deleted, rollups included
+
+Before a day loses snapshots, its per-track stats (best rank, average rank, appearances)
+are written to track_trend_rollups, so thinned history still answers "how did this track
+do that day". Dropped snapshots are deleted with their aggregates and catalog rows in
+batches of about RETENTION_BATCH_SIZE track_trends rows, one transaction per batch, so the
+job never holds long locks on the tables the ETL writes to.
+
+On PostgreSQL, track_trends can also be range-partitioned by month (partition_track_trends);
+the job then creates upcoming partitions and drops partitions past RETENTION_MAX_DAYS whole.
+"""
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from app.core.database import DATABASE_URL
+from app.models.snapshot import Snapshot
+from app.models.snapshot_artist_count import SnapshotArtistCount
+from app.models.snapshot_genre_count import SnapshotGenreCount
+from app.models.snapshot_nationality_count import SnapshotNationalityCount
+from app.models.track_trend import TrackTrend
+from app.models.track_trend_rollup import TrackTrendRollup
+from app.services import analytics_cache
+from app.services.snapshots import backfill_snapshot_catalog
+
+FULL_DAYS = int(os.getenv("RETENTION_FULL_DAYS", "14"))
+DAILY_DAYS = int(os.getenv("RETENTION_DAILY_DAYS", "90"))
+MAX_DAYS = int(os.getenv("RETENTION_MAX_DAYS", "0"))  # 0 = keep the thinned history forever
+BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))  # track_trends rows per delete transaction
+PAUSE_MS = int(os.getenv("RETENTION_PAUSE_MS", "0"))  # sleep between batches (lets the ETL in)
+PARTITION_MONTHS_AHEAD = int(os.getenv("RETENTION_PARTITION_MONTHS_AHEAD", "3"))
+
+SNAPSHOT_MODELS = (TrackTrend, SnapshotArtistCount, SnapshotGenreCount, SnapshotNationalityCount, Snapshot)
+
+
+def _day(t: datetime):
+    return t.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def plan_retention(snapshots, now: datetime, full_days: int = None, daily_days: int = None,
+                   max_days: int = None):
+    """
+    Split catalog rows [(country, fetched_at, row_count), ...] into (keep, drop, expire) lists.
+    `expire` are the snapshots past max_days, `drop` the ones removed by downsampling.
+    """
+    full_days = FULL_DAYS if full_days is None else full_days
+    daily_days = DAILY_DAYS if daily_days is None else daily_days
+    max_days = MAX_DAYS if max_days is None else max_days
+
+    full_cutoff = now - timedelta(days=full_days)
+    daily_cutoff = now - timedelta(days=max(daily_days, full_days))
+    max_cutoff = now - timedelta(days=max_days) if max_days > 0 else None
+
+    keep, drop, expire = [], [], []
+    latest = {}  # (country, bucket) -> snapshot kept so far
+    for snap in snapshots:
+        country, fetched_at, _ = snap
+        if fetched_at >= full_cutoff:
+            keep.append(snap)
+            continue
+        if max_cutoff is not None and fetched_at < max_cutoff:
+            expire.append(snap)
+            continue
+        if fetched_at >= daily_cutoff:
+            bucket = ("day", fetched_at.date())
+        else:
+            bucket = ("week", fetched_at.isocalendar()[:2])
+        current = latest.get((country, bucket))
+        if current is None or fetched_at > current[1]:
+            if current is not None:
+                drop.append(current)
+            latest[(country, bucket)] = snap
+        else:
+            drop.append(snap)
+    keep.extend(latest.values())
+    return keep, drop, expire
+
+
+def _write_day_rollups(db: Session, by_day: dict, existing: set):
+    """One INSERT ... SELECT ... GROUP BY track_id per (country, day) without a rollup yet."""
+    written = 0
+    for (country, day_start), times in sorted(by_day.items()):
+        if (country, day_start) in existing:
+            continue
+        stmt = insert(TrackTrendRollup).from_select(
+            ["country", "period", "period_start", "track_id", "best_rank", "avg_rank", "appearances", "snapshots"],
+            select(
+                literal(country),
+                literal("day"),
+                literal(day_start, DateTime),
+                TrackTrend.track_id,
+                func.min(TrackTrend.rank),
+                func.avg(TrackTrend.rank),
+                func.count(TrackTrend.id),
+                literal(len(times)),
+            )
+            .where(TrackTrend.country == country, TrackTrend.fetched_at.in_(times))
+            .group_by(TrackTrend.track_id),
+        )
+        db.execute(stmt)
+        db.commit()
+        written += 1
+    return written
+
+
+def _batches(snapshots, batch_size: int):
+    """Group [(country, fetched_at, row_count)] per country into runs of <= batch_size rows."""
+    by_country = defaultdict(list)
+    for snap in snapshots:
+        by_country[snap[0]].append(snap)
+    for country, snaps in sorted(by_country.items()):
+        batch, rows = [], 0
+        for _, fetched_at, row_count in sorted(snaps, key=lambda s: s[1]):
+            if batch and rows + (row_count or 0) > batch_size:
+                yield country, batch
+                batch, rows = [], 0
+            batch.append(fetched_at)
+            rows += row_count or 0
+        if batch:
+            yield country, batch
+
+
+def _delete_snapshots(db: Session, snapshots, batch_size: int, pause_ms: int):
+    batches = 0
+    for country, times in _batches(snapshots, batch_size):
+        for model in SNAPSHOT_MODELS:
+            db.execute(delete(model).where(model.country == country, model.fetched_at.in_(times)))
+        db.commit()
+        batches += 1
+        if pause_ms:
+            time.sleep(pause_ms / 1000.0)
+    return batches
+
+
+def run_retention(db: Session, dry_run: bool = False, now: datetime = None, full_days: int = None,
+                  daily_days: int = None, max_days: int = None, batch_size: int = None,
+                  pause_ms: int = None):
+    """
+    Apply the retention policy (see module docstring). With dry_run nothing is written and
+    the returned counts describe what would happen.
+    """
+    now = now or datetime.utcnow()
+    full_days = FULL_DAYS if full_days is None else full_days
+    max_days = MAX_DAYS if max_days is None else max_days
+    batch_size = batch_size or BATCH_SIZE
+    pause_ms = PAUSE_MS if pause_ms is None else pause_ms
+
+    if not dry_run:
+        backfill_snapshot_catalog(db)  # snapshots from before the catalog must be visible here
+
+    snapshots = [
+        tuple(r) for r in db.query(Snapshot.country, Snapshot.fetched_at, Snapshot.row_count)
+        .filter(Snapshot.fetched_at < now - timedelta(days=full_days))
+        .order_by(Snapshot.country, Snapshot.fetched_at)
+        .all()
+    ]
+    keep, drop, expire = plan_retention(snapshots, now, full_days, daily_days, max_days)
+
+    # every snapshot of a day that loses at least one, for the rollup of that day
+    thinned_days = {(c, _day(t)) for c, t, _ in drop}
+    by_day = defaultdict(list)
+    for country, fetched_at, _ in keep + drop:
+        if (country, _day(fetched_at)) in thinned_days:
+            by_day[(country, _day(fetched_at))].append(fetched_at)
+
+    existing = set()
+    if by_day:
+        existing = set(
+            db.query(TrackTrendRollup.country, TrackTrendRollup.period_start)
+            .filter(
+                TrackTrendRollup.period == "day",
+                TrackTrendRollup.period_start >= min(d for _, d in by_day),
+            )
+            .distinct()
+            .all()
+        )
+    max_cutoff = now - timedelta(days=max_days) if max_days > 0 else None
+
+    stats = {
+        "dry_run": dry_run,
+        "snapshots_examined": len(snapshots),
+        "snapshots_kept": len(keep),
+        "snapshots_downsampled": len(drop),
+        "snapshots_expired": len(expire),
+        "rows_deleted": sum(n or 0 for _, _, n in drop + expire),
+        "rollups_written": len([k for k in by_day if k not in existing]),
+    }
+    if dry_run:
+        return stats
+
+    stats["rollups_written"] = _write_day_rollups(db, by_day, existing)
+
+    if is_partitioned(db):
+        ensure_partitions(db, now)
+        if max_cutoff is not None:
+            stats["partitions_dropped"] = drop_expired_partitions(db, max_cutoff)
+    stats["delete_batches"] = _delete_snapshots(db, drop + expire, batch_size, pause_ms)
+
+    if max_cutoff is not None:
+        stats["rollups_expired"] = db.execute(
+            delete(TrackTrendRollup).where(TrackTrendRollup.period_start < _day(max_cutoff))
+        ).rowcount
+        db.commit()
+
+    analytics_cache.invalidate_countries({c for c, _, _ in drop + expire})
+    return stats
+
+
+# ---- PostgreSQL range partitioning ----
+
+def _is_postgres():
+    return DATABASE_URL.startswith("postgresql")
+
+
+def _month(t: datetime):
+    return t.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(t: datetime):
+    return (t.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(month: datetime):
+    return f"track_trends_p{month:%Y%m}"
+
+
+def is_partitioned(db: Session):
+    if not _is_postgres():
+        return False
+    return bool(db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('track_trends')"
+    )).first())
+
+
+def _create_partition(db: Session, month: datetime):
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF track_trends "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    ))
+
+
+def ensure_partitions(db: Session, now: datetime = None, months_ahead: int = None):
+    """Create the monthly partitions from this month to `months_ahead` months out."""
+    months_ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    month = _month(now or datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        _create_partition(db, month)
+        month = _next_month(month)
+    db.commit()
+
+
+def drop_expired_partitions(db: Session, before: datetime):
+    """Drop monthly partitions that end before `before` (instant, no row-by-row delete)."""
+    names = [
+        name for (name,) in db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('track_trends')"
+        ))
+    ]
+    dropped = []
+    for name in sorted(names):
+        if not name.startswith("track_trends_p"):
+            continue  # e.g. track_trends_default
+        month = datetime.strptime(name[len("track_trends_p"):], "%Y%m")
+        if _next_month(month) <= before:
+            db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    db.commit()
+    return dropped
+
+
+def partition_track_trends(db: Session, months_ahead: int = None):
+    """
+    One-off migration: turn track_trends into a table range-partitioned by month on
+    fetched_at (PostgreSQL only). Runs in one transaction and copies every row, so
+    schedule it in a quiet window. The primary key becomes (id, fetched_at).
+    """
+    if not _is_postgres():
+        raise RuntimeError("track_trends partitioning needs PostgreSQL")
+    if is_partitioned(db):
+        ensure_partitions(db, months_ahead=months_ahead)
+        return {"partitioned": True, "already_partitioned": True}
+
+    first, rows = db.execute(text("SELECT min(fetched_at), count(*) FROM track_trends")).one()
+    db.execute(text("ALTER TABLE track_trends RENAME TO track_trends_unpartitioned"))
+    db.execute(text(
+        "CREATE TABLE track_trends (LIKE track_trends_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (fetched_at)"
+    ))
+    db.execute(text("ALTER TABLE track_trends ADD PRIMARY KEY (id, fetched_at)"))
+    db.execute(text("ALTER TABLE track_trends ADD FOREIGN KEY (track_id) REFERENCES tracks (id)"))
+    # the id sequence belongs to the old table and would be dropped with it
+    sequence = db.execute(text("SELECT pg_get_serial_sequence('track_trends_unpartitioned', 'id')")).scalar()
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY track_trends.id"))
+
+    month = _month(first or datetime.utcnow())
+    last = _month(datetime.utcnow())
+    for _ in range(months_ahead if months_ahead is not None else PARTITION_MONTHS_AHEAD):
+        last = _next_month(last)
+    partitions = 0
+    while month <= last:
+        _create_partition(db, month)
+        month = _next_month(month)
+        partitions += 1
+    db.execute(text("CREATE TABLE track_trends_default PARTITION OF track_trends DEFAULT"))
+
+    db.execute(text("INSERT INTO track_trends SELECT * FROM track_trends_unpartitioned"))
+    db.execute(text("DROP TABLE track_trends_unpartitioned"))
+    for index in TrackTrend.__table__.indexes:
+        index.create(bind=db.connection())
+    db.commit()
+    return {"partitioned": True, "partitions": partitions, "rows_copied": rows}
@@ -0,0 +1,134 @@
+"""
+Per-snapshot aggregate tables read by the analytics endpoints.
+
+A snapshot is one (country, fetched_at) pair in track_trends. For each snapshot we keep
+  - snapshot_artist_counts:      chart entries per artist
+  - snapshot_genre_counts:       genre tag counts (artist_genres weighted by chart entries)
+  - snapshot_nationality_counts: distinct artists per artist country
+The Last.fm ETL fills them for the snapshot it writes, the MusicBrainz ETL refreshes the
+latest snapshots of the artists it enriched, and `manage.py rebuild-aggregates` /
+`backfill-snapshots` backfill older snapshots. The read path never writes them.
+"""
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.artist import Artist
+from app.models.artist_genre import ArtistGenre
+from app.models.genre import Genre
+from app.models.track import Track
+from app.models.track_trend import TrackTrend
+from app.models.snapshot_artist_count import SnapshotArtistCount
+from app.models.snapshot_genre_count import SnapshotGenreCount
+from app.models.snapshot_nationality_count import SnapshotNationalityCount
+from app.services.snapshots import latest_snapshots
+
+
+def _snapshot_filter(model, country, fetched_at):
+    return (model.country == country, model.fetched_at == fetched_at)
+
+
+def _refresh_artist_counts(db: Session, country: str, fetched_at):
+    db.execute(delete(SnapshotArtistCount).where(*_snapshot_filter(SnapshotArtistCount, country, fetched_at)))
+    rows = (
+        db.query(Track.artist_id, func.count(TrackTrend.id))
+        .join(TrackTrend, TrackTrend.track_id == Track.id)
+        .filter(TrackTrend.country == country, TrackTrend.fetched_at == fetched_at)
+        .group_by(Track.artist_id)
+        .all()
+    )
+    if rows:
+        db.execute(
+            insert(SnapshotArtistCount),
+            [
+                {"country": country, "fetched_at": fetched_at, "artist_id": a, "track_count": n}
+                for a, n in rows
+            ],
+        )
+
+
+def _refresh_artist_dependent(db: Session, country: str, fetched_at):
+    """Genre and nationality counts; both depend on artist metadata (MusicBrainz)."""
+    db.execute(delete(SnapshotGenreCount).where(*_snapshot_filter(SnapshotGenreCount, country, fetched_at)))
+    db.execute(
+        delete(SnapshotNationalityCount).where(*_snapshot_filter(SnapshotNationalityCount, country, fetched_at))
+    )
+
+    sac = SnapshotArtistCount
+    in_snapshot = _snapshot_filter(sac, country, fetched_at)
+
+    # genre tags weighted by chart entries, grouped inside the database
+    genre_counts = (
+        select(sac.country, sac.fetched_at, Genre.name, func.sum(sac.track_count))
+        .join(ArtistGenre, ArtistGenre.artist_id == sac.artist_id)
+        .join(Genre, Genre.id == ArtistGenre.genre_id)
+        .where(*in_snapshot)
+        .group_by(sac.country, sac.fetched_at, Genre.name)
+    )
+    db.execute(
+        insert(SnapshotGenreCount).from_select(["country", "fetched_at", "genre", "count"], genre_counts)
+    )
+
+    nationality_counts = (
+        select(sac.country, sac.fetched_at, Artist.country, func.count(func.distinct(Artist.id)))
+        .join(Artist, Artist.id == sac.artist_id)
+        .where(*in_snapshot, Artist.country.isnot(None))
+        .group_by(sac.country, sac.fetched_at, Artist.country)
+    )
+    db.execute(
+        insert(SnapshotNationalityCount).from_select(
+            ["country", "fetched_at", "artist_country", "artist_count"], nationality_counts
+        )
+    )
+
+
+def refresh_snapshot_aggregates(db: Session, country: str, fetched_at):
+    """Recompute every aggregate of one snapshot. Runs in the caller's transaction (no commit)."""
+    _refresh_artist_counts(db, country, fetched_at)
+    db.flush()
+    _refresh_artist_dependent(db, country, fetched_at)
+
+
+def refresh_latest_snapshots_for_artists(db: Session, artist_ids):
+    """
+    After artist metadata changed, refresh genre/nationality counts of the latest snapshot of
+    every country those artists appear in. Older snapshots are left to `rebuild_all_aggregates`.
+    Returns the refreshed countries. Runs in the caller's transaction (no commit).
+    """
+    artist_ids = list(artist_ids)
+    if not artist_ids:
+        return []
+
+    latest = latest_snapshots(db)
+    if not latest:
+        return []
+    snapshots = (
+        db.query(SnapshotArtistCount.country, SnapshotArtistCount.fetched_at)
+        .filter(
+            SnapshotArtistCount.artist_id.in_(artist_ids),
+            tuple_(SnapshotArtistCount.country, SnapshotArtistCount.fetched_at).in_(list(latest.items())),
+        )
+        .distinct()
+        .all()
+    )
+    for country, fetched_at in snapshots:
+        _refresh_artist_dependent(db, country, fetched_at)
+    return sorted({c for c, _ in snapshots})
+
+
+def rebuild_all_aggregates(db: Session, country: str = None, missing_only: bool = False):
+    """
+    Backfill/rebuild the aggregates of every snapshot in track_trends (one commit per snapshot).
+    `missing_only` skips snapshots that already have aggregate rows.
+    """
+    q = db.query(TrackTrend.country, TrackTrend.fetched_at).distinct()
+    if country:
+        q = q.filter(TrackTrend.country == country)
+    snapshots = q.order_by(TrackTrend.country, TrackTrend.fetched_at).all()
+    if missing_only:
+        present = set(db.query(SnapshotArtistCount.country, SnapshotArtistCount.fetched_at).distinct())
+        snapshots = [s for s in snapshots if tuple(s) not in present]
+
+    for c, fetched_at in snapshots:
+        refresh_snapshot_aggregates(db, c, fetched_at)
+        db.commit()
+    return {"snapshots_rebuilt": len(snapshots)}
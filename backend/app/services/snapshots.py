@@ -0,0 +1,197 @@
+"""
+Snapshot catalog helpers.
+
+`snapshots` has one row per (country, fetched_at) chart snapshot, written by the Last.fm
+ETL in the same transaction as its track_trends rows. Readers resolve "the latest snapshot
+of a country" from here instead of scanning track_trends with max(fetched_at).
+
+Every live snapshot carries an idempotency key: a rerun with the same (country, key) deletes
+the previous snapshot and writes the new one in the same transaction, so a retry replaces a
+snapshot instead of adding a second one. The key is the run key (new_run_key) shared by every
+country of one run, which a retry of that run reuses (the ETL responses and jobs report it);
+with LASTFM_SNAPSHOT_PERIOD set to hour/day/week it is the chart period instead, and any rerun
+in the period replaces the snapshot (intraday history is not kept).
+
+Trends, aggregates and catalog row of a snapshot are committed together, so readers see a
+snapshot whole or not at all.
+"""
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import and_, delete, exists, func, insert, or_, update
+from sqlalchemy.orm import Session, aliased
+
+from app.models.snapshot import Snapshot
+from app.models.snapshot_artist_count import SnapshotArtistCount
+from app.models.snapshot_genre_count import SnapshotGenreCount
+from app.models.snapshot_nationality_count import SnapshotNationalityCount
+from app.models.track_trend import TrackTrend
+from app.models.track_trend_rollup import TrackTrendRollup
+
+# runs within one period are the same snapshot: "hour" / "day" / "week" (opt-in), or "run"
+# (the default: a run and its retries are the same snapshot, see new_run_key)
+SNAPSHOT_PERIOD = os.getenv("LASTFM_SNAPSHOT_PERIOD", "run").lower()
+_PERIOD_FORMATS = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d", "week": "%G-W%V"}
+
+
+def snapshot_key_for(run_time: datetime, period: str = None):
+    """Period key of a run at `run_time` (UTC); None for period "run" (see new_run_key)."""
+    fmt = _PERIOD_FORMATS.get(period or SNAPSHOT_PERIOD)
+    return run_time.strftime(fmt) if fmt else None
+
+
+def new_run_key():
+    """Key of a new run (period "run"); passing it back on a retry replaces that run's snapshots."""
+    return "run-" + uuid.uuid4().hex[:16]
+
+
+def run_snapshot_key(run_time: datetime, run_key: str = None):
+    """Snapshot key of a live run: the period key, else `run_key` (a retry's), else a new run key."""
+    return snapshot_key_for(run_time) or run_key or new_run_key()
+
+
+def delete_snapshot(db: Session, country: str, fetched_at):
+    """Remove one snapshot: trends, aggregates and catalog row (caller commits)."""
+    for model in (TrackTrend, SnapshotArtistCount, SnapshotGenreCount, SnapshotNationalityCount, Snapshot):
+        db.execute(delete(model).where(model.country == country, model.fetched_at == fetched_at))
+
+
+def replace_keyed_snapshots(db: Session, country: str, snapshot_key):
+    """Delete the snapshots already written under (country, snapshot_key). Returns their times."""
+    if snapshot_key is None:
+        return []
+    previous = [
+        t for (t,) in db.query(Snapshot.fetched_at)
+        .filter(Snapshot.country == country, Snapshot.snapshot_key == snapshot_key)
+        .all()
+    ]
+    for fetched_at in previous:
+        delete_snapshot(db, country, fetched_at)
+    return previous
+
+
+def record_snapshot(db: Session, country: str, fetched_at, row_count: int, snapshot_key=None):
+    """Add the catalog row of a freshly written snapshot (caller commits)."""
+    db.execute(
+        insert(Snapshot),
+        [{
+            "country": country,
+            "fetched_at": fetched_at,
+            "row_count": row_count,
+            "snapshot_key": snapshot_key,
+            "created_at": datetime.utcnow(),
+        }],
+    )
+
+
+def latest_snapshot_time(db: Session, country: str):
+    latest = (
+        db.query(Snapshot.fetched_at)
+        .filter(Snapshot.country == country)
+        .order_by(Snapshot.fetched_at.desc())
+        .limit(1)
+        .scalar()
+    )
+    if latest is None:
+        # catalog not backfilled for this country yet (manage.py backfill-snapshots);
+        # still an index-only lookup thanks to ix_track_trends_country_fetched_track
+        latest = (
+            db.query(func.max(TrackTrend.fetched_at))
+            .filter(TrackTrend.country == country)
+            .scalar()
+        )
+    return latest
+
+
+def latest_snapshots(db: Session, countries=None):
+    """{country: latest fetched_at} for the given countries (all when None)."""
+    q = db.query(Snapshot.country, func.max(Snapshot.fetched_at))
+    if countries is not None:
+        q = q.filter(Snapshot.country.in_(list(countries)))
+    return dict(q.group_by(Snapshot.country).all())
+
+
+def backfill_snapshot_catalog(db: Session):
+    """Create catalog rows for snapshots written before the catalog existed."""
+    known = set(db.query(Snapshot.country, Snapshot.fetched_at).all())
+    rows = (
+        db.query(TrackTrend.country, TrackTrend.fetched_at, func.count(TrackTrend.id))
+        .group_by(TrackTrend.country, TrackTrend.fetched_at)
+        .all()
+    )
+    missing = [
+        {"country": c, "fetched_at": t, "row_count": n, "created_at": datetime.utcnow()}
+        for c, t, n in rows
+        if (c, t) not in known
+    ]
+    if missing:
+        db.execute(insert(Snapshot), missing)
+    db.commit()
+    return {"snapshots_added": len(missing), "snapshots_total": len(known) + len(missing)}
+
+
+def lowercase_countries(db: Session):
+    """
+    Move snapshots ingested before country names were lowercased ("Spain" next to "spain")
+    under the lowercased name: trends, aggregates and catalog row of each snapshot in one
+    transaction, then the retention rollups. A snapshot or rollup whose lowercased row already
+    exists is left alone and counted as a conflict.
+    """
+    mixed = set()
+    for model in (Snapshot, TrackTrend):
+        mixed.update(
+            db.query(model.country, model.fetched_at)
+            .filter(model.country != func.lower(model.country))
+            .distinct()
+            .all()
+        )
+    moved, conflicts = 0, []
+    for country, fetched_at in sorted(mixed):
+        lower = country.lower()
+        key = db.query(Snapshot.snapshot_key).filter(
+            Snapshot.country == country, Snapshot.fetched_at == fetched_at
+        ).scalar()
+        same = [Snapshot.fetched_at == fetched_at] + ([Snapshot.snapshot_key == key] if key else [])
+        taken = db.query(Snapshot.id).filter(Snapshot.country == lower, or_(*same)).first() or db.query(TrackTrend.id).filter(
+            TrackTrend.country == lower, TrackTrend.fetched_at == fetched_at
+        ).first()
+        if taken:
+            conflicts.append({"country": country, "fetched_at": fetched_at.isoformat()})
+            continue
+        for model in (TrackTrend, SnapshotArtistCount, SnapshotGenreCount, SnapshotNationalityCount, Snapshot):
+            db.execute(
+                update(model)
+                .where(model.country == country, model.fetched_at == fetched_at)
+                .values(country=lower)
+            )
+        db.commit()
+        moved += 1
+
+    other = aliased(TrackTrendRollup)
+    rollups = db.execute(
+        update(TrackTrendRollup)
+        .where(
+            TrackTrendRollup.country != func.lower(TrackTrendRollup.country),
+            ~exists().where(and_(
+                other.country == func.lower(TrackTrendRollup.country),
+                other.period == TrackTrendRollup.period,
+                other.period_start == TrackTrendRollup.period_start,
+                other.track_id == TrackTrendRollup.track_id,
+            )),
+        )
+        .values(country=func.lower(TrackTrendRollup.country))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    rollup_conflicts = (
+        db.query(func.count(TrackTrendRollup.id))
+        .filter(TrackTrendRollup.country != func.lower(TrackTrendRollup.country))
+        .scalar()
+    )
+    return {
+        "snapshots_moved": moved,
+        "snapshot_conflicts": conflicts,
+        "rollups_moved": rollups,
+        "rollup_conflicts": rollup_conflicts,
+    }
@@ -0,0 +1,114 @@
+from collections import defaultdict
+
+from sqlalchemy import and_, bindparam, delete, exists, update
+from sqlalchemy.orm import Session
+
+from app.models.track import Track
+from app.models.track_trend import TrackTrend
+from app.models.track_trend_rollup import TrackTrendRollup
+from app.services.snapshot_aggregates import refresh_snapshot_aggregates
+
+
+def track_natural_key(artist_id, title, mbid=None):
+    """
+    Natural key used to deduplicate tracks across snapshots: artist_id + the recording mbid
+    when present, otherwise artist_id + casefolded/whitespace-collapsed title. The artist is
+    part of both, so a recording mbid Last.fm reports for two artists never merges their tracks.
+    """
+    if mbid:
+        return f"a{artist_id}:mbid:{mbid.strip().lower()}"
+    norm_title = " ".join((title or "").casefold().split())
+    return f"a{artist_id}:{norm_title}"
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def dedupe_tracks(db: Session, batch_size: int = 1000):
+    """
+    One-shot migration: merge duplicate Track rows and backfill `natural_key`.
+
+    For every natural key the row already holding that key (or the lowest id) is kept,
+    track_trends.track_id (and track_trend_rollups.track_id) is repointed to it, the aggregates
+    of the snapshots the duplicates charted in are recomputed and the other rows are deleted.
+    Also rewrites keys stored in an older format.
+    Returns {"tracks_scanned", "duplicates_merged", "snapshots_refreshed", "keys_backfilled"}.
+    """
+    groups = defaultdict(list)
+    scanned = 0
+    rows = (
+        db.query(Track.id, Track.artist_id, Track.title, Track.mbid, Track.natural_key)
+        .order_by(Track.id)
+        .yield_per(5000)
+    )
+    for track_id, artist_id, title, mbid, natural_key in rows:
+        groups[track_natural_key(artist_id, title, mbid)].append((track_id, natural_key))
+        scanned += 1
+
+    repoint = []   # {"dup": id, "keeper": id}
+    backfill = []  # {"keeper": id, "key": natural_key}
+    for key, members in groups.items():
+        keeper = next((tid for tid, nk in members if nk == key), members[0][0])
+        for tid, nk in members:
+            if tid != keeper:
+                repoint.append({"dup": tid, "keeper": keeper})
+            elif nk != key:
+                backfill.append({"keeper": keeper, "key": key})
+
+    repoint_stmt = (
+        update(TrackTrend)
+        .where(TrackTrend.track_id == bindparam("dup"))
+        .values(track_id=bindparam("keeper"))
+    )
+    # rollups of a duplicate move too, unless the keeper already has one for that period
+    kept = TrackTrendRollup.__table__.alias("kept")
+    rollup_conflict_stmt = delete(TrackTrendRollup).where(
+        TrackTrendRollup.track_id == bindparam("dup"),
+        exists().where(and_(
+            kept.c.track_id == bindparam("keeper"),
+            kept.c.country == TrackTrendRollup.country,
+            kept.c.period == TrackTrendRollup.period,
+            kept.c.period_start == TrackTrendRollup.period_start,
+        )),
+    )
+    rollup_repoint_stmt = (
+        update(TrackTrendRollup)
+        .where(TrackTrendRollup.track_id == bindparam("dup"))
+        .values(track_id=bindparam("keeper"))
+    )
+    refreshed = 0
+    for chunk in _chunks(repoint, batch_size):
+        dup_ids = [r["dup"] for r in chunk]
+        snapshots = (
+            db.query(TrackTrend.country, TrackTrend.fetched_at)
+            .filter(TrackTrend.track_id.in_(dup_ids))
+            .distinct()
+            .all()
+        )
+        db.connection().execute(repoint_stmt, chunk)
+        db.connection().execute(rollup_conflict_stmt, chunk)
+        db.connection().execute(rollup_repoint_stmt, chunk)
+        db.execute(delete(Track).where(Track.id.in_(dup_ids)))
+        for country, fetched_at in snapshots:
+            refresh_snapshot_aggregates(db, country, fetched_at)
+        refreshed += len(snapshots)
+        db.commit()
+
+    # duplicates are gone, so setting the keys can no longer hit the unique index
+    backfill_stmt = (
+        update(Track)
+        .where(Track.id == bindparam("keeper"))
+        .values(natural_key=bindparam("key"))
+    )
+    for chunk in _chunks(backfill, batch_size):
+        db.connection().execute(backfill_stmt, chunk)
+        db.commit()
+
+    return {
+        "tracks_scanned": scanned,
+        "duplicates_merged": len(repoint),
+        "snapshots_refreshed": refreshed,
+        "keys_backfilled": len(backfill),
+    }
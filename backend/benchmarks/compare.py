@@ -0,0 +1,63 @@
+"""
+Compare two benchmark reports and flag regressions.
+
+    python -m benchmarks.compare baseline.json current.json [--threshold 0.2]
+
+A scenario regresses when its p95 latency grows, or its throughput drops, by more than
+`threshold` (relative). Exits with status 1 if any scenario regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    if not old:
+        return None
+    return (new - old) / old
+
+
+def compare(baseline, current, threshold):
+    rows, regressions = [], []
+    for name, cur in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            rows.append((name, None, None, "new"))
+            continue
+        p95 = _change(base["p95_ms"], cur["p95_ms"])
+        tput = _change(base["throughput"], cur["throughput"])
+        regressed = (p95 is not None and p95 > threshold) or (tput is not None and tput < -threshold)
+        if regressed:
+            regressions.append(name)
+        rows.append((name, p95, tput, "REGRESSION" if regressed else "ok"))
+    return rows, regressions
+
+
+def _pct(value):
+    return "     n/a" if value is None else f"{value * 100:+7.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline["meta"]["params"] != current["meta"]["params"]:
+        print("warning: the reports were produced with different parameters", file=sys.stderr)
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    width = max(len(r[0]) for r in rows) if rows else 0
+    print(f"{'scenario':<{width}}  {'p95':>8}  {'throughput':>10}")
+    for name, p95, tput, verdict in rows:
+        print(f"{name:<{width}}  {_pct(p95)}  {_pct(tput):>10}  {verdict}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
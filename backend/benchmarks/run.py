@@ -0,0 +1,310 @@
+"""
+Benchmark runner.
+
+    cd backend
+    python -m benchmarks.run --countries 5 --snapshots 4 --tracks 100 --output bench.json
+    python -m benchmarks.run --database-url postgresql://user:pw@localhost/musicscope_bench --reset
+
+Scenarios (all against local API stubs fed by benchmarks/synthetic.py):
+  - lastfm_etl        run_lastfm_etl once per country per snapshot (builds the history)
+  - musicbrainz_etl   run_musicbrainz_etl in batches until every artist is enriched
+  - analytics:<path>  every /analytics endpoint over HTTP (uvicorn), cold (cache cleared
+                      before each request) and warm (served from the analytics cache)
+
+Every scenario reports throughput, p50/p95/p99 latency and the peak traced Python heap
+(tracemalloc) as JSON. Compare two reports with `python -m benchmarks.compare`.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.stubs import StubServers
+from benchmarks.synthetic import SyntheticCharts
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of a non-empty list (q in 0..100)."""
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def summarize(latencies, elapsed, units, unit_name, peak_bytes, **extra):
+    ms = [x * 1000 for x in latencies] or [0.0]
+    return {
+        "calls": len(latencies),
+        "elapsed_s": round(elapsed, 4),
+        "throughput": round(units / elapsed, 2) if elapsed else None,
+        "throughput_unit": f"{unit_name}/s",
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+        "peak_mem_mb": round(peak_bytes / (1024 * 1024), 2),
+        **extra,
+    }
+
+
+TRACE_MEMORY = True
+
+
+class traced:
+    """Wall time and tracemalloc peak of the block (peak is 0 with --no-tracemalloc)."""
+
+    def __enter__(self):
+        if TRACE_MEMORY:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.t0
+        self.peak = 0
+        if TRACE_MEMORY:
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+# ---- scenarios ----
+
+def bench_lastfm_etl(db, charts, stubs):
+    from app.services.etl_lastfm import run_lastfm_etl
+
+    latencies, rows = [], 0
+    phases = {}
+    with traced() as t:
+        for snapshot in range(charts.snapshots):
+            stubs.snapshot = snapshot
+            for country in charts.countries:
+                t0 = time.perf_counter()
+                stats = run_lastfm_etl(db, country, charts.tracks_per_chart)
+                latencies.append(time.perf_counter() - t0)
+                rows += stats["trends"]
+                for phase, seconds in stats["timings"].items():
+                    phases.setdefault(phase, []).append(seconds * 1000)
+    phase_ms = {p: round(sum(v) / len(v), 3) for p, v in phases.items()}
+    return summarize(latencies, t.elapsed, rows, "rows", t.peak, rows=rows, mean_phase_ms=phase_ms)
+
+
+def bench_musicbrainz_etl(db, batch_size):
+    from app.services.etl_musicbrainz import run_musicbrainz_etl
+
+    latencies, updated = [], 0
+    with traced() as t:
+        while True:
+            t0 = time.perf_counter()
+            n = run_musicbrainz_etl(db, batch_size)
+            latencies.append(time.perf_counter() - t0)
+            updated += n
+            if n == 0:
+                break
+    return summarize(latencies, t.elapsed, updated, "artists", t.peak, artists=updated, batch_size=batch_size)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ApiServer:
+    """The real FastAPI app on uvicorn, in a background thread of this process."""
+
+    def __init__(self):
+        import uvicorn
+        from app.main import app
+
+        self.port = _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="api", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def _analytics_requests(db, charts, top_n):
+    from app.models.track_trend import TrackTrend
+
+    countries = charts.countries
+    track_id = db.query(TrackTrend.track_id).filter(TrackTrend.country == countries[0]).limit(1).scalar()
+    reqs = []
+    for c in countries:
+        reqs.append(("/analytics/genre-distribution", {"country": c, "top_n": top_n}))
+        reqs.append(("/analytics/top-artists-by-country", {"country": c, "top_n": top_n}))
+        reqs.append(("/analytics/artist-nationality-distribution", {"country": c, "top_n": top_n}))
+        reqs.append(("/analytics/trends/movers", {"country": c, "limit": 20}))
+        reqs.append(("/analytics/trends/longevity", {"country": c, "limit": 20}))
+    for c1, c2 in zip(countries, countries[1:] + countries[:1]):
+        reqs.append(("/analytics/country-genre-comparison", {"c1": c1, "c2": c2, "top_n": top_n}))
+        reqs.append(("/analytics/dashboard", {"country": c1, "compare": c2, "top_n": top_n}))
+    reqs.append(("/analytics/country-genre-matrix", {"metric": "cosine", "top_n": top_n}))
+    reqs.append(("/analytics/country-genre-matrix", {"countries": ",".join(countries), "metric": "jsd", "top_n": top_n}))
+    if track_id is not None:
+        reqs.append((f"/analytics/trends/tracks/{track_id}/trajectory", {"country": countries[0]}))
+    return reqs
+
+
+def _endpoint_name(path):
+    # one scenario per route, not per track id
+    return "/".join("{id}" if part.isdigit() else part for part in path.split("/"))
+
+
+def bench_analytics(db, charts, rounds, top_n):
+    import requests
+
+    from app.services import analytics_cache
+
+    per_endpoint = {}
+    for path, params in _analytics_requests(db, charts, top_n):
+        per_endpoint.setdefault(_endpoint_name(path), []).append((path, params))
+
+    results = {}
+    with ApiServer() as base_url, requests.Session() as http:
+        for mode in ("cold", "warm"):
+            analytics_cache.cache.clear()
+            for name, calls in per_endpoint.items():
+                if mode == "warm":
+                    for path, params in calls:  # fill the cache outside the measurement
+                        http.get(base_url + path, params=params, timeout=60).raise_for_status()
+
+                latencies = []
+                with traced() as t:
+                    for _ in range(rounds):
+                        for path, params in calls:
+                            if mode == "cold":
+                                analytics_cache.cache.clear()
+                            t0 = time.perf_counter()
+                            r = http.get(base_url + path, params=params, timeout=60)
+                            latencies.append(time.perf_counter() - t0)
+                            r.raise_for_status()
+                results[f"analytics:{name}:{mode}"] = summarize(latencies, t.elapsed, len(latencies), "req", t.peak)
+    return results
+
+
+# ---- setup ----
+
+def _configure_env(args, stubs):
+    os.environ["LASTFM_BASE_URL"] = stubs.lastfm_url
+    os.environ["MUSICBRAINZ_BASE_URL"] = stubs.musicbrainz_url
+    os.environ["LASTFM_API_KEY"] = "benchmark"
+    os.environ["MUSICBRAINZ_RATE"] = "100000"  # the stub has no rate limit to respect
+    os.environ["HTTP_CACHE_PATH"] = ""         # measure the ETL, not the response cache
+    os.environ["LASTFM_SNAPSHOT_PERIOD"] = "run"  # every replayed snapshot is kept, none replaced
+    os.environ["DATABASE_URL"] = args.database_url
+
+
+def _prepare_database(reset: bool):
+    from sqlalchemy import inspect
+
+    from app.core.database import Base, engine
+    from create_tables import init_db
+
+    if reset:  # importing create_tables registered every model
+        Base.metadata.drop_all(bind=engine)
+    elif "track_trends" in inspect(engine).get_table_names():
+        with engine.connect() as conn:
+            if conn.exec_driver_sql("SELECT 1 FROM track_trends LIMIT 1").first():
+                raise SystemExit("database is not empty; pass --reset to drop its tables first")
+    init_db()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="MusicScope benchmarks")
+    parser.add_argument("--countries", type=int, default=5)
+    parser.add_argument("--snapshots", type=int, default=4)
+    parser.add_argument("--tracks", type=int, default=100, help="chart length per snapshot")
+    parser.add_argument("--artists", type=int, default=None, help="artist pool size (default: 2x tracks)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="default: a temporary SQLite file")
+    parser.add_argument("--reset", action="store_true", help="drop all tables of --database-url first")
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulated API latency per stub request")
+    parser.add_argument("--mb-batch", type=int, default=50, help="run_musicbrainz_etl limit per call")
+    parser.add_argument("--rounds", type=int, default=5, help="requests per analytics endpoint and country")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--skip", nargs="*", default=[], choices=["lastfm", "musicbrainz", "analytics"])
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip memory tracing (it slows Python code down)")
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    global TRACE_MEMORY
+    TRACE_MEMORY = not args.no_tracemalloc
+
+    tmpdir = None
+    if not args.database_url:
+        tmpdir = tempfile.TemporaryDirectory(prefix="musicscope-bench-")
+        args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+
+    charts = SyntheticCharts(args.countries, args.snapshots, args.tracks, args.artists, seed=args.seed)
+    stubs = StubServers(charts, latency_ms=args.latency_ms).start()
+    _configure_env(args, stubs)
+
+    # app modules read their settings at import time, so import only after _configure_env
+    _prepare_database(args.reset)
+    from app.core.database import SessionLocal, engine
+
+    scenarios = {}
+    db = SessionLocal()
+    try:
+        if "lastfm" not in args.skip:
+            scenarios["lastfm_etl"] = bench_lastfm_etl(db, charts, stubs)
+        if "musicbrainz" not in args.skip:
+            scenarios["musicbrainz_etl"] = bench_musicbrainz_etl(db, args.mb_batch)
+        if "analytics" not in args.skip:
+            scenarios.update(bench_analytics(db, charts, args.rounds, args.top_n))
+    finally:
+        db.close()
+        stubs.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dialect": engine.dialect.name,
+            "params": {
+                "countries": args.countries,
+                "snapshots": args.snapshots,
+                "tracks": args.tracks,
+                "artists": len(charts.artists),
+                "seed": args.seed,
+                "latency_ms": args.latency_ms,
+                "rounds": args.rounds,
+                "tracemalloc": TRACE_MEMORY,
+            },
+            "stub_requests": stubs.requests,
+        },
+        "scenarios": scenarios,
+    }
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
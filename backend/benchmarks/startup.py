@@ -0,0 +1,144 @@
+"""
+Startup benchmark: import and boot time of the API, each measured in fresh processes.
+
+    cd backend
+    python -m benchmarks.startup --rounds 10 --output startup.json
+    python -m benchmarks.compare startup-baseline.json startup.json
+
+Scenarios:
+  - import_app   `import app.main` in a new interpreter (interpreter start-up excluded)
+  - boot_to_ready  spawning uvicorn until GET /health answers 200 (lifespan included)
+
+`--importtime N` adds the N slowest modules (cumulative, from `python -X importtime`).
+The report has the same shape as benchmarks.run, so compare.py works on it.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+from benchmarks.run import _free_port, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SNIPPET = (
+    "import time; t0 = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t0)"
+)
+
+
+def _run(args, env):
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    )
+
+
+def bench_import(env, rounds):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        latencies.append(float(_run(["-c", _IMPORT_SNIPPET], env).stdout.strip().splitlines()[-1]))
+    return summarize(latencies, time.perf_counter() - started, rounds, "imports", 0)
+
+
+def _wait_ready(url, proc, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {proc.returncode}: {proc.stderr.read()}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"API not ready after {timeout}s")
+
+
+def bench_boot(env, rounds, timeout):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        port = _free_port()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        try:
+            _wait_ready(f"http://127.0.0.1:{port}/health", proc, timeout)
+            latencies.append(time.perf_counter() - t0)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return summarize(latencies, time.perf_counter() - started, rounds, "boots", 0)
+
+
+def slowest_imports(env, top):
+    """[(module, cumulative ms)] of the `top` slowest imports of app.main."""
+    stderr = _run(["-X", "importtime", "-c", "import app.main"], env).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = (p.strip() for p in line[len("import time:"):].split("|"))
+        rows.append((name, round(int(cumulative_us) / 1000, 2)))
+    return sorted(rows, key=lambda r: -r[1])[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="MusicScope startup benchmark")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--database-url", default=None, help="default: a temporary SQLite file (migrated first)")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for /health per boot")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="report the N slowest imports")
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    tmpdir = None
+    if not args.database_url:
+        tmpdir = tempfile.TemporaryDirectory(prefix="musicscope-startup-")
+        args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'startup.db')}"
+
+    env = dict(os.environ, DATABASE_URL=args.database_url, HTTP_CACHE_PATH="")
+    if tmpdir:
+        _run(["manage.py", "init-db"], env)  # schema work is not part of the measured boot
+
+    _run(["-c", "import app.main"], env)  # compile .pyc once so every round starts alike
+    scenarios = {
+        "import_app": bench_import(env, args.rounds),
+        "boot_to_ready": bench_boot(env, args.rounds, args.timeout),
+    }
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {"rounds": args.rounds, "pool_warmup": os.getenv("DB_POOL_WARMUP", "0")},
+        },
+        "scenarios": scenarios,
+    }
+    if args.importtime:
+        report["slowest_imports_ms"] = slowest_imports(env, args.importtime)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Local stand-ins for the Last.fm and MusicBrainz APIs, served from a SyntheticCharts instance.
+
+    stubs = StubServers(charts, latency_ms=20).start()
+    os.environ["LASTFM_BASE_URL"] = stubs.lastfm_url
+    os.environ["MUSICBRAINZ_BASE_URL"] = stubs.musicbrainz_url
+
+`stubs.snapshot` selects which snapshot geo.getTopTracks returns, so running the Last.fm ETL
+once per snapshot index replays the whole synthetic history.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_SEARCH_NAME = re.compile(r'^artist:"((?:[^"\\]|\\.)*)"$')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stubs = self.server.stubs
+        stubs.count_request()
+        if stubs.latency:
+            time.sleep(stubs.latency)
+
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        charts = stubs.charts
+
+        if url.path.startswith("/lastfm"):
+            if query.get("method") != "geo.getTopTracks":
+                return self._send(200, {"error": 3, "message": "Invalid Method"})
+            page = charts.lastfm_page(
+                query.get("country", ""),
+                stubs.snapshot,
+                page=int(query.get("page", 1)),
+                limit=int(query.get("limit", 50)),
+            )
+            return self._send(200, page)
+
+        if url.path.rstrip("/") == "/musicbrainz/artist" and query.get("query", "").startswith("arid:"):
+            ids = [term.split(":", 1)[1] for term in query["query"].split(" OR ")]
+            return self._send(200, charts.musicbrainz_search_ids(ids))
+
+        if url.path.rstrip("/") == "/musicbrainz/artist":
+            m = _SEARCH_NAME.match(query.get("query", ""))
+            name = m.group(1).replace('\\"', '"').replace("\\\\", "\\") if m else ""
+            return self._send(200, charts.musicbrainz_search(name))
+
+        if url.path.startswith("/musicbrainz/artist/"):
+            artist = charts.musicbrainz_artist(url.path.rsplit("/", 1)[1])
+            if artist is None:
+                return self._send(404, {"error": "Not Found"})
+            return self._send(200, artist)
+
+        return self._send(404, {"error": "unknown stub path"})
+
+
+class StubServers:
+    def __init__(self, charts, latency_ms: float = 0, host: str = "127.0.0.1"):
+        self.charts = charts
+        self.latency = latency_ms / 1000.0
+        self.snapshot = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stubs = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def lastfm_url(self):
+        return f"{self.base_url}/lastfm/2.0/"
+
+    @property
+    def musicbrainz_url(self):
+        return f"{self.base_url}/musicbrainz"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="api-stubs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,177 @@
+"""
+Deterministic synthetic chart data.
+
+`SyntheticCharts(countries=N, snapshots=M, tracks=K)` describes N countries x M snapshots of a
+K-track chart, built from a pool of artists and tracks with a long-tailed (Zipf-like) popularity,
+a home-country bias, a skewed genre distribution and some snapshot-to-snapshot drift, so the
+analytics queries see realistic group sizes instead of uniform noise.
+
+Everything is derived from `seed` (string hashing goes through crc32, not the salted `hash()`),
+so two runs with the same parameters produce byte-identical payloads.
+"""
+import math
+import random
+import uuid
+import zlib
+
+# Last.fm chart country -> ISO code used for artist nationality (home bias)
+COUNTRIES = [
+    ("united states", "US"), ("united kingdom", "GB"), ("spain", "ES"), ("france", "FR"),
+    ("germany", "DE"), ("japan", "JP"), ("brazil", "BR"), ("mexico", "MX"),
+    ("south korea", "KR"), ("italy", "IT"), ("canada", "CA"), ("australia", "AU"),
+    ("sweden", "SE"), ("netherlands", "NL"), ("argentina", "AR"), ("poland", "PL"),
+]
+# nationality weights of the artist pool (US/GB heavy, like the real charts)
+NATIONALITY_WEIGHTS = [30, 14, 6, 6, 6, 7, 4, 3, 5, 3, 4, 3, 3, 2, 2, 2]
+
+GENRES = [
+    "pop", "rock", "hip hop", "electronic", "indie", "r&b", "dance", "alternative", "rap",
+    "latin", "k-pop", "soul", "house", "metal", "folk", "jazz", "reggaeton", "country",
+    "punk", "techno", "j-pop", "trap", "synthpop", "ambient", "blues", "classical",
+]
+
+NAMESPACE = uuid.UUID("6ba7b811-9dad-11d1-80b4-00c04fd430c8")
+
+
+def _zipf_weights(n, s=1.1):
+    return [1.0 / math.pow(i + 1, s) for i in range(n)]
+
+
+def _mbid(kind, i, seed):
+    return str(uuid.uuid5(NAMESPACE, f"{kind}:{seed}:{i}"))
+
+
+class SyntheticCharts:
+    def __init__(self, countries: int = 5, snapshots: int = 4, tracks: int = 100, artists: int = None,
+                 seed: int = 42, mbid_ratio: float = 0.6):
+        if countries > len(COUNTRIES):
+            raise ValueError(f"at most {len(COUNTRIES)} countries")
+        self.seed = seed
+        self.snapshots = snapshots
+        self.tracks_per_chart = tracks
+        self.countries = [name for name, _ in COUNTRIES[:countries]]
+        self._iso = dict(COUNTRIES)
+
+        rng = random.Random(seed)
+        n_artists = artists or max(20, tracks * 2)
+        genre_weights = _zipf_weights(len(GENRES), 1.0)
+
+        self.artists = []
+        for i in range(n_artists):
+            nationality = rng.choices([iso for _, iso in COUNTRIES], NATIONALITY_WEIGHTS)[0]
+            n_tags = rng.choice([1, 2, 2, 3, 3, 4])
+            tags = []
+            while len(tags) < n_tags:
+                g = rng.choices(GENRES, genre_weights)[0]
+                if g not in tags:
+                    tags.append(g)
+            self.artists.append({
+                "name": f"Synth Artist {i:05d}" if i % 7 else f"The Synth Band {i:05d}",
+                "mbid": _mbid("artist", i, seed),
+                "country": nationality,
+                "tags": tags,
+                # Last.fm only reports the artist MBID for part of the catalogue
+                "lastfm_mbid": rng.random() < mbid_ratio,
+            })
+
+        # track pool ~3x the chart size; each track belongs to an artist drawn by popularity
+        # (a flat Zipf: real top-100 charts hold ~50-80 artists, the biggest with a handful of tracks)
+        artist_weights = _zipf_weights(n_artists, 0.6)
+        self.tracks = []
+        for j in range(tracks * 3):
+            a = rng.choices(range(n_artists), artist_weights)[0]
+            self.tracks.append({
+                "title": f"Synthetic Song {j:05d}",
+                "artist": a,
+                "mbid": _mbid("track", j, seed) if rng.random() < mbid_ratio else "",
+                "duration": rng.randint(120, 320),
+                # popularity is already in the artist draw; the weight only spreads tracks apart
+                "weight": rng.lognormvariate(0, 0.5),
+            })
+
+        self.by_name = {a["name"]: a for a in self.artists}
+        self.by_mbid = {a["mbid"]: a for a in self.artists}
+        self._charts = {}
+
+    # ---- charts ----
+
+    def chart(self, country: str, snapshot: int):
+        """Ranked track indices of one (country, snapshot) chart."""
+        key = (country, snapshot)
+        if key not in self._charts:
+            rng = random.Random(zlib.crc32(f"{self.seed}:{country}:{snapshot}".encode()))
+            home = self._iso.get(country)
+            scored = []
+            for j, t in enumerate(self.tracks):
+                bias = 3.0 if self.artists[t["artist"]]["country"] == home else 1.0
+                # drift: each snapshot perturbs the scores, which produces climbers/fallers
+                scored.append((t["weight"] * bias * rng.lognormvariate(0, 0.35), j))
+            scored.sort(reverse=True)
+            chart = [j for _, j in scored[: self.tracks_per_chart]]
+            distinct = len({self.tracks[j]["artist"] for j in chart})
+            assert distinct >= min(len(chart), len(self.artists)) // 3, (
+                f"unrealistic chart: {distinct} artists for {len(chart)} tracks"
+            )
+            self._charts[key] = chart
+        return self._charts[key]
+
+    def lastfm_page(self, country: str, snapshot: int, page: int = 1, limit: int = 50):
+        """geo.getTopTracks response for one page, shaped like the real API."""
+        chart = self.chart(country.lower(), snapshot) if country.lower() in self.countries else []
+        limit = max(1, limit)
+        total_pages = max(1, math.ceil(len(chart) / limit))
+        start = (page - 1) * limit
+        items = []
+        for rank, j in enumerate(chart[start:start + limit], start=start):
+            t = self.tracks[j]
+            a = self.artists[t["artist"]]
+            items.append({
+                "name": t["title"],
+                "duration": str(t["duration"]),
+                "mbid": t["mbid"],
+                "url": f"https://www.last.fm/music/{a['name'].replace(' ', '+')}/_/{t['title'].replace(' ', '+')}",
+                "artist": {
+                    "name": a["name"],
+                    "mbid": a["mbid"] if a["lastfm_mbid"] else "",
+                    "url": f"https://www.last.fm/music/{a['name'].replace(' ', '+')}",
+                },
+                "@attr": {"rank": str(rank)},
+            })
+        return {
+            "tracks": {
+                "track": items,
+                "@attr": {
+                    "country": country,
+                    "page": str(page),
+                    "perPage": str(limit),
+                    "totalPages": str(total_pages),
+                    "total": str(len(chart)),
+                },
+            }
+        }
+
+    # ---- MusicBrainz ----
+
+    def _mb_artist(self, a, score=None):
+        out = {
+            "id": a["mbid"],
+            "name": a["name"],
+            "country": a["country"],
+            "tags": [{"count": 10 - i, "name": g} for i, g in enumerate(a["tags"])],
+        }
+        if score is not None:
+            out["score"] = score
+        return out
+
+    def musicbrainz_search(self, name: str):
+        a = self.by_name.get(name)
+        return {"artists": [self._mb_artist(a, score=100)] if a else []}
+
+    def musicbrainz_search_ids(self, mbids):
+        """Batched `arid:a OR arid:b` search."""
+        found = [self.by_mbid[m] for m in mbids if m in self.by_mbid]
+        return {"artists": [self._mb_artist(a, score=100) for a in found]}
+
+    def musicbrainz_artist(self, mbid: str):
+        a = self.by_mbid.get(mbid)
+        return self._mb_artist(a) if a else None
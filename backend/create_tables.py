@@ -1,10 +1,90 @@
-from app.core.database import Base, engine
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import Base, get_engine
 from app.models import *  # noqa: F401,F403
 
+
+# columns removed from the models, with the indexes covering them: dropped by init_db
+RETIRED_COLUMNS = {
+    ("snapshots", "status"): ("ix_snapshots_country_status_fetched_at",),
+}
+
+
+def _drop_retired_columns(engine, insp):
+    for (table, column), indexes in RETIRED_COLUMNS.items():
+        if not insp.has_table(table) or column not in {c["name"] for c in insp.get_columns(table)}:
+            continue
+        existing = {i["name"] for i in insp.get_indexes(table)}
+        with engine.begin() as conn:
+            for index in indexes:
+                if index in existing:
+                    conn.execute(text(f"DROP INDEX {index}"))
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        print(f"  - column {table}.{column}")
+
+
+def _upgrade_existing_tables():
+    """
+    create_all() never touches tables that already exist, so add any model columns
+    and indexes that are missing from them (nullable columns only, no data changes),
+    rebuild indexes whose uniqueness differs from the model and drop RETIRED_COLUMNS.
+    """
+    engine = get_engine()
+    insp = inspect(engine)
+    _drop_retired_columns(engine, insp)
+    insp = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            col_type = col.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+            print(f"  + column {table.name}.{col.name}")
+
+        # an index whose uniqueness changed in the model (e.g. artists.name) is rebuilt
+        unique_of = {i["name"]: bool(i.get("unique")) for i in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in unique_of and unique_of[index.name] != bool(index.unique):
+                index.drop(bind=engine)
+                print(f"  ~ rebuilt index {index.name} (unique={bool(index.unique)})")
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except IntegrityError as e:
+                # e.g. a unique index over rows that still need a dedupe command
+                print(f"  ! skipped index {index.name}: {e.orig}")
+
+
 def init_db():
     print("Creating tables...")
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+    _upgrade_existing_tables()
     print("Done.")
 
+
+def verify_schema():
+    """Tables, columns and indexes of the models missing from the database, retired columns still there (read-only)."""
+    insp = inspect(get_engine())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            missing.append(f"table {table.name}")
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        missing += [f"column {table.name}.{c.name}" for c in table.columns if c.name not in existing]
+        indexes = {i["name"] for i in insp.get_indexes(table.name)}
+        missing += [f"index {i.name}" for i in table.indexes if i.name not in indexes]
+    # a retired column left in place (NOT NULL, no default) breaks the inserts
+    missing += [
+        f"drop column {t}.{c}" for t, c in RETIRED_COLUMNS
+        if insp.has_table(t) and c in {col["name"] for col in insp.get_columns(t)}
+    ]
+    return missing
+
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
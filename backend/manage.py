@@ -0,0 +1,309 @@
+"""
+Maintenance commands.
+
+    python manage.py init-db
+    python manage.py check-db
+    python manage.py dedupe-tracks
+    python manage.py merge-artists [--dry-run]
+    python manage.py lastfm-batch spain france "united states" --limit 100
+    python manage.py rebuild-aggregates [--country spain]
+    python manage.py migrate-genres
+    python manage.py backfill-snapshots
+    python manage.py lowercase-countries
+    python manage.py export-trends --format csv --country spain --output spain.csv
+    python manage.py retention [--dry-run]
+    python manage.py partition-trends
+    python manage.py replay --archive-dir ./payload_archive [--source lastfm] [--start 2024-01-01]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from app.core.database import SessionLocal
+
+
+def cmd_init_db(args):
+    from create_tables import init_db
+
+    init_db()
+
+
+def cmd_check_db(args):
+    from create_tables import verify_schema
+
+    missing = verify_schema()
+    print(json.dumps({"ok": not missing, "missing": missing}, indent=2))
+    if missing:
+        raise SystemExit(1)
+
+
+def cmd_dedupe_tracks(args):
+    from create_tables import init_db
+    from app.services.track_dedupe import dedupe_tracks
+
+    init_db()  # make sure tracks.natural_key exists
+    db = SessionLocal()
+    try:
+        print(json.dumps(dedupe_tracks(db, batch_size=args.batch_size), indent=2))
+    finally:
+        db.close()
+
+
+def cmd_merge_artists(args):
+    from create_tables import init_db
+    from app.services.artist_resolver import backfill_name_keys, merge_duplicate_artists
+    from app.services.track_dedupe import dedupe_tracks
+
+    if not args.dry_run:
+        init_db()  # make sure artist_aliases exists
+    db = SessionLocal()
+    try:
+        result = merge_duplicate_artists(db, dry_run=args.dry_run)
+        if not args.dry_run and result["artists_merged"]:
+            # tracks of merged artists may now share a natural key
+            result.update(dedupe_tracks(db, batch_size=args.batch_size))
+        if not args.dry_run:
+            # after the merge: artists without MBID are unique per key
+            result["name_keys_backfilled"] = backfill_name_keys(db, batch_size=args.batch_size)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    finally:
+        db.close()
+
+
+def cmd_lastfm_batch(args):
+    from app.services.etl_lastfm import run_lastfm_etl_batch
+
+    db = SessionLocal()
+    try:
+        result = run_lastfm_etl_batch(db, args.countries, args.limit, args.concurrency, run_key=args.run_key)
+        print(json.dumps(result, indent=2))
+    finally:
+        db.close()
+
+
+def cmd_rebuild_aggregates(args):
+    from app.services.snapshot_aggregates import rebuild_all_aggregates
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(rebuild_all_aggregates(db, country=args.country, missing_only=args.missing_only), indent=2))
+    finally:
+        db.close()
+
+
+def cmd_migrate_genres(args):
+    from create_tables import init_db
+    from app.services.genres import migrate_genres_from_csv
+    from app.services.snapshot_aggregates import rebuild_all_aggregates
+
+    init_db()  # make sure genres/artist_genres exist
+    db = SessionLocal()
+    try:
+        result = migrate_genres_from_csv(db, batch_size=args.batch_size)
+        if not args.skip_rebuild:
+            result.update(rebuild_all_aggregates(db))
+        print(json.dumps(result, indent=2))
+    finally:
+        db.close()
+
+
+def cmd_backfill_snapshots(args):
+    from create_tables import init_db
+    from app.services.snapshot_aggregates import rebuild_all_aggregates
+    from app.services.snapshots import backfill_snapshot_catalog
+
+    init_db()  # make sure the snapshots table and the composite indexes exist
+    db = SessionLocal()
+    try:
+        result = backfill_snapshot_catalog(db)
+        # the analytics endpoints only read aggregates: build those older snapshots lack
+        result.update(rebuild_all_aggregates(db, missing_only=True))
+        print(json.dumps(result, indent=2))
+    finally:
+        db.close()
+
+
+def cmd_lowercase_countries(args):
+    from app.services.snapshots import lowercase_countries
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(lowercase_countries(db), indent=2))
+    finally:
+        db.close()
+
+
+def cmd_export_trends(args):
+    from app.services import export_trends
+
+    filters = {"country": args.country, "start": args.start, "end": args.end, "chunk_size": args.chunk_size}
+    db = SessionLocal()
+    try:
+        if args.format == "parquet":
+            if not args.output:
+                raise SystemExit("--output is required for parquet")
+            try:
+                rows = export_trends.write_parquet(db, args.output, **filters)
+            except RuntimeError as e:
+                raise SystemExit(str(e))
+            print(json.dumps({"output": args.output, "rows": rows}, indent=2))
+            return
+
+        iter_chunks = export_trends.iter_csv if args.format == "csv" else export_trends.iter_ndjson
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in iter_chunks(db, **filters):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    finally:
+        db.close()
+
+
+def cmd_retention(args):
+    from create_tables import init_db
+    from app.services.retention import run_retention
+
+    if not args.dry_run:
+        init_db()  # make sure track_trend_rollups exists
+    db = SessionLocal()
+    try:
+        print(json.dumps(run_retention(
+            db,
+            dry_run=args.dry_run,
+            full_days=args.full_days,
+            daily_days=args.daily_days,
+            max_days=args.max_days,
+            batch_size=args.batch_size,
+            pause_ms=args.pause_ms,
+        ), indent=2))
+    finally:
+        db.close()
+
+
+def cmd_partition_trends(args):
+    from app.services.retention import partition_track_trends
+
+    db = SessionLocal()
+    try:
+        try:
+            result = partition_track_trends(db, months_ahead=args.months_ahead)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        print(json.dumps(result, indent=2))
+    finally:
+        db.close()
+
+
+def cmd_replay(args):
+    from create_tables import init_db
+    from app.services.replay import replay_lastfm, replay_musicbrainz
+
+    root = args.archive_dir or os.getenv("PAYLOAD_ARCHIVE_DIR", "")
+    if not root or not os.path.isdir(root):
+        raise SystemExit("--archive-dir (or PAYLOAD_ARCHIVE_DIR) must point at a payload archive")
+    countries = [c for value in args.countries or [] for c in value.split(",") if c.strip()] or None
+
+    init_db()
+    db = SessionLocal()
+    try:
+        result = {}
+        if args.source in ("lastfm", "all"):
+            result["lastfm"] = replay_lastfm(
+                db, root, countries=countries, start=args.start, end=args.end,
+                period=args.period, workers=args.workers,
+            )
+        if args.source in ("musicbrainz", "all"):
+            result["musicbrainz"] = replay_musicbrainz(
+                db, root, start=args.start, end=args.end, workers=args.workers, batch_size=args.batch_size,
+            )
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="manage.py", description="MusicScope maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init-db", help="create missing tables, columns and indexes")
+    p.set_defaults(func=cmd_init_db)
+
+    p = sub.add_parser("check-db", help="list missing tables/columns/indexes (exit 1 if any)")
+    p.set_defaults(func=cmd_check_db)
+
+    p = sub.add_parser("dedupe-tracks", help="merge duplicate tracks and repoint track_trends")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=cmd_dedupe_tracks)
+
+    p = sub.add_parser("merge-artists", help="merge artists whose names normalize to the same key, fill artists.name_key")
+    p.add_argument("--dry-run", action="store_true", help="only list the duplicate groups")
+    p.add_argument("--batch-size", type=int, default=1000, help="batch size of the track dedupe")
+    p.set_defaults(func=cmd_merge_artists)
+
+    p = sub.add_parser("lastfm-batch", help="fetch and ingest several countries concurrently")
+    p.add_argument("countries", nargs="+")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--concurrency", type=int, default=None)
+    p.add_argument("--run-key", default=None, help="run_key of a half-failed run to retry (replaces its snapshots)")
+    p.set_defaults(func=cmd_lastfm_batch)
+
+    p = sub.add_parser("rebuild-aggregates", help="backfill the per-snapshot analytics aggregate tables")
+    p.add_argument("--country", default=None)
+    p.add_argument("--missing-only", action="store_true", help="only snapshots without aggregate rows")
+    p.set_defaults(func=cmd_rebuild_aggregates)
+
+    p = sub.add_parser("migrate-genres", help="move artists.genres CSV into genres/artist_genres")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.add_argument("--skip-rebuild", action="store_true", help="do not rebuild snapshot aggregates afterwards")
+    p.set_defaults(func=cmd_migrate_genres)
+
+    p = sub.add_parser("backfill-snapshots", help="fill the snapshots catalog from existing track_trends")
+    p.set_defaults(func=cmd_backfill_snapshots)
+
+    p = sub.add_parser("lowercase-countries", help="move snapshots stored under a mixed-case country to the lowercased name")
+    p.set_defaults(func=cmd_lowercase_countries)
+
+    p = sub.add_parser("export-trends", help="stream the chart history to CSV, NDJSON or Parquet")
+    p.add_argument("--format", choices=["ndjson", "csv", "parquet"], default="ndjson")
+    p.add_argument("--output", default=None, help="file path (default: stdout; required for parquet)")
+    p.add_argument("--country", default=None)
+    p.add_argument("--start", type=datetime.fromisoformat, default=None)
+    p.add_argument("--end", type=datetime.fromisoformat, default=None)
+    p.add_argument("--chunk-size", type=int, default=5000)
+    p.set_defaults(func=cmd_export_trends)
+
+    p = sub.add_parser("retention", help="downsample and delete old track_trends history")
+    p.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    p.add_argument("--full-days", type=int, default=None, help="keep every snapshot this recent")
+    p.add_argument("--daily-days", type=int, default=None, help="keep one snapshot per day up to this age")
+    p.add_argument("--max-days", type=int, default=None, help="delete everything older (0 = never)")
+    p.add_argument("--batch-size", type=int, default=None, help="track_trends rows per delete transaction")
+    p.add_argument("--pause-ms", type=int, default=None, help="sleep between delete batches")
+    p.set_defaults(func=cmd_retention)
+
+    p = sub.add_parser("partition-trends", help="range-partition track_trends by month (PostgreSQL)")
+    p.add_argument("--months-ahead", type=int, default=None)
+    p.set_defaults(func=cmd_partition_trends)
+
+    p = sub.add_parser("replay", help="re-ingest archived Last.fm/MusicBrainz payloads without calling the APIs")
+    p.add_argument("--archive-dir", default=None, help="default: PAYLOAD_ARCHIVE_DIR")
+    p.add_argument("--source", choices=["lastfm", "musicbrainz", "all"], default="all")
+    p.add_argument("--countries", nargs="*", default=None, help="Last.fm countries to replay (default: all)")
+    p.add_argument("--start", type=datetime.fromisoformat, default=None)
+    p.add_argument("--end", type=datetime.fromisoformat, default=None)
+    p.add_argument("--period", choices=["hour", "day", "week", "run"], default=None,
+                   help="snapshot key period (default: LASTFM_SNAPSHOT_PERIOD)")
+    p.add_argument("--workers", type=int, default=None, help="parsing processes (default: CPU count)")
+    p.add_argument("--batch-size", type=int, default=200, help="artists per MusicBrainz ETL run")
+    p.set_defaults(func=cmd_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
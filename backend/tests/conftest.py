@@ -0,0 +1,37 @@
+"""
+Test setup: a throwaway SQLite database (created once with init_db), no response cache,
+no payload archive. The `db` fixture empties every table after each test.
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="musicscope-tests-")
+# set before anything imports app.core.config (settings are read once)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["HTTP_CACHE_PATH"] = ""
+os.environ["PAYLOAD_ARCHIVE_DIR"] = ""
+os.environ["LASTFM_SNAPSHOT_PERIOD"] = "run"
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def _schema():
+    from create_tables import init_db
+
+    init_db()
+
+
+@pytest.fixture
+def db(_schema):
+    from app.core.database import Base, SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
@@ -0,0 +1,59 @@
+from app.services.analytics_cache import ALL_COUNTRIES, AnalyticsCache
+
+
+def test_invalidation_drops_the_countries_and_all_country_entries():
+    cache = AnalyticsCache(max_entries=10, ttl=60)
+    cache.put("es", b"1", None, ["ES"])
+    cache.put("fr", b"2", None, ["fr"])
+    cache.put("all", b"3", None, [ALL_COUNTRIES])
+    assert cache.invalidate_countries(["es"]) == 2
+    assert cache.get("es") is None and cache.get("all") is None
+    assert cache.get("fr")[0] == b"2"
+
+
+def test_entry_computed_across_an_invalidation_is_not_stored():
+    cache = AnalyticsCache(max_entries=10, ttl=60)
+    started = cache.generation
+    cache.invalidate_countries(["es"])  # an ETL commit while the result was computed
+    entry = cache.put("es", b"stale", None, ["es"], started)
+    assert entry[0] == b"stale"  # still served to the request that computed it
+    assert cache.get("es") is None
+    assert cache.stats()["stale_skips"] == 1
+
+    cache.put("es", b"fresh", None, ["es"], cache.generation)
+    assert cache.get("es")[0] == b"fresh"
+
+
+def test_lru_eviction_and_ttl():
+    cache = AnalyticsCache(max_entries=2, ttl=60)
+    cache.put("a", b"a", None, [])
+    cache.put("b", b"b", None, [])
+    cache.get("a")
+    cache.put("c", b"c", None, [])
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+    expired = AnalyticsCache(max_entries=2, ttl=-1)
+    expired.put("a", b"a", None, [])
+    assert expired.get("a") is None
+
+
+def test_memo_lookups_have_their_own_counters():
+    cache = AnalyticsCache(max_entries=10, ttl=60)
+    cache.put("memo", b"m", None, [])
+    cache.get("memo", memo=True)
+    cache.get("other", memo=True)
+    cache.get("memo")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["memo_hits"], stats["memo_misses"]) == (1, 0, 1, 1)
+    assert stats["hit_ratio"] == 1.0 and stats["memo_hit_ratio"] == 0.5
+
+
+def test_keys_do_not_collide_on_separators():
+    from types import SimpleNamespace
+
+    from app.services.analytics_cache import _key
+
+    request = SimpleNamespace(url=SimpleNamespace(path="/analytics/x"))
+    assert _key(request, {"c1": "a&c2=b", "c2": ""}) != _key(request, {"c1": "a", "c2": "b&c2="})
+    assert _key(request, {"b": 1, "a": 2}) == _key(request, {"a": 2, "b": 1})
@@ -0,0 +1,69 @@
+from collections import Counter
+
+from app.services.artist_resolver import ArtistResolver, normalize_artist_name
+
+
+def test_normalize_folds_spelling_variants():
+    assert normalize_artist_name("Beyoncé") == normalize_artist_name("beyonce") == "beyonce"
+    assert normalize_artist_name("The Weeknd") == normalize_artist_name("weeknd") == "weeknd"
+    assert normalize_artist_name("Drake feat. Future") == "drake"
+    assert normalize_artist_name("Drake (featuring Future)") == "drake"
+    assert normalize_artist_name("  AC/DC ") == "ac dc"
+
+
+def test_normalize_keeps_meaningful_words():
+    assert normalize_artist_name("A Boogie") == "a boogie"
+    assert normalize_artist_name("The The") == "the"
+    assert normalize_artist_name("!!!") == "!!!"
+    assert normalize_artist_name("") == ""
+
+
+def _plan(resolver, pairs):
+    return resolver.resolve_chart(Counter(pairs))
+
+
+def test_same_name_different_mbids_are_two_new_artists():
+    plan = _plan(ArtistResolver(), [("Nirvana", "mbid-a"), ("Nirvana", "mbid-b")])
+    assert [(a["name"], a["mbid"]) for a in plan["new"]] == [("Nirvana", "mbid-a"), ("Nirvana", "mbid-b")]
+    assert plan["matched"] == {}
+
+
+def test_known_mbid_wins_over_name_and_records_alias():
+    resolver = ArtistResolver()
+    resolver.add(1, "Beyoncé", "bey")
+    resolver.add(2, "Other", None)
+    plan = _plan(resolver, [("Beyonce Knowles", "bey")])
+    assert plan["matched"] == {("Beyonce Knowles", "bey"): 1}
+    assert plan["aliases"] == [("Beyonce Knowles", 1)]
+
+
+def test_unheld_mbid_goes_to_the_first_artist_reporting_it():
+    resolver = ArtistResolver()
+    resolver.add(1, "Bush", None)
+    plan = _plan(resolver, [("Bush", "b1"), ("Bush", "b2"), ("BUSH", "b1")])
+    # the stored artist claims the first MBID; the second one is another band
+    assert plan["claims"] == {1: "b1"}
+    assert plan["matched"] == {("Bush", "b1"): 1, ("BUSH", "b1"): 1}
+    assert [(a["name"], a["mbid"]) for a in plan["new"]] == [("Bush", "b2")]
+
+
+def test_name_match_rejected_when_mbids_differ():
+    resolver = ArtistResolver()
+    resolver.add(1, "Nirvana", "mbid-a")
+    plan = _plan(resolver, [("Nirvana", "mbid-b"), ("Nirvana", None)])
+    assert plan["matched"] == {("Nirvana", None): 1}
+    assert [(a["name"], a["mbid"]) for a in plan["new"]] == [("Nirvana", "mbid-b")]
+
+
+def test_spelling_without_mbid_joins_the_only_new_artist_of_its_key():
+    plan = _plan(ArtistResolver(), [("beyonce", None), ("Beyoncé", "bey"), ("Beyoncé", "bey")])
+    assert len(plan["new"]) == 1
+    artist = plan["new"][0]
+    assert artist["mbid"] == "bey"
+    assert sorted(artist["members"]) == [("Beyoncé", "bey"), ("beyonce", None)]
+
+
+def test_new_artist_is_named_after_its_most_frequent_spelling():
+    occurrences = Counter({("beyonce", None): 1, ("Beyoncé", None): 3})
+    plan = ArtistResolver().resolve_chart(occurrences)
+    assert [a["name"] for a in plan["new"]] == ["Beyoncé"]
@@ -0,0 +1,36 @@
+import asyncio
+
+from app.services.events import EventHub
+
+
+def _replay(hub, last_event_id):
+    async def run():
+        sub = hub.subscribe(last_event_id=last_event_id)
+        events = []
+        while not sub.queue.empty():
+            event = await sub.get()
+            events.append((event["id"], event["type"]))
+        sub.close()
+        return events
+    return asyncio.run(run())
+
+
+def _hub(published=5, history_size=3):
+    hub = EventHub(history_size=history_size)
+    for _ in range(published):
+        hub.publish("snapshot", {"country": "spain"})
+    return hub
+
+
+def test_reconnect_replays_missed_events():
+    assert _replay(_hub(), 3) == [(4, "snapshot"), (5, "snapshot")]
+    assert _replay(_hub(), 5) == []
+
+
+def test_expired_events_ask_for_a_resync():
+    assert _replay(_hub(), 1) == [(2, "resync"), (3, "snapshot"), (4, "snapshot"), (5, "snapshot")]
+
+
+def test_ids_from_a_previous_process_ask_for_a_resync():
+    assert _replay(_hub(), 40) == [(5, "resync")]
+    assert _replay(_hub(published=0), 40) == [(0, "resync")]
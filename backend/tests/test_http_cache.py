@@ -0,0 +1,19 @@
+from app.services import http_client
+from app.services.http_client import ResponseCache
+
+
+def test_shared_cache_is_off_unless_configured(monkeypatch, tmp_path):
+    monkeypatch.delenv("HTTP_CACHE_PATH", raising=False)
+    monkeypatch.setattr(http_client, "_shared_cache", None)
+    assert http_client.get_shared_cache() is None
+
+    path = tmp_path / "data" / "http_cache.sqlite"
+    monkeypatch.setenv("HTTP_CACHE_PATH", str(path))
+    assert http_client.get_shared_cache().path == str(path) and path.exists()
+
+
+def test_response_cache_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"))
+    cache.put("k", "GET /x", b'{"a": 1}', ttl=60, etag='"e"')
+    entry = cache.get("k")
+    assert (entry["body"], entry["etag"]) == (b'{"a": 1}', '"e"')
@@ -0,0 +1,61 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import EtlLog
+from app.services import jobs
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Jobs stay queued: nothing is handed to the worker pool."""
+    monkeypatch.setattr(jobs._executor, "submit", lambda *args: None)
+    monkeypatch.setattr(jobs, "start_heartbeat", lambda: None)
+
+
+def _lastfm(db, countries, limit=50, **extra):
+    return jobs.enqueue_job(db, jobs.LASTFM_JOB, {"countries": countries, "limit": limit, **extra})
+
+
+def test_countries_covered_by_an_active_job_are_left_out(db, queued):
+    first, created, covered = _lastfm(db, ["gb", "us"])
+    assert created and covered == {}
+
+    same, created, covered = _lastfm(db, ["us"], max_concurrency=4)  # tuning params do not matter
+    assert not created and same.id == first.id and covered == {"us": first.id}
+
+    partial, created, covered = _lastfm(db, ["fr", "us"])
+    assert created and covered == {"us": first.id}
+    assert json.loads(partial.params)["countries"] == ["fr"] and partial.country == "fr"
+
+
+def test_different_params_are_a_different_job(db, queued):
+    first, _, _ = _lastfm(db, ["us"], limit=50)
+    other, created, covered = _lastfm(db, ["us"], limit=10)
+    assert created and other.id != first.id and covered == {}
+
+
+def test_lastfm_jobs_get_a_run_key(db, queued):
+    job, _, _ = _lastfm(db, ["us"])
+    assert json.loads(job.params)["run_key"].startswith("run-")
+
+
+def test_recovery_only_fails_jobs_of_dead_workers(db, queued):
+    now = datetime.utcnow()
+    live = EtlLog(etl_type=jobs.LASTFM_JOB, status="running", worker="other:1", heartbeat_at=now,
+                  params="{}", created_at=now)
+    stale = EtlLog(etl_type=jobs.LASTFM_JOB, status="running", worker="other:2",
+                   heartbeat_at=now - jobs.STALE_AFTER - timedelta(seconds=1), params="{}", created_at=now)
+    db.add_all([live, stale])
+    db.commit()
+    own, _, _ = _lastfm(db, ["us"])
+
+    assert jobs.recover_interrupted_jobs(startup=False) == 1
+    db.expire_all()
+    assert (live.status, stale.status, own.status) == ("running", "failed", "queued")
+
+    # at startup, this host:pid's jobs belong to a previous process
+    assert jobs.recover_interrupted_jobs() == 1
+    db.expire_all()
+    assert (live.status, own.status) == ("running", "failed")
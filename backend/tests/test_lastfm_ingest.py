@@ -0,0 +1,61 @@
+"""SQLite round-trip of one Last.fm chart through ingest_lastfm_items."""
+from datetime import datetime
+
+from app.models import Artist, Snapshot, SnapshotArtistCount, Track, TrackTrend
+from app.services.etl_lastfm import ingest_lastfm_items, normalize_countries
+
+
+def item(artist, title, rank, artist_mbid="", mbid=""):
+    return {"name": title, "mbid": mbid, "url": f"https://last.fm/{title}",
+            "artist": {"name": artist, "mbid": artist_mbid}, "@attr": {"rank": str(rank)}}
+
+
+CHART = [
+    item("Beyoncé", "Halo", 1, "bey"),
+    item("Beyonce", "Crazy in Love", 2),
+    item("Nirvana", "Lithium", 3, "nirvana-us"),
+    item("Nirvana", "Sitting on a Cloud", 4, "nirvana-uk"),
+    item("Drake", "Hotline Bling", 5),
+    {"name": "broken"},  # malformed entries are skipped
+]
+
+
+def test_chart_round_trip(db):
+    t = datetime(2024, 5, 1, 12)
+    result = ingest_lastfm_items(db, "spain", CHART, snapshot_key="run-1", fetched_at=t)
+    assert result["trends"] == 5 and result["new_tracks"] == 5 and result["new_artists"] == 4
+
+    artists = {(a.name, a.musicbrainz_id) for a in db.query(Artist)}
+    # display names are never altered; the two bands called Nirvana stay apart
+    assert artists == {("Beyoncé", "bey"), ("Nirvana", "nirvana-us"), ("Nirvana", "nirvana-uk"), ("Drake", None)}
+
+    ranks = dict(db.query(Track.title, TrackTrend.rank).join(TrackTrend, TrackTrend.track_id == Track.id))
+    assert ranks == {"Halo": 1, "Crazy in Love": 2, "Lithium": 3, "Sitting on a Cloud": 4, "Hotline Bling": 5}
+
+    snapshot = db.query(Snapshot).one()
+    assert (snapshot.country, snapshot.fetched_at, snapshot.row_count, snapshot.snapshot_key) == ("spain", t, 5, "run-1")
+    counts = {a: n for a, n in db.query(SnapshotArtistCount.artist_id, SnapshotArtistCount.track_count)}
+    assert sorted(counts.values()) == [1, 1, 1, 2]
+
+
+def test_rerun_with_the_same_key_replaces_the_snapshot(db):
+    first, retry = datetime(2024, 5, 1, 12), datetime(2024, 5, 1, 12, 5)
+    ingest_lastfm_items(db, "spain", CHART, snapshot_key="run-1", fetched_at=first)
+    result = ingest_lastfm_items(db, "spain", CHART[:2], snapshot_key="run-1", fetched_at=retry)
+
+    assert result["replaced"] == [first.isoformat()]
+    assert [s.fetched_at for s in db.query(Snapshot)] == [retry]
+    assert db.query(TrackTrend).count() == 2
+    assert {t for (t,) in db.query(SnapshotArtistCount.fetched_at).distinct()} == {retry}
+    assert result["new_artists"] == 0 and result["new_tracks"] == 0
+
+
+def test_another_run_adds_a_snapshot(db):
+    ingest_lastfm_items(db, "spain", CHART, snapshot_key="run-1", fetched_at=datetime(2024, 5, 1))
+    ingest_lastfm_items(db, "spain", CHART, snapshot_key="run-2", fetched_at=datetime(2024, 5, 2))
+    assert db.query(Snapshot).count() == 2
+    assert db.query(Track).count() == 5  # tracks are deduplicated on their natural key
+
+
+def test_normalize_countries():
+    assert normalize_countries(["Spain, FRANCE", " spain", "", None]) == ["spain", "france"]
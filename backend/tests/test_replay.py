@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from app.services.payload_archive import PayloadArchive
+from app.services.replay import iter_lastfm_charts
+
+T0 = datetime(2024, 5, 1, 12)
+
+
+def _page(archive, country, page, titles, fetched_at):
+    params = {"method": "geo.getTopTracks", "country": country, "page": page, "limit": 2}
+    body = {"tracks": {"track": [
+        {"name": t, "artist": {"name": "A", "mbid": ""}, "@attr": {"rank": str(i)}} for i, t in enumerate(titles, 1)
+    ]}}
+    archive.write("lastfm", "https://ws/2.0/", params, f"{country}-{page}-{fetched_at}", body, fetched_at)
+
+
+def test_pages_are_regrouped_into_charts(tmp_path):
+    archive = PayloadArchive(str(tmp_path))
+    _page(archive, "spain", 1, ["s1", "s2"], T0)
+    _page(archive, "france", 1, ["f1"], T0)  # another country in between
+    _page(archive, "spain", 2, ["s3"], T0)
+    _page(archive, "spain", 5, ["orphan"], T0 + timedelta(hours=1))  # page 4 was never archived
+    _page(archive, "spain", 1, ["s4"], T0 + timedelta(hours=2))
+    archive.close()
+
+    stats = {}
+    charts = list(iter_lastfm_charts(str(tmp_path), workers=1, stats=stats))
+    got = sorted((c, t, [i["name"] for i in items]) for c, t, items in charts)
+    assert got == [
+        ("france", T0, ["f1"]),
+        ("spain", T0, ["s1", "s2", "s3"]),
+        ("spain", T0 + timedelta(hours=2), ["s4"]),
+    ]
+    assert stats["pages"] == 5 and stats["orphan_pages"] == 1
+
+
+def test_country_and_time_filters(tmp_path):
+    archive = PayloadArchive(str(tmp_path))
+    _page(archive, "spain", 1, ["s1"], T0)
+    _page(archive, "france", 1, ["f1"], T0)
+    _page(archive, "spain", 1, ["s2"], T0 + timedelta(days=2))
+    archive.close()
+
+    charts = list(iter_lastfm_charts(str(tmp_path), countries=["Spain"], end=T0 + timedelta(days=1), workers=1))
+    assert [(c, t) for c, t, _ in charts] == [("spain", T0)]
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from app.services.retention import _batches, plan_retention
+
+NOW = datetime(2024, 6, 30, 12, 0)
+
+
+def _snap(country, days_ago, hour=0, rows=10):
+    return (country, NOW - timedelta(days=days_ago, hours=hour), rows)
+
+
+def test_recent_snapshots_are_all_kept():
+    snaps = [_snap("es", 1), _snap("es", 1, hour=3), _snap("es", 2)]
+    keep, drop, expire = plan_retention(snaps, NOW, full_days=14, daily_days=90, max_days=0)
+    assert sorted(keep) == sorted(snaps) and drop == [] and expire == []
+
+
+def test_daily_window_keeps_the_last_snapshot_of_each_day():
+    morning, evening = _snap("es", 20, hour=10), _snap("es", 20, hour=2)
+    other_country = _snap("fr", 20, hour=10)
+    keep, drop, _ = plan_retention([morning, evening, other_country], NOW, 14, 90, 0)
+    assert drop == [morning]
+    assert sorted(keep) == sorted([evening, other_country])
+
+
+def test_older_history_keeps_one_snapshot_per_iso_week():
+    week = [("es", datetime(2024, 1, d, 12), 10) for d in (8, 9, 10)]  # Mon-Wed of one ISO week
+    keep, drop, _ = plan_retention(week, NOW, 14, 90, 0)
+    assert keep == [week[-1]]
+    assert sorted(drop) == sorted(week[:-1])
+
+
+def test_max_days_expires_the_oldest_history():
+    old, kept = _snap("es", 400), _snap("es", 3)
+    keep, drop, expire = plan_retention([old, kept], NOW, 14, 90, 365)
+    assert expire == [old] and keep == [kept] and drop == []
+
+
+def test_batches_split_per_country_by_row_count():
+    t = [datetime(2024, 1, d) for d in range(1, 5)]
+    snaps = [("fr", t[0], 3), ("es", t[1], 4), ("es", t[0], 4), ("es", t[2], 4)]
+    assert list(_batches(snaps, batch_size=8)) == [("es", [t[0], t[1]]), ("es", [t[2]]), ("fr", [t[0]])]
+
+
+def test_a_snapshot_larger_than_the_batch_is_its_own_batch():
+    t = datetime(2024, 1, 1)
+    assert list(_batches([("es", t, 50)], batch_size=10)) == [("es", [t])]
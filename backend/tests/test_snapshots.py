@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from app.services import snapshots
+from app.services.snapshots import new_run_key, run_snapshot_key, snapshot_key_for
+
+T = datetime(2024, 12, 30, 17, 45)
+
+
+def test_period_keys():
+    assert snapshot_key_for(T, "hour") == "2024-12-30T17"
+    assert snapshot_key_for(T, "day") == "2024-12-30"
+    assert snapshot_key_for(T, "week") == "2025-W01"  # ISO week of Monday 2024-12-30
+    assert snapshot_key_for(T, "run") is None
+
+
+def test_run_keys_are_unique_and_reused_on_retry(monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_PERIOD", "run")
+    assert new_run_key() != new_run_key()
+    assert run_snapshot_key(T, "run-abc") == "run-abc"
+    assert run_snapshot_key(T).startswith("run-")
+
+
+def test_period_key_wins_over_run_key(monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_PERIOD", "day")
+    assert run_snapshot_key(T, "run-abc") == "2024-12-30"
+
+
+def test_lowercase_countries_moves_whole_snapshots(db):
+    from app.models import Snapshot, SnapshotArtistCount, TrackTrend
+    from app.services.etl_lastfm import ingest_lastfm_items
+
+    chart = [{"name": "Halo", "artist": {"name": "Beyoncé"}, "@attr": {"rank": "1"}}]
+    t1, t2 = datetime(2024, 5, 1), datetime(2024, 5, 2)
+    ingest_lastfm_items(db, "spain", chart, snapshot_key="run-1", fetched_at=t1)
+    # written before the ETL lowercased countries: rename behind its back
+    for model in (TrackTrend, SnapshotArtistCount, Snapshot):
+        db.query(model).update({"country": "Spain"})
+    ingest_lastfm_items(db, "spain", chart, snapshot_key="run-2", fetched_at=t2)
+    ingest_lastfm_items(db, "spain", chart, snapshot_key="run-3", fetched_at=datetime(2024, 5, 3))
+    db.query(Snapshot).filter(Snapshot.fetched_at == t2).update({"country": "SPAIN"})  # catalog only
+    db.query(TrackTrend).filter(TrackTrend.fetched_at == t2).update({"country": "SPAIN"})
+    db.commit()
+
+    result = snapshots.lowercase_countries(db)
+    assert result["snapshots_moved"] == 2 and result["snapshot_conflicts"] == []
+    for model in (TrackTrend, SnapshotArtistCount, Snapshot):
+        assert {c for (c,) in db.query(model.country).distinct()} == {"spain"}
+    assert snapshots.lowercase_countries(db)["snapshots_moved"] == 0
+
+
+def test_lowercase_countries_keeps_conflicting_snapshots(db):
+    from app.models import Snapshot
+    from app.services.etl_lastfm import ingest_lastfm_items
+
+    chart = [{"name": "Halo", "artist": {"name": "Beyoncé"}, "@attr": {"rank": "1"}}]
+    ingest_lastfm_items(db, "spain", chart, snapshot_key="run-1", fetched_at=T)
+    ingest_lastfm_items(db, "france", chart, snapshot_key="run-2", fetched_at=T)
+    db.query(Snapshot).filter(Snapshot.country == "france").update({"country": "Spain", "snapshot_key": "run-9"})
+    db.commit()
+
+    result = snapshots.lowercase_countries(db)
+    assert result["snapshots_moved"] == 0
+    assert result["snapshot_conflicts"] == [{"country": "Spain", "fetched_at": T.isoformat()}]
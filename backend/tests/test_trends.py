@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from app.api.trends import longevity
+from app.services.etl_lastfm import ingest_lastfm_items
+
+T0 = datetime(2024, 1, 1)
+
+
+def _chart(db, hour, titles):
+    items = [{"name": t, "artist": {"name": "A"}, "@attr": {"rank": str(r)}} for r, t in enumerate(titles, 1)]
+    ingest_lastfm_items(db, "spain", items, snapshot_key=f"run-{hour}", fetched_at=T0 + timedelta(hours=hour))
+
+
+def test_longevity_counts_streaks_and_pages(db):
+    _chart(db, 0, ["x", "y", "z"])
+    _chart(db, 1, ["x", "z"])
+    _chart(db, 2, ["y", "x"])
+    _chart(db, 3, ["y"])
+
+    first = longevity(country="Spain", start=None, end=None, after=None, limit=2, db=db)
+    rows = [(i["title"], i["snapshots"], i["longest_streak"], i["best_rank"]) for i in first["items"]]
+    assert rows == [("x", 3, 3, 1), ("y", 3, 2, 1)]
+
+    rest = longevity(country="spain", start=None, end=None, after=first["next_cursor"], limit=2, db=db)
+    assert [(i["title"], i["snapshots"], i["longest_streak"]) for i in rest["items"]] == [("z", 2, 2)]
+    assert rest["next_cursor"] is None
+
+
+def test_longevity_streaks_follow_the_date_range(db):
+    _chart(db, 0, ["x"])
+    _chart(db, 1, ["y"])
+    _chart(db, 2, ["x"])
+    result = longevity(country="spain", start=T0 + timedelta(hours=1), end=None, after=None, limit=5, db=db)
+    assert [(i["title"], i["longest_streak"]) for i in result["items"]] == [("x", 1), ("y", 1)]